@@ -0,0 +1,122 @@
+# activity.py
+from __future__ import annotations
+
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, or_, update
+
+from db import db
+from models import User
+from scheduler import PeriodicTask
+
+
+# ----------------------------------------------------------------------
+#  REGISTRO DIFERIDO DE ÚLTIMA ACTIVIDAD
+# ----------------------------------------------------------------------
+class ActivityTracker:
+    """
+    Acumula en memoria (por worker) los "toques" de actividad y los
+    escribe en la BD en un único UPDATE masivo cada cierto tiempo.
+
+    Solo se anota un toque si el valor guardado tiene más de
+    `granularity` de antigüedad, así que la mayoría de peticiones
+    no generan ninguna escritura.
+    """
+
+    def __init__(self, granularity: timedelta = timedelta(minutes=5)):
+        self.granularity = granularity
+        self._pending: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def touch(
+        self,
+        user_id: int,
+        stored_at: datetime | None,
+        now: datetime | None = None,
+    ) -> datetime | None:
+        """Anota el toque si hace falta; devuelve su hora (o None)."""
+        if now is None:
+            now = datetime.utcnow()
+        if stored_at is not None and now - stored_at < self.granularity:
+            return None
+        with self._lock:
+            self._pending[user_id] = now
+        return now
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Escribe los toques pendientes. Debe llamarse con app_context."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        users = User.__table__
+        stmt = (
+            update(users)
+            .where(users.c.id == bindparam("uid"))
+            .where(or_(
+                users.c.last_active_at.is_(None),
+                users.c.last_active_at < bindparam("ts"),
+            ))
+            .values(last_active_at=bindparam("ts"))
+        )
+        try:
+            db.session.execute(
+                stmt,
+                [{"uid": uid, "ts": ts} for uid, ts in pending.items()],
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Devolvemos los toques para reintentar en el próximo ciclo
+            with self._lock:
+                for uid, ts in pending.items():
+                    if uid not in self._pending or self._pending[uid] < ts:
+                        self._pending[uid] = ts
+            raise
+        return len(pending)
+
+
+activity_tracker = ActivityTracker()
+
+
+def flush_activity(app) -> int:
+    """Vuelca lo pendiente de este proceso en su propio app_context."""
+    if not activity_tracker.pending_count():
+        return 0
+    with app.app_context():
+        try:
+            return activity_tracker.flush()
+        except Exception:  # noqa: BLE001
+            app.logger.exception("No se pudo volcar la actividad")
+            return 0
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_activity(app):
+    """Configura el tracker y programa el volcado periódico."""
+    activity_tracker.granularity = timedelta(
+        seconds=app.config["ACTIVITY_GRANULARITY_SECONDS"]
+    )
+    task = PeriodicTask(
+        "activity-flush",
+        app.config["ACTIVITY_FLUSH_SECONDS"],
+        activity_tracker.flush,
+    )
+
+    @app.before_request
+    def _start_activity_flush():
+        task.ensure_started(app)
+
+    # Volcado limpio al apagar el worker (gunicorn además lo pide desde
+    # su hook worker_exit, antes de que el proceso termine)
+    atexit.register(flush_activity, app)
+    app.extensions["activity_task"] = task
+    return app
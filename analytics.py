@@ -0,0 +1,152 @@
+# analytics.py
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+
+from db import db
+from models import IncomeDailyRollup
+
+ROLLING_WINDOW_MONTHS = 3
+
+
+# ----------------------------------------------------------------------
+#  CARGA (UNA CONSULTA SOBRE LOS ACUMULADOS DIARIOS)
+# ----------------------------------------------------------------------
+def load_daily_totals(user_id: int, first_day: date, last_day: date):
+    """Devuelve (días como datetime64[D], totales) del rango, ordenados."""
+    # Sin el conversor de Date de SQLAlchemy: NumPy interpreta de una vez
+    # tanto el texto ISO (SQLite) como los date nativos (psycopg).
+    rows = db.session.execute(
+        select(
+            type_coerce(IncomeDailyRollup.day, String),
+            IncomeDailyRollup.total,
+        )
+        .where(
+            IncomeDailyRollup.user_id == user_id,
+            IncomeDailyRollup.day >= first_day,
+            IncomeDailyRollup.day <= last_day,
+        )
+        .order_by(IncomeDailyRollup.day)
+    ).all()
+    if not rows:
+        return np.array([], dtype="datetime64[D]"), np.array([])
+    days_raw, totals_raw = zip(*rows)
+    days = np.array(days_raw, dtype="datetime64[D]")
+    totals = np.array(totals_raw, dtype=np.float64)
+    return days, totals
+
+
+# ----------------------------------------------------------------------
+#  CÁLCULO VECTORIZADO
+# ----------------------------------------------------------------------
+def _nullable(values: np.ndarray) -> list:
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def compute_history(
+    first_day: date,
+    last_day: date,
+    days: np.ndarray,
+    totals: np.ndarray,
+    today: date | None = None,
+    window: int = ROLLING_WINDOW_MONTHS,
+) -> dict:
+    """
+    Historial mes a mes a partir de totales diarios, sin bucles de Python
+    sobre los datos: todo son operaciones de NumPy sobre arreglos densos.
+    """
+    if today is None:
+        today = date.today()
+
+    start = np.datetime64(first_day, "D")
+    calendar_days = np.arange(start, np.datetime64(last_day, "D") + 1)
+    daily = np.zeros(calendar_days.size)
+    daily[(days - start).astype(np.int64)] = totals
+
+    months = calendar_days.astype("datetime64[M]")
+    month_idx = (months - months[0]).astype(np.int64)
+    n_months = int(month_idx[-1]) + 1
+
+    monthly = np.bincount(month_idx, weights=daily, minlength=n_months)
+    active = np.bincount(
+        month_idx, weights=(daily > 0).astype(np.float64), minlength=n_months
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_active = np.where(active > 0, monthly / active, 0.0)
+
+    # Media móvil de `window` meses (NaN hasta tener la ventana completa)
+    rolling = np.full(n_months, np.nan)
+    if n_months >= window:
+        csum = np.concatenate(([0.0], np.cumsum(monthly)))
+        rolling[window - 1:] = (csum[window:] - csum[:-window]) / window
+
+    # Crecimiento mes a mes (NaN si el mes anterior fue 0)
+    growth = np.full(n_months, np.nan)
+    if n_months > 1:
+        prev = monthly[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth[1:] = np.where(
+                prev > 0, (monthly[1:] - prev) / prev, np.nan
+            )
+
+    # Mejor y peor día (solo días con ingreso)
+    with_income = np.flatnonzero(daily > 0)
+    best_day = worst_day = None
+    if with_income.size:
+        best = with_income[np.argmax(daily[with_income])]
+        worst = with_income[np.argmin(daily[with_income])]
+        best_day = {
+            "date": str(calendar_days[best]), "total": float(daily[best])
+        }
+        worst_day = {
+            "date": str(calendar_days[worst]), "total": float(daily[worst])
+        }
+
+    # Proyección: promedio de los últimos 12 meses completos × 12
+    # (el mes en curso, incompleto, no cuenta)
+    month_starts = np.arange(months[0], months[-1] + 1)
+    month_ends = (month_starts + 1).astype("datetime64[D]") - 1
+    complete = (month_starts < np.datetime64(today, "M")) & (
+        month_ends <= calendar_days[-1]
+    )
+    last_complete = monthly[complete][-12:]
+    trailing_12m_total = float(last_complete.sum())
+    projected_next_12m = (
+        float(last_complete.mean() * 12) if last_complete.size else 0.0
+    )
+
+    years = month_starts.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_numbers = month_starts.astype(np.int64) % 12 + 1
+    rolling_list = _nullable(rolling)
+    growth_list = _nullable(growth)
+
+    return {
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        "months": [
+            {
+                "year": int(years[i]),
+                "month": int(month_numbers[i]),
+                "total": float(monthly[i]),
+                "active_days": int(active[i]),
+                "avg_per_active_day": float(avg_active[i]),
+                "rolling_avg": rolling_list[i],
+                "mom_growth": growth_list[i],
+            }
+            for i in range(n_months)
+        ],
+        "total": float(monthly.sum()),
+        "best_day": best_day,
+        "worst_day": worst_day,
+        "trailing_12m_total": trailing_12m_total,
+        "trailing_12m_months": int(last_complete.size),
+        "projected_next_12m": projected_next_12m,
+    }
+
+
+def user_history(user_id: int, first_day: date, last_day: date) -> dict:
+    days, totals = load_daily_totals(user_id, first_day, last_day)
+    return compute_history(first_day, last_day, days, totals)
@@ -1,11 +1,25 @@
 import os
-from datetime import timedelta, datetime
+from datetime import timedelta
 
-from flask import Flask, redirect, url_for, session, g
-from db import init_db, db
-from models import User
+from flask import Flask, redirect, url_for, g
+from werkzeug.middleware.proxy_fix import ProxyFix
+from db import init_db, engine_options
 from auth import auth_bp
 from finance import finance_bp
+from migrations import init_migrations
+from reaper import init_reaper
+from rollups import init_rollups
+from state_cache import init_state_cache
+from income_import import init_income_import
+from exports import init_exports
+from state_report import init_state_report
+from snapshots import init_snapshots
+from changes import init_changes
+from instrumentation import init_instrumentation
+from credentials import init_credentials
+from content import init_content
+from activity import init_activity, activity_tracker
+from user_session import load_session_user, note_activity
 
 
 def create_app():
@@ -19,6 +33,122 @@ def create_app():
         "super-clave-segura-finanzas-180"
     )
     app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=7)
+    # La cookie firmada lleva una instantánea del usuario (id, nombre,
+    # admin, días de trabajo); se revalida contra la BD cada N segundos.
+    app.config["USER_SNAPSHOT_TTL_SECONDS"] = int(
+        os.getenv("USER_SNAPSHOT_TTL_SECONDS", "120")
+    )
+    # Proxies delante de la app (Render pone uno): de ahí sale la IP real
+    # del cliente. Con 0 se ignora X-Forwarded-For (se podría falsificar).
+    app.config["PROXY_HOPS"] = int(os.getenv("PROXY_HOPS", "0"))
+
+    # Idioma de versículos y mensajes del coach (locales/<idioma>.json)
+    app.config["CONTENT_LOCALE"] = os.getenv("CONTENT_LOCALE", "es")
+
+    # ===========================
+    # CONTRASEÑAS Y LÍMITE DE INTENTOS
+    # ===========================
+    # Los hashes se calculan en un pool de procesos acotado por worker;
+    # si está lleno, login/registro responden 503 en lugar de esperar.
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv(
+        "PASSWORD_HASH_METHOD", "scrypt:32768:8:1"
+    )
+    app.config["PASSWORD_HASH_WORKERS"] = int(
+        os.getenv("PASSWORD_HASH_WORKERS", "1")
+    )
+    app.config["PASSWORD_HASH_QUEUE"] = int(
+        os.getenv("PASSWORD_HASH_QUEUE", "4")
+    )
+    app.config["PASSWORD_HASH_TIMEOUT"] = float(
+        os.getenv("PASSWORD_HASH_TIMEOUT", "10")
+    )
+    # Fallos permitidos por ventana antes de bloquear (429) sin hashear;
+    # los registros también cuentan para la IP. 0 = sin límite.
+    app.config["LOGIN_MAX_FAILURES_PER_IP"] = int(
+        os.getenv("LOGIN_MAX_FAILURES_PER_IP", "30")
+    )
+    app.config["LOGIN_MAX_FAILURES_PER_EMAIL"] = int(
+        os.getenv("LOGIN_MAX_FAILURES_PER_EMAIL", "5")
+    )
+    app.config["LOGIN_THROTTLE_WINDOW_SECONDS"] = int(
+        os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", "900")
+    )
+
+    # ===========================
+    # LIMPIEZA DE INACTIVOS
+    # ===========================
+    app.config["INACTIVE_USER_DAYS"] = int(
+        os.getenv("INACTIVE_USER_DAYS", "30")
+    )
+    # El programador interno es opcional; también existe
+    # `flask --app app purge-inactive` para usarlo desde un cron.
+    app.config["REAPER_ENABLED"] = os.getenv("REAPER_ENABLED", "1") == "1"
+    app.config["REAPER_INTERVAL_SECONDS"] = int(
+        os.getenv("REAPER_INTERVAL_SECONDS", "3600")
+    )
+    app.config["REAPER_BATCH_SIZE"] = int(
+        os.getenv("REAPER_BATCH_SIZE", "500")
+    )
+
+    # ===========================
+    # ÚLTIMA ACTIVIDAD (ESCRITURA DIFERIDA)
+    # ===========================
+    # Solo se actualiza si el valor guardado es más viejo que la
+    # granularidad, y se vuelca a la BD cada ACTIVITY_FLUSH_SECONDS.
+    app.config["ACTIVITY_GRANULARITY_SECONDS"] = int(
+        os.getenv("ACTIVITY_GRANULARITY_SECONDS", "300")
+    )
+    app.config["ACTIVITY_FLUSH_SECONDS"] = int(
+        os.getenv("ACTIVITY_FLUSH_SECONDS", "60")
+    )
+
+    # ===========================
+    # CACHÉ DEL ESTADO FINANCIERO
+    # ===========================
+    # "local" es un LRU por worker (la clave incluye data_version, así
+    # que sigue siendo coherente entre workers); "redis" lo comparte.
+    app.config["STATE_CACHE_BACKEND"] = os.getenv(
+        "STATE_CACHE_BACKEND", "local"
+    )
+    app.config["STATE_CACHE_URL"] = os.getenv("STATE_CACHE_URL", "")
+    app.config["STATE_CACHE_SIZE"] = int(
+        os.getenv("STATE_CACHE_SIZE", "2048")
+    )
+
+    # ===========================
+    # INSTANTÁNEAS DEL DASHBOARD
+    # ===========================
+    # Precálculo por lotes del estado del día para usuarios activos;
+    # también existe `flask --app app snapshots-build` para un cron.
+    app.config["SNAPSHOT_ENABLED"] = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+    app.config["SNAPSHOT_INTERVAL_SECONDS"] = int(
+        os.getenv("SNAPSHOT_INTERVAL_SECONDS", "900")
+    )
+    app.config["SNAPSHOT_ACTIVE_DAYS"] = int(
+        os.getenv("SNAPSHOT_ACTIVE_DAYS", "7")
+    )
+    app.config["SNAPSHOT_BATCH_SIZE"] = int(
+        os.getenv("SNAPSHOT_BATCH_SIZE", "2000")
+    )
+
+    # ===========================
+    # REGISTRO DE CAMBIOS (/api/changes)
+    # ===========================
+    # Días que se conservan; un cliente más viejo recibe "reset" y baja
+    # el estado completo. La limpieza corre junto con el reaper.
+    app.config["CHANGE_LOG_DAYS"] = int(os.getenv("CHANGE_LOG_DAYS", "30"))
+
+    # ===========================
+    # MÉTRICAS (/metrics Y Server-Timing)
+    # ===========================
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") == "1"
+    # Sin token, /metrics solo responde a loopback y redes privadas
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")
+    app.config["SERVER_TIMING"] = os.getenv("SERVER_TIMING", "1") == "1"
+    # Misma sentencia SQL repetida N veces en una petición → aviso N+1
+    app.config["REPEATED_QUERY_THRESHOLD"] = int(
+        os.getenv("REPEATED_QUERY_THRESHOLD", "5")
+    )
 
     # ===========================
     # CONFIGURACIÓN BASE DE DATOS
@@ -45,8 +175,42 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Pool por worker (gunicorn.conf.py lo vacía tras el fork)
+    app.config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", "5"))
+    app.config["DB_MAX_OVERFLOW"] = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    app.config["DB_POOL_TIMEOUT"] = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+    app.config["DB_POOL_RECYCLE"] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    app.config["DB_POOL_PRE_PING"] = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    # Sentencias preparadas de psycopg3: vacío = valor del driver,
+    # "off" = desactivadas (PgBouncer en modo transacción), N = umbral.
+    prepare_threshold = os.getenv("DB_PREPARE_THRESHOLD", "").strip().lower()
+    app.config["DB_PREPARE_THRESHOLD"] = (
+        False if prepare_threshold == ""
+        else None if prepare_threshold == "off"
+        else int(prepare_threshold)
+    )
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        db_url, app.config
+    )
+    # Aplica migraciones pendientes al arrancar (también: flask db-upgrade)
+    app.config["AUTO_MIGRATE"] = os.getenv("AUTO_MIGRATE", "1") == "1"
+
     # Inicializar la BD
     init_db(app)
+    # Primero de los hooks: mide también a los demás
+    init_instrumentation(app)
+    init_migrations(app)
+    init_credentials(app)
+    init_content(app)
+    init_activity(app)
+    init_reaper(app)
+    init_rollups(app)
+    init_state_cache(app)
+    init_income_import(app)
+    init_exports(app)
+    init_state_report(app)
+    init_snapshots(app)
+    init_changes(app)
 
     # ===========================
     # BLUEPRINTS
@@ -57,24 +221,22 @@ def create_app():
     # ===========================
     # MIDDLEWARE
     # ===========================
+    if app.config["PROXY_HOPS"]:
+        hops = app.config["PROXY_HOPS"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
     @app.before_request
-    def load_current_user_and_cleanup():
+    def load_current_user():
         """
-        - Carga el usuario activo en g.user
-        - Actualiza última actividad
-        - Ejecuta limpieza automática de inactivos
+        - Carga el usuario activo en g.user (desde la sesión firmada; la
+          BD solo si la instantánea venció)
+        - Anota la última actividad (se escribe en diferido)
         """
-        user_id = session.get("user_id")
-        g.user = None
-
-        if user_id is not None:
-            user = User.query.get(user_id)
-            if user:
-                g.user = user
-                user.last_active_at = datetime.utcnow()
-                db.session.commit()
-
-        cleanup_inactive_users()
+        g.user = load_session_user(app.config["USER_SNAPSHOT_TTL_SECONDS"])
+        if g.user is not None:
+            touched = activity_tracker.touch(g.user.id, g.user.last_active_at)
+            if touched is not None:
+                note_activity(g.user, touched)
 
     # ===========================
     # RUTAS PRINCIPALES
@@ -91,24 +253,6 @@ def create_app():
     return app
 
 
-# ===========================
-# FUNCIÓN DE LIMPIEZA AUTOMÁTICA
-# ===========================
-
-def cleanup_inactive_users():
-    """Elimina usuarios con más de 30 días sin actividad."""
-    limite = datetime.utcnow() - timedelta(days=30)
-
-    usuarios_antiguos = User.query.filter(
-        User.last_active_at < limite
-    ).all()
-
-    if usuarios_antiguos:
-        for u in usuarios_antiguos:
-            db.session.delete(u)
-        db.session.commit()
-
-
 # ===========================
 # CREAR INSTANCIA GLOBAL
 # ===========================
@@ -1,3 +1,4 @@
+import base64
 from datetime import datetime
 
 from flask import (
@@ -9,20 +10,27 @@ from flask import (
     flash,
     session,
     g,
+    jsonify,
+    abort,
+    current_app,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, tuple_
 
 from db import db
+from credentials import CredentialsBusy, login_throttle, password_hasher
 from models import User
+from deletion import delete_users
+from state_cache import state_cache
+from user_session import reload_session_user, remember_user
 
 auth_bp = Blueprint("auth", __name__)
 
+ADMIN_PAGE_SIZE = 50
+
 
 def get_current_user():
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    # Ya lo cargó el before_request de app.py (sin consultar la BD)
+    return getattr(g, "user", None)
 
 
 def login_required(view):
@@ -37,6 +45,9 @@ def login_required(view):
 
 def admin_required(view):
     def wrapper(*args, **kwargs):
+        # El permiso se comprueba contra la BD, no contra la instantánea
+        if g.user:
+            g.user = reload_session_user(g.user.id)
         if not g.user or not g.user.is_admin:
             flash("Solo el administrador puede acceder a esta sección.", "danger")
             return redirect(url_for("finance.dashboard"))
@@ -46,6 +57,32 @@ def admin_required(view):
     return wrapper
 
 
+# ------------------ LÍMITE DE INTENTOS Y HASHES OCUPADOS ------------------
+def _throttle_keys(email: str | None = None) -> list[tuple[str, int]]:
+    """Claves (y su límite) que cuentan para esta petición."""
+    keys = [(f"ip:{request.remote_addr or '-'}",
+             current_app.config["LOGIN_MAX_FAILURES_PER_IP"])]
+    if email:
+        keys.append((f"email:{email}",
+                     current_app.config["LOGIN_MAX_FAILURES_PER_EMAIL"]))
+    return keys
+
+
+def _throttled(template: str, keys: list[tuple[str, int]]):
+    """Respuesta 429 si alguna clave está bloqueada (sin tocar la BD)."""
+    wait = max(login_throttle.retry_after(key, limit) for key, limit in keys)
+    if not wait:
+        return None
+    flash("Demasiados intentos. Vuelve a intentarlo más tarde.", "danger")
+    return render_template(template), 429, {"Retry-After": str(wait)}
+
+
+def _busy(template: str):
+    flash("Hay mucha demanda en este momento; inténtalo en unos segundos.",
+          "danger")
+    return render_template(template), 503, {"Retry-After": "2"}
+
+
 @auth_bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -57,18 +94,31 @@ def register():
             flash("Todos los campos son obligatorios.", "danger")
             return render_template("register.html")
 
+        keys = _throttle_keys()
+        blocked = _throttled("register.html", keys)
+        if blocked:
+            return blocked
+
         existing = User.query.filter_by(email=email).first()
         if existing:
             flash("Ya existe un usuario con ese correo.", "danger")
             return render_template("register.html")
 
+        try:
+            password_hash = password_hasher.hash(password)
+        except CredentialsBusy:
+            return _busy("register.html")
+        # Cada registro cuenta para la IP: crear cuentas también cuesta CPU
+        for key, _ in keys:
+            login_throttle.hit(key)
+
         # El PRIMER usuario registrado será administrador
         is_admin = User.query.count() == 0
 
         user = User(
             name=name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hash,
             is_admin=is_admin,
             working_days=26,
             last_login_at=datetime.utcnow(),
@@ -89,18 +139,42 @@ def login():
         email = request.form.get("email", "").strip().lower()
         password = request.form.get("password", "").strip()
 
+        keys = _throttle_keys(email)
+        blocked = _throttled("login.html", keys)
+        if blocked:
+            return blocked
+
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        try:
+            valid = user is not None and password_hasher.verify(
+                user.password_hash, password
+            )
+        except CredentialsBusy:
+            return _busy("login.html")
+        if not valid:
+            for key, _ in keys:
+                login_throttle.hit(key)
             flash("Correo o contraseña incorrectos.", "danger")
             return render_template("login.html")
+        login_throttle.reset(keys[-1][0])
+
+        # Hash con otro método o coste que el configurado: se rehace ahora
+        # que tenemos la contraseña (si el pool está lleno, en otro login)
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+            except CredentialsBusy:
+                pass
 
         # Sesión permanente por 7 días
+        session.clear()
         session["user_id"] = user.id
         session.permanent = True
 
         user.last_login_at = datetime.utcnow()
         user.last_active_at = datetime.utcnow()
         db.session.commit()
+        remember_user(user)
 
         return redirect(url_for("finance.dashboard"))
 
@@ -117,19 +191,119 @@ def logout():
 @auth_bp.route("/account/delete", methods=["POST"])
 @login_required
 def delete_own_account():
-    user = g.user
-    db.session.delete(user)
+    delete_users([g.user.id])
     db.session.commit()
     session.clear()
     flash("Tu perfil y todos tus datos han sido eliminados.", "info")
     return redirect(url_for("auth.login"))
 
 
+# ------------------ PANEL ADMIN: LISTADO PAGINADO ------------------
+def _encode_cursor(created_at: datetime, user_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{user_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_raw, id_raw = raw.split("|", 1)
+        return datetime.fromisoformat(created_raw), int(id_raw)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def list_users_page(
+    after: str | None = None,
+    email_prefix: str = "",
+    page_size: int = ADMIN_PAGE_SIZE,
+) -> tuple[list, str | None]:
+    """
+    Una página del listado de usuarios (más nuevos primero) con
+    paginación por clave sobre (created_at, id): el costo no depende de
+    cuántos usuarios haya ni de en qué página estemos. Solo se leen las
+    columnas que se muestran.
+    """
+    stmt = select(
+        User.id,
+        User.name,
+        User.email,
+        User.is_admin,
+        User.created_at,
+        User.last_login_at,
+        User.last_active_at,
+    ).order_by(User.created_at.desc(), User.id.desc())
+
+    if email_prefix:
+        escaped = (
+            email_prefix.replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_")
+        )
+        stmt = stmt.where(User.email.like(f"{escaped}%", escape="\\"))
+
+    cursor = _decode_cursor(after) if after else None
+    if cursor is not None:
+        stmt = stmt.where(tuple_(User.created_at, User.id) < cursor)
+
+    rows = db.session.execute(stmt.limit(page_size + 1)).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
 @auth_bp.route("/admin/users")
 @admin_required
 def admin_users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template("admin.html", users=users)
+    email_prefix = request.args.get("q", "").strip().lower()
+    users, next_cursor = list_users_page(
+        request.args.get("after"), email_prefix
+    )
+    return render_template(
+        "admin.html",
+        users=users,
+        next_cursor=next_cursor,
+        q=email_prefix,
+        is_first_page=not request.args.get("after"),
+    )
+
+
+@auth_bp.route("/admin/users.json")
+@admin_required
+def admin_users_json():
+    email_prefix = request.args.get("q", "").strip().lower()
+    users, next_cursor = list_users_page(
+        request.args.get("after"), email_prefix
+    )
+
+    def fmt(value):
+        return value.isoformat() if value else None
+
+    return jsonify({
+        "ok": True,
+        "users": [
+            {
+                "id": u.id,
+                "name": u.name,
+                "email": u.email,
+                "is_admin": bool(u.is_admin),
+                "created_at": fmt(u.created_at),
+                "last_login_at": fmt(u.last_login_at),
+                "last_active_at": fmt(u.last_active_at),
+            }
+            for u in users
+        ],
+        "next": next_cursor,
+    })
+
+
+@auth_bp.route("/admin/cache_stats")
+@admin_required
+def admin_cache_stats():
+    return jsonify({"ok": True, "state_cache": state_cache.stats()})
 
 
 @auth_bp.route("/admin/delete_user/<int:user_id>", methods=["POST"])
@@ -139,8 +313,9 @@ def admin_delete_user(user_id):
         flash("No puedes eliminar tu propio usuario como admin.", "danger")
         return redirect(url_for("auth.admin_users"))
 
-    user = User.query.get_or_404(user_id)
-    db.session.delete(user)
+    if db.session.scalar(select(User.id).where(User.id == user_id)) is None:
+        abort(404)
+    delete_users([user_id])
     db.session.commit()
     flash("Usuario eliminado correctamente.", "success")
     return redirect(url_for("auth.admin_users"))
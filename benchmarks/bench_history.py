@@ -0,0 +1,119 @@
+# benchmarks/bench_history.py
+"""
+Compara /api/history (NumPy sobre acumulados diarios) con un cálculo
+ingenuo fila por fila sobre los ingresos crudos, para 10 años de datos.
+
+    python benchmarks/bench_history.py [--years 10] [--per-day 3]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def naive_history(incomes, first_day: date, last_day: date) -> dict:
+    """Versión de referencia: bucles de Python sobre cada ingreso."""
+    monthly: dict[tuple[int, int], Decimal] = {}
+    daily: dict[date, Decimal] = {}
+    for amount, day in incomes:
+        if first_day <= day <= last_day:
+            key = (day.year, day.month)
+            monthly[key] = monthly.get(key, 0) + amount
+            daily[day] = daily.get(day, 0) + amount
+
+    keys = sorted(monthly)
+    result = []
+    for i, key in enumerate(keys):
+        window = [monthly[k] for k in keys[max(0, i - 2):i + 1]]
+        prev = monthly[keys[i - 1]] if i else 0
+        result.append({
+            "month": key,
+            "total": monthly[key],
+            "rolling_avg": sum(window) / 3 if len(window) == 3 else None,
+            "mom_growth": (monthly[key] - prev) / prev if prev else None,
+        })
+    best = max(daily.items(), key=lambda kv: kv[1]) if daily else None
+    worst = min(daily.items(), key=lambda kv: kv[1]) if daily else None
+    return {"months": result, "best": best, "worst": worst}
+
+
+def timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--per-day", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_history.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("REAPER_ENABLED", "0")
+
+    from app import app
+    from db import db
+    from models import User, Income
+    from rollups import rebuild_rollups
+    from analytics import user_history
+
+    last_day = date.today()
+    first_day = date(last_day.year - args.years, last_day.month, 1)
+    rng = random.Random(42)
+
+    with app.app_context():
+        user = User(email="bench@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+
+        rows = []
+        day = first_day
+        while day <= last_day:
+            for _ in range(args.per_day):
+                rows.append({
+                    "user_id": user.id,
+                    "amount": round(rng.uniform(10_000, 200_000), 2),
+                    "date": day,
+                })
+            day += timedelta(days=1)
+        db.session.execute(Income.__table__.insert(), rows)
+        rebuild_rollups(db.session.connection(), user.id)
+        db.session.commit()
+        print(f"{len(rows)} ingresos, {args.years} años")
+
+        def naive():
+            incomes = db.session.execute(
+                db.select(Income.amount, Income.date).where(
+                    Income.user_id == user.id
+                )
+            ).all()
+            naive_history(incomes, first_day, last_day)
+
+        def vectorized():
+            user_history(user.id, first_day, last_day)
+
+        t_naive = timed(naive, args.repeat)
+        t_vec = timed(vectorized, args.repeat)
+
+    print(f"ingenuo (filas crudas + bucles): {t_naive:9.2f} ms")
+    print(f"vectorizado (acumulados + NumPy): {t_vec:9.2f} ms")
+    print(f"aceleración: x{t_naive / t_vec:.1f}")
+
+
+if __name__ == "__main__":
+    main()
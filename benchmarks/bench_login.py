@@ -0,0 +1,179 @@
+# benchmarks/bench_login.py
+"""
+Ráfaga de logins contra gunicorn real mientras otros clientes leen
+/api/state, con el hash en el hilo del worker (PASSWORD_HASH_WORKERS=0,
+como antes) y en el pool de procesos acotado. Reporta logins por
+segundo, cuántos se rechazaron con 503 y la latencia de /api/state con y
+sin la ráfaga: con el pool, la lectura no debería degradarse tanto.
+
+    python benchmarks/bench_login.py [--workers 2] [--logins 200]
+    python benchmarks/bench_login.py --method pbkdf2:sha256:600000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import ROOT, gunicorn_server, local_database, session_cookie
+from load_suite import _NoRedirect, summarize
+
+sys.path.insert(0, ROOT)
+
+# etiqueta → variables de entorno del servidor
+MODES = {
+    "inline": {"PASSWORD_HASH_WORKERS": "0"},
+    "pool": {"PASSWORD_HASH_WORKERS": "1", "PASSWORD_HASH_QUEUE": "4"},
+}
+
+
+def _request(opener, req) -> tuple[float, int]:
+    t = time.perf_counter()
+    try:
+        with opener.open(req, timeout=60) as res:
+            res.read()
+            status = res.status
+    except urllib.error.HTTPError as err:
+        status = err.code
+    except OSError:
+        status = 0
+    return time.perf_counter() - t, status
+
+
+def read_state(base: str, cookies: list[str], stop: threading.Event,
+               readers: int) -> dict:
+    """Lectores de /api/state hasta que se pide parar."""
+    opener = urllib.request.build_opener(_NoRedirect)
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def loop(i: int) -> None:
+        n = i
+        while not stop.is_set():
+            cookie = cookies[n % len(cookies)]
+            n += readers
+            latency, status = _request(opener, urllib.request.Request(
+                f"{base}/api/state", headers={"Cookie": cookie}
+            ))
+            with lock:
+                latencies.append(latency)
+                errors[0] += status != 200
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(i,))
+               for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors[0])
+
+
+def login_burst(base: str, emails: list[str], password: str,
+                concurrency: int) -> tuple[dict, int]:
+    opener = urllib.request.build_opener(_NoRedirect)
+
+    def hit(email: str) -> tuple[float, int]:
+        body = urllib.parse.urlencode(
+            {"email": email, "password": password}
+        ).encode()
+        return _request(opener, urllib.request.Request(
+            f"{base}/login", data=body, method="POST"
+        ))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, emails))
+    elapsed = time.perf_counter() - started
+    ok = [latency for latency, status in results if status == 302]
+    busy = sum(1 for _, status in results if status == 503)
+    failed = len(results) - len(ok) - busy
+    return summarize(ok, elapsed, failed), busy
+
+
+def run_mode(label: str, env: dict, args, emails, cookies,
+             password: str) -> None:
+    env = dict(
+        os.environ,
+        **env,
+        # Todos los logins salen de 127.0.0.1: sin límite de intentos
+        LOGIN_MAX_FAILURES_PER_IP="0",
+        LOGIN_MAX_FAILURES_PER_EMAIL="0",
+    )
+    with gunicorn_server(args.workers, args.threads, env=env) as (base, _):
+        stop = threading.Event()
+        timer = threading.Timer(args.quiet_seconds, stop.set)
+        timer.start()
+        quiet = read_state(base, cookies, stop, args.readers)
+
+        stop = threading.Event()
+        during: dict = {}
+        reader = threading.Thread(
+            target=lambda: during.update(
+                read_state(base, cookies, stop, args.readers)
+            )
+        )
+        reader.start()
+        logins, busy = login_burst(base, emails, password, args.concurrency)
+        stop.set()
+        reader.join()
+
+    print(f"\n[{label}] {env['PASSWORD_HASH_WORKERS']} procesos de hash "
+          f"por worker")
+    print(f"  logins: {logins['rps']:.1f}/s, p50 {logins['p50_ms']:.0f} ms, "
+          f"p95 {logins['p95_ms']:.0f} ms, ok {logins['n']}, 503 {busy}, "
+          f"otros errores {logins['errors']}")
+    for name, stats in (("sin ráfaga", quiet), ("con ráfaga", during)):
+        print(f"  /api/state {name}: p50 {stats['p50_ms']:.1f} ms, "
+              f"p95 {stats['p95_ms']:.1f} ms, {stats['rps']:.0f}/s, "
+              f"errores {stats['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--quiet-seconds", type=float, default=3.0)
+    parser.add_argument("--method", default=None,
+                        help="PASSWORD_HASH_METHOD (por defecto el de la app)")
+    parser.add_argument("--mode", choices=tuple(MODES), action="append",
+                        help="Repetible; por defecto todos.")
+    args = parser.parse_args()
+
+    if args.method:
+        os.environ["PASSWORD_HASH_METHOD"] = args.method
+    local_database("bench_login")
+
+    from app import app
+    from datagen import EMAIL_DOMAIN, PASSWORD, generate
+    from db import db
+    from models import User
+
+    with app.app_context():
+        generate(users=args.users, years=0, goals=1, deposits=1)
+        user_ids = db.session.execute(
+            db.select(User.id).where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+        ).scalars().all()
+    emails = [f"user{i % args.users}@{EMAIL_DOMAIN}"
+              for i in range(args.logins)]
+    cookies = [session_cookie(app, user_id) for user_id in user_ids]
+
+    print(f"{args.logins} logins con {args.concurrency} clientes, "
+          f"{args.readers} lectores, {args.workers} workers x "
+          f"{args.threads} hilos, método "
+          f"{app.extensions['password_hasher'].method}")
+    for label in args.mode or MODES:
+        run_mode(label, MODES[label], args, emails, cookies, PASSWORD)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_money.py
+"""
+Montos en Float frente a NUMERIC(14, 2) con los mismos datos: dos tablas
+con un millón de filas idénticas y, en cada una, las mismas dos sumas:
+  - filas + acumulado en Python (float en una, Decimal en la otra)
+  - SUM en la BD, un solo valor de vuelta
+con el tiempo y la deriva de cada resultado frente al total exacto
+(calculado en centavos enteros al generar los datos).
+
+En SQLite NUMERIC es solo afinidad: los montos se guardan como REAL y el
+SUM también es un double, que SQLAlchemy redondea a centavos al leerlo.
+Ahí las dos tablas guardan lo mismo y la columna NUMERIC solo cambia el
+tipo que devuelve el driver; la exactitud en la BD se mide en Postgres:
+
+    python benchmarks/bench_money.py [--rows 1000000] [--repeat 3]
+        [--url postgresql+psycopg://...]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    from sqlalchemy import (
+        Column, Float, Integer, MetaData, Numeric, Table, create_engine,
+        func, select,
+    )
+
+    from money import MONEY_PRECISION, MONEY_SCALE
+
+    url = args.url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "bench_money.db"
+    )
+    engine = create_engine(url)
+    metadata = MetaData()
+    tables = {
+        "float": Table(
+            "bench_amounts_float", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("amount", Float, nullable=False),
+        ),
+        "numeric": Table(
+            "bench_amounts_numeric", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("amount", Numeric(MONEY_PRECISION, MONEY_SCALE),
+                   nullable=False),
+        ),
+    }
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    rng = random.Random(42)
+    cents = [rng.randint(1_000, 20_000_000) for _ in range(args.rows)]
+    exact = Decimal(sum(cents)) / 100
+
+    with engine.begin() as conn:
+        for start in range(0, args.rows, 50_000):
+            chunk = cents[start:start + 50_000]
+            conn.execute(tables["float"].insert(),
+                         [{"amount": c / 100} for c in chunk])
+            conn.execute(tables["numeric"].insert(),
+                         [{"amount": Decimal(c) / 100} for c in chunk])
+    print(f"{args.rows} montos por tabla ({engine.dialect.name}), "
+          f"total exacto {exact}")
+
+    def row_loop(table):
+        def run():
+            with engine.connect() as conn:
+                total = 0
+                for amount in conn.execute(select(table.c.amount)).scalars():
+                    total += amount
+                return total
+        return run
+
+    def db_sum(table):
+        def run():
+            with engine.connect() as conn:
+                return conn.execute(
+                    select(func.coalesce(func.sum(table.c.amount), 0))
+                ).scalar_one()
+        return run
+
+    for kind, table in tables.items():
+        t_loop, loop_total = timed(row_loop(table), args.repeat)
+        t_sum, sum_total = timed(db_sum(table), args.repeat)
+        print(f"{kind}:")
+        for label, ms, total in (("filas + Python", t_loop, loop_total),
+                                 ("SUM en la BD", t_sum, sum_total)):
+            drift = Decimal(total) - exact
+            print(f"  {label:15} {ms:9.2f} ms  {total!r}  deriva {drift}")
+
+    metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
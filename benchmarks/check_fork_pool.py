@@ -0,0 +1,101 @@
+# benchmarks/check_fork_pool.py
+"""
+Comprueba con gunicorn real (gunicorn.conf.py, --preload) y varios
+clientes leyendo y escribiendo a la vez que ningún worker usa una
+conexión abierta por el master: cero errores y ningún ingreso perdido.
+El caso del fork directo (con y sin dispose_engines) está en
+tests/test_fork_pool.py.
+
+    python benchmarks/check_fork_pool.py [--workers 3] [--requests 400]
+    DATABASE_URL=postgresql://... python benchmarks/check_fork_pool.py
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import (
+    ROOT,
+    gunicorn_server,
+    local_database,
+    read_log,
+    session_cookie,
+)
+
+sys.path.insert(0, ROOT)
+
+
+def check_gunicorn(app, workers: int, requests: int) -> bool:
+    from db import db
+    from models import User, Income
+
+    with app.app_context():
+        user = User(email="fork@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    cookie = session_cookie(app, user_id)
+
+    with gunicorn_server(workers) as (base, log):
+        def hit(i: int) -> int:
+            headers = {"Cookie": cookie}
+            if i % 4 == 0:
+                req = urllib.request.Request(
+                    f"{base}/api/income",
+                    data=json.dumps({"amount": "1.00"}).encode(),
+                    headers={**headers, "Content-Type": "application/json"},
+                    method="POST",
+                )
+            else:
+                req = urllib.request.Request(
+                    f"{base}/api/state", headers=headers
+                )
+            try:
+                with urllib.request.urlopen(req, timeout=30) as res:
+                    return res.status
+            except urllib.error.HTTPError as err:
+                return err.code
+            except OSError:
+                return 0
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            statuses = list(pool.map(hit, range(requests)))
+        elapsed = time.perf_counter() - started
+        output = read_log(log)
+    errors = output.count("Traceback")
+    with app.app_context():
+        incomes = Income.query.filter_by(user_id=user_id).count()
+    expected = len(range(0, requests, 4))
+    bad = sum(status != 200 for status in statuses)
+    print(
+        f"gunicorn {workers} workers: {requests} peticiones en "
+        f"{elapsed:.2f} s, {bad} fallidas, {errors} tracebacks, "
+        f"ingresos {incomes}/{expected}"
+    )
+    if errors:
+        print(output)
+    return not bad and not errors and incomes == expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=400)
+    args = parser.parse_args()
+
+    local_database("check_fork")
+
+    from app import app
+
+    ok = check_gunicorn(app, args.workers, args.requests)
+    print("OK" if ok else "FALLÓ")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
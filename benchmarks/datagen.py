@@ -0,0 +1,178 @@
+# benchmarks/datagen.py
+"""
+Llena una BD local con datos sintéticos reproducibles (misma semilla,
+mismos datos): usuarios con categorías, ingresos diarios durante años y
+metas con aportes. El primer usuario es admin. Sirve para SQLite y para
+un Postgres local:
+
+    python benchmarks/datagen.py --users 500 --years 3
+    DATABASE_URL=postgresql://localhost/finanzas_bench \\
+        python benchmarks/datagen.py --users 5000
+
+Contraseña de todos los usuarios: "bench".
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from harness import ROOT, local_database
+
+sys.path.insert(0, ROOT)
+
+EMAIL_DOMAIN = "bench.example.com"
+PASSWORD = "bench"
+CHUNK_ROWS = 50_000
+
+
+def _money(rng: random.Random, low: int, high: int) -> Decimal:
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+def generate(
+    users: int = 200,
+    categories: int = 5,
+    years: int = 2,
+    incomes_per_day: int = 1,
+    goals: int = 2,
+    deposits: int = 24,
+    seed: int = 42,
+    today: date | None = None,
+) -> dict:
+    """
+    Inserta los datos en la BD de la app (con app_context activo) y
+    devuelve cuántas filas de cada tabla se crearon. Inserta por lotes
+    de CHUNK_ROWS con executemany (o COPY en Postgres).
+    """
+    from sqlalchemy import insert, select
+    from werkzeug.security import generate_password_hash
+
+    from credentials import password_hasher
+    from db import db
+    from income_import import insert_income_rows
+    from models import User, Category, SavingGoal, SavingDeposit
+    from rollups import rebuild_rollups
+
+    rng = random.Random(seed)
+    if today is None:
+        today = date.today()
+    first_day = today - timedelta(days=365 * years)
+    now = datetime.utcnow()
+    counts = {"users": users, "categories": 0, "incomes": 0,
+              "saving_goals": 0, "saving_deposits": 0}
+
+    # Un solo hash (con el método configurado, para que el login no lo
+    # rehaga): generarlo por usuario dominaría el tiempo de carga
+    password_hash = generate_password_hash(PASSWORD, password_hasher.method)
+    db.session.execute(insert(User), [
+        {
+            "name": f"Bench {i}",
+            "email": f"user{i}@{EMAIL_DOMAIN}",
+            "password_hash": password_hash,
+            "is_admin": i == 0,
+            "working_days": rng.randint(22, 30),
+            "created_at": now - timedelta(days=rng.randint(0, 365 * years)),
+            "last_active_at": now - timedelta(minutes=rng.randint(0, 10_000)),
+        }
+        for i in range(users)
+    ])
+    user_ids = db.session.execute(
+        select(User.id)
+        .where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+        .order_by(User.id)
+    ).scalars().all()
+
+    db.session.execute(insert(Category), [
+        {"user_id": user_id, "name": f"Categoría {c}",
+         "monthly_target": _money(rng, 50_000, 2_000_000)}
+        for user_id in user_ids
+        for c in range(categories)
+    ])
+    counts["categories"] = len(user_ids) * categories
+
+    batch = []
+    for user_id in user_ids:
+        day = first_day
+        while day <= today:
+            for _ in range(incomes_per_day):
+                batch.append({"user_id": user_id,
+                              "amount": _money(rng, 5_000, 300_000),
+                              "date": day})
+            day += timedelta(days=1)
+        if len(batch) >= CHUNK_ROWS:
+            insert_income_rows(batch)
+            counts["incomes"] += len(batch)
+            batch = []
+    if batch:
+        insert_income_rows(batch)
+        counts["incomes"] += len(batch)
+
+    db.session.execute(insert(SavingGoal), [
+        {"user_id": user_id, "name": f"Meta {k}",
+         "target_amount": _money(rng, 1_000_000, 50_000_000),
+         "deadline": today + timedelta(days=rng.randint(30, 1000))}
+        for user_id in user_ids
+        for k in range(goals)
+    ])
+    counts["saving_goals"] = len(user_ids) * goals
+    goal_ids = db.session.execute(
+        select(SavingGoal.id).where(SavingGoal.user_id.in_(user_ids))
+    ).scalars().all()
+    span = (today - first_day).days
+    goals_per_chunk = max(1, CHUNK_ROWS // max(1, deposits))
+    for start in range(0, len(goal_ids), goals_per_chunk):
+        rows = [
+            {"goal_id": goal_id, "amount": _money(rng, 10_000, 500_000),
+             "date": first_day + timedelta(days=rng.randint(0, span))}
+            for goal_id in goal_ids[start:start + goals_per_chunk]
+            for _ in range(deposits)
+        ]
+        if rows:
+            db.session.execute(insert(SavingDeposit), rows)
+            counts["saving_deposits"] += len(rows)
+
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--incomes-per-day", type=int, default=1)
+    parser.add_argument("--goals", type=int, default=2)
+    parser.add_argument("--deposits", type=int, default=24,
+                        help="Aportes por meta.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = local_database("datagen")
+
+    from app import app
+
+    started = time.perf_counter()
+    with app.app_context():
+        counts = generate(
+            users=args.users,
+            categories=args.categories,
+            years=args.years,
+            incomes_per_day=args.incomes_per_day,
+            goals=args.goals,
+            deposits=args.deposits,
+            seed=args.seed,
+        )
+    elapsed = time.perf_counter() - started
+    print(f"BD: {url}")
+    for table, n in counts.items():
+        print(f"  {table}: {n}")
+    print(f"{elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/harness.py
+"""Piezas comunes de los benchmarks: BD local, sesiones y gunicorn real."""
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def local_database(name: str) -> str:
+    """DATABASE_URL del entorno o, si no hay, un SQLite temporal."""
+    if "DATABASE_URL" not in os.environ:
+        db_path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Sin hilos de fondo: cada proceso mide solo lo que le pedimos
+    for key in ("REAPER_ENABLED", "SNAPSHOT_ENABLED"):
+        os.environ.setdefault(key, "0")
+    return os.environ["DATABASE_URL"]
+
+
+def session_cookie(app, user_id: int) -> str:
+    """Cookie de sesión firmada como la que deja /login."""
+    from flask.sessions import SecureCookieSessionInterface
+
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return f"session={serializer.dumps({'user_id': user_id})}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn_server(workers: int, threads: int = 4, env: dict | None = None):
+    """
+    Arranca `gunicorn -c gunicorn.conf.py app:app` en un puerto libre y
+    devuelve (url_base, archivo_de_log) cuando ya responde.
+    """
+    port = free_port()
+    env = dict(
+        env or os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_ACCESS_LOG="",
+        # Sin reciclar workers a mitad de la medición
+        GUNICORN_MAX_REQUESTS="0",
+    )
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+         "app:app"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                urllib.request.urlopen(f"{base}/login", timeout=1)
+                break
+            except OSError:
+                if server.poll() is not None:
+                    break
+                time.sleep(0.1)
+        yield base, log
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def read_log(log) -> str:
+    log.seek(0)
+    return log.read().decode(errors="replace")
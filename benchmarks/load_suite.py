@@ -0,0 +1,399 @@
+# benchmarks/load_suite.py
+"""
+Suite de carga sobre datos de datagen.py. Cada escenario se mide con
+dos conductores:
+  - client: el test client de Flask, secuencial (costo de la app sin red);
+  - http: gunicorn real (gunicorn.conf.py) con varios workers y clientes
+    concurrentes.
+Reporta p50/p95/p99 y peticiones por segundo, y compara contra una línea
+base guardada: sale con código 1 si p95 o el throughput empeoran más
+que --threshold (o si hubo errores).
+
+    python benchmarks/load_suite.py                  # compara con la base
+    python benchmarks/load_suite.py --save-baseline  # la reemplaza
+    python benchmarks/load_suite.py --driver client --scenario api_state
+    DATABASE_URL=postgresql://localhost/finanzas_bench \\
+        python benchmarks/load_suite.py --baseline baseline-pg.json
+
+La línea base depende de la máquina: guárdala en la misma donde se
+compara (CI, portátil) y con los mismos parámetros.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import ROOT, gunicorn_server, local_database, session_cookie
+
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "baseline.json")
+
+# nombre → (método, ruta, cuerpo JSON | None, estado esperado)
+HTTP_SCENARIOS = {
+    "api_state": ("GET", "/api/state", None, 200),
+    "dashboard": ("GET", "/dashboard", None, 200),
+    "api_add_income": ("POST", "/api/income", {"amount": "12500.50"}, 200),
+    "admin_users": ("GET", "/admin/users", None, 200),
+    "account_delete": ("POST", "/account/delete", None, 302),
+}
+# Solo con el conductor client: la función sin HTTP
+DIRECT_SCENARIOS = ("compute_financial_state",)
+SCENARIOS = DIRECT_SCENARIOS + tuple(HTTP_SCENARIOS)
+
+
+# ----------------------------------------------------------------------
+#  ESTADÍSTICAS
+# ----------------------------------------------------------------------
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Percentil por rango más cercano (sin interpolar)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    values = sorted(latencies)
+    return {
+        "n": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0,
+    }
+
+
+# ----------------------------------------------------------------------
+#  USUARIOS DE CADA ESCENARIO
+# ----------------------------------------------------------------------
+class Population:
+    """
+    Usuarios de datagen: el admin (el primero), un grupo que se lee y
+    escribe al azar y otro que solo usa account_delete (cada petición
+    borra a uno distinto).
+    """
+
+    def __init__(self, app, user_ids: list[int], victims: int, seed: int):
+        self.app = app
+        self.admin_id = user_ids[0]
+        self.readers = user_ids[1:len(user_ids) - victims]
+        self._victims = list(user_ids[len(user_ids) - victims:])
+        self._rng = random.Random(seed)
+        self._cookies: dict[int, str] = {}
+
+    def cookie(self, user_id: int) -> str:
+        if user_id not in self._cookies:
+            self._cookies[user_id] = session_cookie(self.app, user_id)
+        return self._cookies[user_id]
+
+    def user_for(self, scenario: str) -> int:
+        if scenario == "admin_users":
+            return self.admin_id
+        if scenario == "account_delete":
+            return self._victims.pop()
+        return self._rng.choice(self.readers)
+
+
+# ----------------------------------------------------------------------
+#  CONDUCTORES
+# ----------------------------------------------------------------------
+def run_client(app, population: Population, scenario: str,
+               requests: int) -> dict:
+    latencies, errors = [], 0
+    if scenario == "compute_financial_state":
+        from db import db
+        from finance import compute_financial_state
+        from models import User
+
+        with app.app_context():
+            users = [
+                db.session.get(User, population.user_for(scenario))
+                for _ in range(requests)
+            ]
+            started = time.perf_counter()
+            for user in users:
+                t = time.perf_counter()
+                compute_financial_state(user)
+                latencies.append(time.perf_counter() - t)
+            elapsed = time.perf_counter() - started
+        return summarize(latencies, elapsed, errors)
+
+    method, path, body, expected = HTTP_SCENARIOS[scenario]
+    client = app.test_client()
+    calls = [population.user_for(scenario) for _ in range(requests)]
+    started = time.perf_counter()
+    for user_id in calls:
+        name, value = population.cookie(user_id).split("=", 1)
+        client.set_cookie(name, value)
+        t = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        latencies.append(time.perf_counter() - t)
+        if response.status_code != expected:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Los 302 se miden tal cual, sin seguir a /login
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_http(base: str, population: Population, scenario: str,
+             requests: int, concurrency: int) -> dict:
+    method, path, body, expected = HTTP_SCENARIOS[scenario]
+    opener = urllib.request.build_opener(_NoRedirect)
+    data = json.dumps(body).encode() if body is not None else None
+    calls = [population.user_for(scenario) for _ in range(requests)]
+
+    def hit(user_id: int) -> tuple[float, bool]:
+        headers = {"Cookie": population.cookie(user_id)}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(
+            f"{base}{path}", data=data, headers=headers, method=method
+        )
+        t = time.perf_counter()
+        try:
+            with opener.open(req, timeout=60) as res:
+                res.read()
+                status = res.status
+        except urllib.error.HTTPError as err:
+            status = err.code
+        except OSError:
+            status = 0
+        return time.perf_counter() - t, status == expected
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, calls))
+    elapsed = time.perf_counter() - started
+    return summarize(
+        [latency for latency, _ in results],
+        elapsed,
+        sum(1 for _, ok in results if not ok),
+    )
+
+
+def count_users(app) -> int:
+    from db import db
+    from models import User
+
+    with app.app_context():
+        return db.session.execute(
+            db.select(db.func.count()).select_from(User)
+        ).scalar_one()
+
+
+def best_of(rounds: int, run) -> dict:
+    """La ronda con menor p95: el ruido de la máquina solo empeora."""
+    results = [run() for _ in range(rounds)]
+    best = min(results, key=lambda r: r["p95_ms"])
+    best["errors"] = sum(r["errors"] for r in results)
+    return best
+
+
+def checked(app, scenario: str, run) -> dict:
+    """
+    account_delete responde 302 tanto si borra como si la sesión no
+    vale: contamos los usuarios que de verdad desaparecieron.
+    """
+    if scenario != "account_delete":
+        return run()
+    before = count_users(app)
+    result = run()
+    missing = result["n"] - (before - count_users(app))
+    result["errors"] = max(result["errors"], missing)
+    return result
+
+
+# ----------------------------------------------------------------------
+#  LÍNEA BASE
+# ----------------------------------------------------------------------
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regresiones (texto) de p95 y throughput frente a la base."""
+    problems = []
+    for driver, scenarios in results.items():
+        for scenario, current in scenarios.items():
+            if current["errors"]:
+                problems.append(
+                    f"{driver}/{scenario}: {current['errors']} errores"
+                )
+            base = baseline.get(driver, {}).get(scenario)
+            if not base:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+                problems.append(
+                    f"{driver}/{scenario}: p95 {current['p95_ms']} ms "
+                    f"(base {base['p95_ms']} ms)"
+                )
+            if current["rps"] < base["rps"] * (1 - threshold):
+                problems.append(
+                    f"{driver}/{scenario}: {current['rps']} req/s "
+                    f"(base {base['rps']} req/s)"
+                )
+    return problems
+
+
+def print_table(results: dict) -> None:
+    print(f"{'conductor':9} {'escenario':24} {'n':>5} {'err':>4} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for driver, scenarios in results.items():
+        for scenario, r in scenarios.items():
+            print(f"{driver:9} {scenario:24} {r['n']:5d} {r['errors']:4d} "
+                  f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+                  f"{r['p99_ms']:9.2f} {r['rps']:8.1f}")
+
+
+# ----------------------------------------------------------------------
+#  PRINCIPAL
+# ----------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=300,
+                        help="Peticiones por escenario y conductor.")
+    parser.add_argument("--delete-requests", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Rondas por escenario; se queda la mejor.")
+    parser.add_argument("--warmup", type=int, default=30,
+                        help="Peticiones previas sin medir (cachés, pool).")
+    parser.add_argument("--driver", choices=("client", "http"),
+                        action="append")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="Empeoramiento tolerado (0.3 = 30 %%).")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", dest="json_out",
+                        help="Guardar también los resultados aquí.")
+    args = parser.parse_args()
+
+    drivers = args.driver or ["client", "http"]
+    scenarios = args.scenario or list(SCENARIOS)
+    url = local_database("load_suite")
+    # Cada petición mide también sus sentencias SQL; sin el aviso N+1
+    os.environ.setdefault("REPEATED_QUERY_THRESHOLD", "1000000")
+
+    from app import app
+    from datagen import generate, EMAIL_DOMAIN
+    from db import db
+    from models import User
+
+    victims = args.delete_requests * len(drivers) * args.rounds
+    with app.app_context():
+        counts = generate(users=args.users + victims, years=args.years,
+                          seed=args.seed)
+        user_ids = db.session.execute(
+            db.select(User.id)
+            .where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+            .order_by(User.id)
+        ).scalars().all()
+    print(f"BD {url.split(':', 1)[0]}: " + ", ".join(
+        f"{table}={n}" for table, n in counts.items()
+    ))
+    population = Population(app, user_ids, victims, args.seed)
+
+    def count_for(scenario: str) -> int:
+        return (args.delete_requests if scenario == "account_delete"
+                else args.requests)
+
+    def measure(scenario: str, run) -> dict:
+        """run(n) → resumen: calentamiento y luego las rondas medidas."""
+        # account_delete sin calentar: cada petición gasta un usuario
+        if args.warmup and scenario != "account_delete":
+            run(args.warmup)
+        return best_of(args.rounds, lambda: checked(
+            app, scenario, lambda: run(count_for(scenario))
+        ))
+
+    results: dict = {}
+    if "client" in drivers:
+        results["client"] = {
+            scenario: measure(scenario, lambda n: run_client(
+                app, population, scenario, n
+            ))
+            for scenario in scenarios
+        }
+    if "http" in drivers:
+        results["http"] = {}
+        with gunicorn_server(args.workers, args.threads) as (base, _):
+            for scenario in scenarios:
+                if scenario in DIRECT_SCENARIOS:
+                    continue
+                results["http"][scenario] = measure(
+                    scenario, lambda n: run_http(
+                        base, population, scenario, n, args.concurrency
+                    )
+                )
+
+    print_table(results)
+    params = {
+        "users": args.users,
+        "years": args.years,
+        "requests": args.requests,
+        "delete_requests": args.delete_requests,
+        "warmup": args.warmup,
+        "rounds": args.rounds,
+        "workers": args.workers,
+        "threads": args.threads,
+        "concurrency": args.concurrency,
+        "database": url.split(":", 1)[0],
+    }
+    report = {
+        "params": params,
+        "machine": f"{platform.node()} {platform.machine()} "
+                   f"Python {platform.python_version()}",
+        "results": results,
+    }
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Línea base guardada en {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("Sin línea base (usa --save-baseline)")
+        return
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get("params") != params:
+        print("La línea base se tomó con otros parámetros: no se compara")
+        print(f"  base:   {baseline.get('params')}")
+        print(f"  actual: {params}")
+        return
+    problems = compare(results, baseline["results"], args.threshold)
+    if problems:
+        print(f"REGRESIÓN (> {args.threshold:.0%} frente a la base):")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print(f"Sin regresiones (umbral {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# changes.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, func, insert, select
+
+from db import db
+from models import AppliedOperation, ChangeLog
+
+CHANGES_PAGE_SIZE = 500
+
+# Marca "algo cambió sin detalle" (p. ej. la importación masiva): el
+# cliente descarta su copia y vuelve a pedir el estado completo.
+RESET = ("*", "reset")
+
+_PENDING_KEY = "pending_changes"
+
+
+# ----------------------------------------------------------------------
+#  REGISTRO (EN LA TRANSACCIÓN DE LA ESCRITURA)
+# ----------------------------------------------------------------------
+# Las operaciones anotan sus cambios en la sesión; commit_user_change
+# los escribe con seq = la data_version nueva del usuario. Así cada
+# versión tiene al menos una entrada y la secuencia no tiene huecos.
+def pending_changes() -> list[dict]:
+    return db.session.info.setdefault(_PENDING_KEY, [])
+
+
+def record_change(entity: str, action: str, entity_id: int | None = None,
+                  data: dict | None = None) -> None:
+    pending_changes().append({
+        "entity": entity,
+        "action": action,
+        "entity_id": entity_id,
+        "data": data,
+    })
+
+
+def discard_pending_changes(mark: int = 0) -> None:
+    """Olvida lo anotado desde `mark` (tras un rollback o un SAVEPOINT)."""
+    del pending_changes()[mark:]
+
+
+def write_pending_changes(user_id: int, seq: int) -> int:
+    """Inserta lo anotado (o una marca RESET si no hay nada). Sin commit."""
+    changes = db.session.info.pop(_PENDING_KEY, None) or [
+        {"entity": RESET[0], "action": RESET[1],
+         "entity_id": None, "data": None}
+    ]
+    now = datetime.utcnow()
+    db.session.execute(insert(ChangeLog), [
+        {**change, "user_id": user_id, "seq": seq, "created_at": now}
+        for change in changes
+    ])
+    return len(changes)
+
+
+# ----------------------------------------------------------------------
+#  LECTURA (/api/changes)
+# ----------------------------------------------------------------------
+def changes_since(user_id: int, since: int, version: int,
+                  limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """
+    Cambios con seq > since, en orden. "reset" indica que el cliente no
+    puede ponerse al día con deltas (su versión ya no está en el
+    registro o es del futuro) y debe pedir el estado completo.
+    """
+    if since >= version:
+        return {"version": version, "changes": [], "more": False,
+                "reset": since > version}
+
+    first_seq = db.session.execute(
+        select(func.min(ChangeLog.seq)).where(
+            ChangeLog.user_id == user_id, ChangeLog.seq > since
+        )
+    ).scalar()
+    if first_seq != since + 1:
+        return {"version": version, "changes": [], "more": False,
+                "reset": True}
+
+    columns = (
+        ChangeLog.seq,
+        ChangeLog.entity,
+        ChangeLog.action,
+        ChangeLog.entity_id,
+        ChangeLog.data,
+    )
+    rows = db.session.execute(
+        select(*columns)
+        .where(
+            ChangeLog.user_id == user_id,
+            ChangeLog.seq > since,
+            # Lo que se confirme mientras tanto va en la próxima página
+            ChangeLog.seq <= version,
+        )
+        .order_by(ChangeLog.seq, ChangeLog.id)
+        .limit(limit + 1)
+    ).all()
+    page_version = version
+    if len(rows) > limit:
+        # Nunca se corta una versión: la página acaba en la última versión
+        # completa y, si una sola versión ya pasa del límite, va entera.
+        last_seq = rows[limit].seq
+        rows = [r for r in rows if r.seq < last_seq]
+        if not rows:
+            rows = db.session.execute(
+                select(*columns)
+                .where(ChangeLog.user_id == user_id,
+                       ChangeLog.seq == last_seq)
+                .order_by(ChangeLog.id)
+            ).all()
+        page_version = rows[-1].seq
+    changes = [
+        {"seq": r.seq, "entity": r.entity, "action": r.action,
+         "id": r.entity_id, "data": r.data}
+        for r in rows
+    ]
+    return {
+        "version": page_version,
+        "changes": changes,
+        # Las versiones no tienen huecos: falta algo si no llegamos a la
+        # versión actual
+        "more": page_version < version,
+        "reset": any((c["entity"], c["action"]) == RESET for c in changes),
+    }
+
+
+# ----------------------------------------------------------------------
+#  LIMPIEZA
+# ----------------------------------------------------------------------
+def prune_change_log(max_age_days: int, now: datetime | None = None) -> int:
+    """
+    Borra entradas viejas (y las claves de idempotencia de la misma
+    edad). Un cliente que vuelva después recibe "reset" y descarga el
+    estado completo una vez.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    cutoff = now - timedelta(days=max_age_days)
+    result = db.session.execute(
+        delete(ChangeLog)
+        .where(ChangeLog.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(AppliedOperation)
+        .where(AppliedOperation.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount or 0
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_changes(app):
+    @app.cli.command("changes-prune")
+    @click.option("--days", type=int, default=None,
+                  help="Días a conservar (por defecto CHANGE_LOG_DAYS).")
+    def changes_prune_command(days):
+        """Borra el registro de cambios más viejo que N días."""
+        if days is None:
+            days = app.config["CHANGE_LOG_DAYS"]
+        click.echo(f"Entradas borradas: {prune_change_log(days)}")
+
+    return app
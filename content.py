@@ -0,0 +1,146 @@
+# content.py
+"""
+Textos del dashboard (versículos y mensajes del coach) leídos una vez de
+locales/<idioma>.json a un índice inmutable. El kernel solo elige por
+código; ninguna petición arma ni busca textos fuera de lo que ya está
+indexado.
+"""
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "locales")
+DEFAULT_LOCALE = "es"
+
+# Mensajes por código de estado (mismo orden que los estados del kernel)
+MESSAGE_COUNTS = {"month_messages": 4, "day_messages": 4, "goal_messages": 4}
+
+
+# ----------------------------------------------------------------------
+#  ÍNDICE DE UN IDIOMA
+# ----------------------------------------------------------------------
+@dataclass(frozen=True)
+class ContentIndex:
+    locale: str
+    verses: tuple
+    month_messages: tuple
+    day_messages: tuple
+    goal_messages: tuple
+    # Mensaje del día ya formateado por (código, ingreso, meta): el mismo
+    # usuario repite esos valores hasta que registra algo nuevo.
+    _day_cache: object = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "_day_cache", lru_cache(maxsize=4096)(self._format_day)
+        )
+
+    def verse(self, key: int, day: date) -> dict:
+        """
+        Versículo de (usuario, día): estable entre workers y reinicios
+        (crc32, no hash()) y distinto de un usuario a otro.
+        """
+        digest = zlib.crc32(f"{key}:{day.toordinal()}".encode())
+        return self.verses[digest % len(self.verses)]
+
+    def day_message(self, code: int, todays_income: float,
+                    daily_target: float) -> str:
+        return self._day_cache(code, todays_income, daily_target)
+
+    def _format_day(self, code: int, todays_income: float,
+                    daily_target: float) -> str:
+        return self.day_messages[code].format(
+            todays_income=todays_income,
+            daily_target=daily_target,
+            shortfall=daily_target - todays_income,
+            extra=todays_income - daily_target,
+        )
+
+
+def _read(locale: str) -> dict:
+    path = os.path.join(LOCALES_DIR, f"{locale}.json")
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def load_content(locale: str = DEFAULT_LOCALE) -> ContentIndex:
+    """
+    Índice de `locale`. Lo que falte en su archivo (o el archivo entero)
+    se toma del idioma por defecto. Un archivo mal formado falla aquí,
+    al arrancar, y no a mitad de una petición.
+    """
+    data = _read(DEFAULT_LOCALE)
+    if locale != DEFAULT_LOCALE:
+        try:
+            data.update(_read(locale))
+        except FileNotFoundError:
+            locale = DEFAULT_LOCALE
+
+    verses = tuple(
+        {"text": str(v["text"]), "ref": str(v["ref"])}
+        for v in data["verses"]
+    )
+    if not verses:
+        raise ValueError(f"locales/{locale}.json: no hay versículos")
+    messages = {}
+    for key, count in MESSAGE_COUNTS.items():
+        messages[key] = tuple(str(text) for text in data[key])
+        if len(messages[key]) != count:
+            raise ValueError(
+                f"locales/{locale}.json: {key} debe tener {count} textos"
+            )
+    return ContentIndex(locale=locale, verses=verses, **messages)
+
+
+# ----------------------------------------------------------------------
+#  CATÁLOGO ACTIVO
+# ----------------------------------------------------------------------
+class Catalog:
+    """
+    Apunta al índice del idioma configurado. Cambiar de idioma reemplaza
+    el índice entero (una asignación), así que quien lo está leyendo
+    nunca ve uno a medio cargar.
+    """
+
+    def __init__(self, index: ContentIndex):
+        self.index = index
+
+    def use(self, locale: str) -> ContentIndex:
+        if locale != self.index.locale:
+            self.index = load_content(locale)
+        return self.index
+
+    def verse(self, key: int, day: date) -> dict:
+        return self.index.verse(key, day)
+
+    def month_message(self, code: int) -> str:
+        return self.index.month_messages[code]
+
+    def day_message(self, code: int, todays_income: float,
+                    daily_target: float) -> str:
+        return self.index.day_message(code, todays_income, daily_target)
+
+    def goal_message(self, code: int) -> str:
+        return self.index.goal_messages[code]
+
+
+catalog = Catalog(load_content(DEFAULT_LOCALE))
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_content(app):
+    """
+    CONTENT_LOCALE: idioma de los textos (locales/<idioma>.json, con
+    respaldo en "es"). Las respuestas siguen siendo cacheables: el texto
+    depende solo del usuario, el día y sus datos.
+    """
+    app.extensions["content"] = catalog.use(app.config["CONTENT_LOCALE"])
+    return app
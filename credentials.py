@@ -0,0 +1,230 @@
+# credentials.py
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+
+class CredentialsBusy(Exception):
+    """No hay hueco para otro hash: la vista responde 503 + Retry-After."""
+
+
+# ----------------------------------------------------------------------
+#  MÉTODO DE HASH (COSTE CONFIGURABLE)
+# ----------------------------------------------------------------------
+def canonical_method(method: str) -> str:
+    """
+    Escribe el método como lo guarda Werkzeug en el hash
+    ("scrypt" → "scrypt:32768:8:1"), para poder compararlo con el
+    prefijo de un hash guardado sin calcular ningún hash.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        n, r, p = map(int, args) if args else (2**15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = (
+            int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        )
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Método de hash no soportado: {method!r}")
+
+
+# ----------------------------------------------------------------------
+#  HASHER: POOL DE PROCESOS ACOTADO
+# ----------------------------------------------------------------------
+class PasswordHasher:
+    """
+    Calcula y verifica hashes fuera del worker web, en un pool de
+    `workers` procesos (por worker de gunicorn). Como mucho caben
+    `workers + queue` hashes en vuelo; el siguiente recibe CredentialsBusy
+    sin esperar, así una ráfaga de logins no ocupa todos los hilos ni
+    todas las CPU y el resto del tráfico sigue atendiéndose.
+
+    Con workers=0 se calcula en el propio hilo (desarrollo, CLI). Con
+    procesos, un script propio que use la app necesita el
+    `if __name__ == "__main__":` de multiprocessing (gunicorn y flask ya
+    lo tienen): forkserver vuelve a importar el módulo principal.
+    """
+
+    def __init__(self, method: str = "scrypt", workers: int = 1,
+                 queue: int = 4, timeout: float = 10.0):
+        self._in_flight = 0
+        self.configure(method, workers, queue, timeout)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+
+    def configure(self, method: str, workers: int, queue: int,
+                  timeout: float) -> None:
+        self.method = canonical_method(method)
+        self.workers = max(0, int(workers))
+        self.timeout = float(timeout)
+        self._slots = threading.BoundedSemaphore(
+            max(1, self.workers + max(0, int(queue)))
+        )
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Un pool por proceso: el de un master (o el de otro worker) no
+        # sirve tras el fork, así que se crea en el primer uso.
+        if self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pid != os.getpid():
+                # forkserver: los procesos nacen de un servidor limpio que
+                # solo importa werkzeug.security, no de un worker con hilos
+                # y conexiones abiertas.
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                if ctx.get_start_method() == "forkserver":
+                    ctx.set_forkserver_preload(["werkzeug.security"])
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=ctx)
+                self._pid = os.getpid()
+        return self._pool
+
+    def _run(self, func, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise CredentialsBusy()
+        with self._count_lock:
+            self._in_flight += 1
+
+        def release(_=None):
+            with self._count_lock:
+                self._in_flight -= 1
+            slots.release()
+
+        if not self.workers:
+            try:
+                return func(*args)
+            finally:
+                release()
+        try:
+            future = self._executor().submit(func, *args)
+        except Exception:
+            release()
+            raise
+        # El hueco se libera cuando el proceso termina, no al vencer el
+        # plazo: así el límite cuenta también los hashes abandonados.
+        future.add_done_callback(release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise CredentialsBusy() from None
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """El hash guardado usa otro método o coste que el configurado."""
+        return password_hash.split("$", 1)[0] != self.method
+
+    def shutdown(self) -> None:
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._pid = None
+
+
+password_hasher = PasswordHasher()
+
+
+# ----------------------------------------------------------------------
+#  LÍMITE DE INTENTOS (POR IP Y POR CORREO)
+# ----------------------------------------------------------------------
+class LoginThrottle:
+    """
+    Ventana fija por clave ("ip:1.2.3.4", "email:ana@x"): al llegar a
+    `limit` fallos dentro de `window` segundos la clave queda bloqueada
+    hasta que acaba la ventana, y esas peticiones no calculan ningún hash.
+
+    Vive en memoria del worker, como LocalBackend de la caché: con N
+    workers el límite efectivo es, como mucho, N veces el configurado.
+    Guarda a lo sumo `max_keys` claves (las más viejas se olvidan).
+    """
+
+    def __init__(self, window: float = 900, max_keys: int = 10_000):
+        self.window = float(window)
+        self.max_keys = max(1, int(max_keys))
+        self._hits: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def retry_after(self, key: str, limit: int,
+                    now: float | None = None) -> int:
+        """Segundos hasta poder reintentar (0 = permitido)."""
+        if limit <= 0:
+            return 0
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            entry = self._hits.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                return 0
+            if entry[1] < limit:
+                return 0
+            return max(1, math.ceil(entry[0] + self.window - now))
+
+    def hit(self, key: str, now: float | None = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            entry = self._hits.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                entry = [now, 0]
+            entry[1] += 1
+            self._hits[key] = entry
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+login_throttle = LoginThrottle()
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_credentials(app):
+    """
+    PASSWORD_HASH_METHOD  método de Werkzeug ("scrypt:32768:8:1",
+                          "pbkdf2:sha256:600000"...); los hashes con otro
+                          coste se rehacen en el siguiente login correcto
+    PASSWORD_HASH_WORKERS procesos de hash por worker (0 = en el hilo)
+    PASSWORD_HASH_QUEUE   hashes que pueden esperar turno; más → 503
+    """
+    password_hasher.shutdown()
+    password_hasher.configure(
+        app.config["PASSWORD_HASH_METHOD"],
+        app.config["PASSWORD_HASH_WORKERS"],
+        app.config["PASSWORD_HASH_QUEUE"],
+        app.config["PASSWORD_HASH_TIMEOUT"],
+    )
+    login_throttle.window = app.config["LOGIN_THROTTLE_WINDOW_SECONDS"]
+    app.extensions["password_hasher"] = password_hasher
+    return app
@@ -1,9 +1,13 @@
+import os
+
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event, exc
 
 # Convención para nombres de constraints
 convention = {
-    "ix": "ix_%(column_0_label)s",
+    # ix_<tabla>_<col1>_<col2>...: igual al anterior para índices de una
+    # sola columna y con nombre legible para los compuestos.
+    "ix": "ix_%(table_name)s_%(column_0_N_name)s",
     "uq": "uq_%(table_name)s_%(column_0_name)s",
     "ck": "ck_%(table_name)s_%(constraint_name)s",
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
@@ -14,8 +18,71 @@ metadata = MetaData(naming_convention=convention)
 db = SQLAlchemy(metadata=metadata)
 
 
+# ----------------------------------------------------------------------
+#  POOL DE CONEXIONES
+# ----------------------------------------------------------------------
+def engine_options(db_url: str, config) -> dict:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS a partir de la configuración DB_*. El
+    tamaño del pool es por proceso: workers * (DB_POOL_SIZE +
+    DB_MAX_OVERFLOW) no debe pasar de max_connections del servidor.
+    """
+    options = {
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+    if db_url.startswith("postgresql"):
+        options.update(
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_timeout=config["DB_POOL_TIMEOUT"],
+        )
+        # psycopg3 prepara en el servidor las sentencias que se repiten
+        # `prepare_threshold` veces; None lo desactiva (necesario detrás
+        # de PgBouncer en modo transacción).
+        threshold = config["DB_PREPARE_THRESHOLD"]
+        if threshold is not False:
+            options["connect_args"] = {"prepare_threshold": threshold}
+    return options
+
+
+def _guard_fork(engine) -> None:
+    """
+    Una conexión abierta antes de un fork nunca se usa en el hijo: si
+    algún proceso se salta dispose_engines, el pool la descarta al
+    sacarla y abre otra.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _remember_pid(dbapi_connection, connection_record):
+        connection_record.info["pid"] = os.getpid()
+
+    @event.listens_for(engine, "checkout")
+    def _check_pid(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info.get("pid") != pid:
+            connection_record.dbapi_connection = None
+            connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                f"Conexión creada en el proceso "
+                f"{connection_record.info.get('pid')}, usada en {pid}"
+            )
+
+
+def dispose_engines(app, close: bool = False) -> None:
+    """
+    Vacía el pool. Tras el fork (hook post_fork de gunicorn) se usa
+    close=False: los sockets heredados siguen siendo del master.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
 def init_db(app):
     db.init_app(app)
     with app.app_context():
+        for engine in db.engines.values():
+            _guard_fork(engine)
         db.create_all()
     return db
@@ -0,0 +1,107 @@
+# deletion.py
+from __future__ import annotations
+
+from sqlalchemy import delete, select
+
+from db import db
+from models import (
+    User,
+    Category,
+    Income,
+    SavingGoal,
+    SavingDeposit,
+    IncomeDailyRollup,
+    IncomeMonthlyRollup,
+    StateSnapshot,
+    ChangeLog,
+    AppliedOperation,
+)
+
+# Filas por sentencia en las tablas que pueden ser enormes
+DELETE_CHUNK_ROWS = 10_000
+
+
+# ----------------------------------------------------------------------
+#  BORRADO DE CUENTAS POR CONJUNTOS
+# ----------------------------------------------------------------------
+def _delete_in_chunks(model, where, chunk_size: int) -> tuple[int, int]:
+    """
+    DELETE ... WHERE id IN (SELECT id ... LIMIT n) hasta vaciar.
+    Devuelve (filas borradas, sentencias ejecutadas).
+    """
+    deleted = statements = 0
+    while True:
+        ids = select(model.id).where(where).limit(chunk_size)
+        result = db.session.execute(
+            delete(model)
+            .where(model.id.in_(ids.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+        statements += 1
+        count = result.rowcount or 0
+        deleted += count
+        if count < chunk_size:
+            return deleted, statements
+
+
+def delete_users(
+    user_ids: list[int], chunk_size: int = DELETE_CHUNK_ROWS
+) -> dict:
+    """
+    Borra usuarios y todos sus datos sin cargar filas en la sesión:
+    aportes (vía subconsulta de metas), metas, ingresos, acumulados,
+    instantáneas, registro de cambios, claves de idempotencia,
+    categorías y por último los usuarios. No hace commit, así que todo
+    queda en la transacción del llamador.
+
+    Devuelve las filas borradas por tabla y el total de sentencias.
+    Las tablas grandes se borran en bloques de `chunk_size` filas.
+    """
+    if not user_ids:
+        return {"rows": {}, "statements": 0}
+
+    goal_ids = select(SavingGoal.id).where(SavingGoal.user_id.in_(user_ids))
+    rows: dict[str, int] = {}
+    statements = 0
+
+    chunked = [
+        ("saving_deposits", SavingDeposit,
+         SavingDeposit.goal_id.in_(goal_ids)),
+        ("incomes", Income, Income.user_id.in_(user_ids)),
+    ]
+    for table, model, where in chunked:
+        rows[table], n = _delete_in_chunks(model, where, chunk_size)
+        statements += n
+
+    single = [
+        ("saving_goals", delete(SavingGoal).where(
+            SavingGoal.user_id.in_(user_ids)
+        )),
+        ("income_daily_rollup", delete(IncomeDailyRollup).where(
+            IncomeDailyRollup.user_id.in_(user_ids)
+        )),
+        ("income_monthly_rollup", delete(IncomeMonthlyRollup).where(
+            IncomeMonthlyRollup.user_id.in_(user_ids)
+        )),
+        ("change_log", delete(ChangeLog).where(
+            ChangeLog.user_id.in_(user_ids)
+        )),
+        ("applied_operations", delete(AppliedOperation).where(
+            AppliedOperation.user_id.in_(user_ids)
+        )),
+        ("state_snapshots", delete(StateSnapshot).where(
+            StateSnapshot.user_id.in_(user_ids)
+        )),
+        ("categories", delete(Category).where(
+            Category.user_id.in_(user_ids)
+        )),
+        ("users", delete(User).where(User.id.in_(user_ids))),
+    ]
+    for table, stmt in single:
+        result = db.session.execute(
+            stmt.execution_options(synchronize_session=False)
+        )
+        rows[table] = result.rowcount or 0
+        statements += 1
+
+    return {"rows": rows, "statements": statements}
@@ -0,0 +1,177 @@
+# exports.py
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from decimal import Decimal
+
+import click
+from sqlalchemy import select
+
+from db import db
+from models import User, Category, Income, SavingGoal, SavingDeposit
+
+EXPORT_FORMATS = ("csv", "jsonl", "columnar")
+CHUNK_ROWS = 1000
+
+# Columnas del CSV unificado. Para categorías "amount" es la meta
+# mensual; para metas de ahorro es el objetivo y "date" la fecha límite.
+CSV_COLUMNS = ["type", "id", "parent_id", "name", "amount", "date"]
+
+
+# ----------------------------------------------------------------------
+#  CONSULTAS (SOLO COLUMNAS, CURSOR EN EL SERVIDOR)
+# ----------------------------------------------------------------------
+def _export_queries(user_id: int, date_from: date | None, date_to: date | None):
+    incomes = select(
+        Income.id, Income.amount, Income.date
+    ).where(Income.user_id == user_id)
+    deposits = (
+        select(
+            SavingDeposit.id,
+            SavingDeposit.goal_id,
+            SavingDeposit.amount,
+            SavingDeposit.date,
+        )
+        .join(SavingGoal, SavingGoal.id == SavingDeposit.goal_id)
+        .where(SavingGoal.user_id == user_id)
+    )
+    if date_from is not None:
+        incomes = incomes.where(Income.date >= date_from)
+        deposits = deposits.where(SavingDeposit.date >= date_from)
+    if date_to is not None:
+        incomes = incomes.where(Income.date <= date_to)
+        deposits = deposits.where(SavingDeposit.date <= date_to)
+
+    return [
+        ("categories", select(
+            Category.id, Category.name, Category.monthly_target
+        ).where(Category.user_id == user_id).order_by(Category.id)),
+        ("saving_goals", select(
+            SavingGoal.id,
+            SavingGoal.name,
+            SavingGoal.target_amount,
+            SavingGoal.deadline,
+        ).where(SavingGoal.user_id == user_id).order_by(SavingGoal.id)),
+        ("incomes", incomes.order_by(Income.date, Income.id)),
+        ("saving_deposits", deposits.order_by(
+            SavingDeposit.date, SavingDeposit.id
+        )),
+    ]
+
+
+def _iter_chunks(stmt):
+    """Bloques de filas con yield_per: memoria constante sin importar el total."""
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_ROWS))
+    for partition in result.partitions():
+        yield [row._asdict() for row in partition]
+
+
+def _plain(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # NUMERIC(14, 2) cabe sin pérdida en un double
+        return float(value)
+    return value
+
+
+# ----------------------------------------------------------------------
+#  SERIALIZADORES
+# ----------------------------------------------------------------------
+def _as_csv_record(table: str, row: dict) -> list:
+    if table == "categories":
+        return ["category", row["id"], "", row["name"],
+                row["monthly_target"], ""]
+    if table == "saving_goals":
+        return ["saving_goal", row["id"], "", row["name"],
+                row["target_amount"], _plain(row["deadline"]) or ""]
+    if table == "incomes":
+        return ["income", row["id"], "", "", row["amount"],
+                _plain(row["date"])]
+    return ["saving_deposit", row["id"], row["goal_id"], "", row["amount"],
+            _plain(row["date"])]
+
+
+def _csv_text(rows: list[list]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def export_user_data(
+    user_id: int,
+    fmt: str = "jsonl",
+    date_from: date | None = None,
+    date_to: date | None = None,
+):
+    """
+    Generador de texto con todo el historial del usuario. Los rangos
+    de fecha filtran ingresos y aportes (categorías y metas van siempre).
+      - csv:      un CSV con CSV_COLUMNS
+      - jsonl:    un objeto por fila, con su "type"
+      - columnar: un objeto por bloque {"table", "columns", "data"}
+    """
+    if fmt == "csv":
+        yield _csv_text([CSV_COLUMNS])
+
+    for table, stmt in _export_queries(user_id, date_from, date_to):
+        for chunk in _iter_chunks(stmt):
+            if fmt == "csv":
+                yield _csv_text([_as_csv_record(table, r) for r in chunk])
+            elif fmt == "columnar":
+                columns = list(chunk[0])
+                yield json.dumps({
+                    "table": table,
+                    "columns": columns,
+                    "data": {
+                        c: [_plain(r[c]) for r in chunk] for c in columns
+                    },
+                }) + "\n"
+            else:
+                yield "".join(
+                    json.dumps(
+                        {"type": table, **{k: _plain(v) for k, v in r.items()}}
+                    ) + "\n"
+                    for r in chunk
+                )
+
+
+def gzip_stream(chunks):
+    """Comprime al vuelo (formato gzip) un generador de texto."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for text_chunk in chunks:
+        data = compressor.compress(text_chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_exports(app):
+    @app.cli.command("export-user")
+    @click.argument("user_id", type=int)
+    @click.argument("path", type=click.Path(dir_okay=False, writable=True))
+    @click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS),
+                  default="jsonl")
+    @click.option("--gzip", "use_gzip", is_flag=True)
+    def export_user_command(user_id, path, fmt, use_gzip):
+        """Respaldo del historial completo de un usuario."""
+        if db.session.get(User, user_id) is None:
+            raise click.ClickException(f"No existe el usuario {user_id}")
+        chunks = export_user_data(user_id, fmt)
+        with open(path, "wb") as fh:
+            if use_gzip:
+                for data in gzip_stream(chunks):
+                    fh.write(data)
+            else:
+                for text_chunk in chunks:
+                    fh.write(text_chunk.encode("utf-8"))
+        click.echo(f"Exportado en {path}")
+
+    return app
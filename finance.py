@@ -3,7 +3,6 @@ from __future__ import annotations
 
 from datetime import date, datetime, timedelta
 import calendar
-import random
 
 from flask import (
     Blueprint,
@@ -13,42 +12,60 @@ from flask import (
     g,
     redirect,
     url_for,
+    Response,
+    abort,
+    has_request_context,
+    make_response,
+    session,
+    stream_with_context,
 )
-from db import db
-from models import User, Category, Income, SavingGoal, SavingDeposit
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 
-finance_bp = Blueprint("finance", __name__)
+from db import db
+from models import User
+from changes import (
+    CHANGES_PAGE_SIZE,
+    changes_since,
+    discard_pending_changes,
+    write_pending_changes,
+)
+from operations import (
+    BATCH_MODES,
+    MAX_BATCH_OPERATIONS,
+    BatchAborted,
+    OperationError,
+    add_deposits,
+    add_incomes,
+    create_category,
+    create_goal,
+    delete_category,
+    delete_goal,
+    owned_goal_ids,
+    run_batch,
+    update_category,
+    update_goal,
+    validate_deposit,
+    validate_income,
+)
+from state_cache import state_cache
+from income_import import import_incomes, iter_income_rows
+from exports import EXPORT_FORMATS, export_user_data, gzip_stream
+from analytics import user_history
+from state_kernel import clamp_working_days
+from state_report import load_state_batch
+from snapshots import (
+    patch_category,
+    patch_deposit,
+    patch_goal,
+    patch_income,
+    snapshot_state,
+    state_from_inputs,
+)
 
-# ----------------------------------------------------------------------
-#  VERSÍCULOS BÍBLICOS FINANCIEROS
-# ----------------------------------------------------------------------
-BIBLE_VERSES = [
-    {
-        "text": "Los planes del diligente ciertamente tienden a la abundancia.",
-        "ref": "Proverbios 21:5",
-    },
-    {
-        "text": "Honra al Señor con tus bienes y con las primicias de todos tus frutos.",
-        "ref": "Proverbios 3:9",
-    },
-    {
-        "text": "El alma del perezoso desea, y nada alcanza; mas el alma de los diligentes será prosperada.",
-        "ref": "Proverbios 13:4",
-    },
-    {
-        "text": "Buscad primero el reino de Dios y su justicia, y todas estas cosas os serán añadidas.",
-        "ref": "Mateo 6:33",
-    },
-    {
-        "text": "Todo lo que hagáis, hacedlo de corazón, como para el Señor y no para los hombres.",
-        "ref": "Colosenses 3:23",
-    },
-]
-
-
-def get_random_verse() -> dict:
-    return random.choice(BIBLE_VERSES)
+MAX_HISTORY_MONTHS = 600
 
+finance_bp = Blueprint("finance", __name__)
 
 # ----------------------------------------------------------------------
 #  HELPERS DE CÁLCULO FINANCIERO
@@ -59,14 +76,7 @@ def get_user_working_days(user: User) -> int:
     Si el modelo no tiene ese campo, usamos 26 por defecto.
     Rango forzado: 22–30.
     """
-    days = getattr(user, "working_days", None)
-    if not days:
-        return 26
-    try:
-        value = int(days)
-    except (TypeError, ValueError):
-        value = 26
-    return max(22, min(30, value))
+    return clamp_working_days(getattr(user, "working_days", None))
 
 
 def compute_financial_state(user: User, today: date | None = None) -> dict:
@@ -79,243 +89,128 @@ def compute_financial_state(user: User, today: date | None = None) -> dict:
       - Estado de categorías
       - Estado de metas de ahorro
       - Versículo del día
+
+    Las 3 consultas fijas (categorías, acumulados diarios del mes y metas
+    con sus aportes sumados) las hace load_state_batch; las reglas viven
+    en state_kernel, que no toca la BD.
     """
     if today is None:
         today = date.today()
-
-    year = today.year
-    month = today.month
-    working_days = get_user_working_days(user)
-
-    # Rango del mes
-    first_day = date(year, month, 1)
-    last_day = date(year, month, calendar.monthrange(year, month)[1])
-
-    # Días transcurridos
-    days_passed = (today - first_day).days + 1
-    if days_passed < 1:
-        days_passed = 1
-
-    # ------------------ CATEGORÍAS / METAS ------------------
-    categories = Category.query.filter_by(user_id=user.id).all()
-    month_target = float(
-        sum(float(c.monthly_target or 0) for c in categories)
+    batch = load_state_batch(
+        [(user.id, get_user_working_days(user))], today
     )
-    if month_target <= 0:
-        month_target = 1.0  # evitamos división por cero
+    return batch.state(0)
 
-    daily_target = month_target / working_days
-
-    # ------------------ INGRESOS DEL MES ------------------
-    incomes_q = Income.query.filter(
-        Income.user_id == user.id,
-        Income.date >= first_day,
-        Income.date <= last_day,
-    )
-    incomes = incomes_q.all()
-    month_income_real = float(sum(float(i.amount or 0) for i in incomes))
 
-    todays_income = float(
-        sum(float(i.amount or 0) for i in incomes if i.date == today)
+def get_financial_state(user: User, today: date | None = None) -> dict:
+    """
+    Estado financiero pasando por la caché por (usuario, día) y, si no
+    está ahí, por la instantánea precalculada del día.
+    """
+    if today is None:
+        today = date.today()
+    return state_cache.get_or_compute(
+        user.id,
+        today,
+        lambda: snapshot_state(user, today),
+        version=user.data_version,
     )
 
-    effective_days_for_target = min(days_passed, working_days)
-    ideal_income_until_today = daily_target * effective_days_for_target
 
-    avg_daily_real = month_income_real / max(1, days_passed)
-    projected_month_income = avg_daily_real * working_days
-    projected_year_income = projected_month_income * 12
+def state_etag(user: User, today: date) -> str:
+    """Validador fuerte: cambia con cada escritura del usuario y cada día."""
+    return f"{user.id}-{user.data_version or 0}-{today.isoformat()}"
 
-    ratio_month = month_income_real / month_target
-    ratio_today = todays_income / daily_target if daily_target > 0 else 0
-    ratio_until_today = (
-        month_income_real / ideal_income_until_today
-        if ideal_income_until_today > 0
-        else 0
-    )
 
-    # ------------------ ESTADO DEL MES (COACH) ------------------
-    if ratio_until_today < 0.5:
-        month_status = "riesgo_alto"
-        month_message = (
-            "Estás muy por debajo de tu meta mensual. "
-            "Revisa gastos, busca una actividad extra y refuerza tus ingresos "
-            "esta semana."
-        )
-    elif ratio_until_today < 0.8:
-        month_status = "riesgo_medio"
-        month_message = (
-            "Vas por debajo del ritmo ideal, pero aún tienes tiempo. "
-            "Aprieta un poco más estos días y protege tus gastos."
-        )
-    elif ratio_until_today <= 1.1:
-        month_status = "alineado"
-        month_message = (
-            "Vas bastante alineado con tu plan. Mantén la disciplina, "
-            "no te confíes y sigue registrando cada día."
-        )
-    else:
-        month_status = "excelente"
-        month_message = (
-            "¡Vas por encima de tu meta! Es un buen momento para fortalecer "
-            "tu ahorro y crear un pequeño colchón extra."
-        )
+def commit_user_change(user_id: int) -> None:
+    """
+    Confirma una escritura de datos del usuario: sube su data_version en
+    la misma transacción, registra los cambios anotados con esa versión
+    como seq, hace commit e invalida la caché. g.user se queda con la
+    versión nueva (para el ETag de la respuesta) sin volver a leerla.
+    """
+    version = db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .returning(User.data_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if version is None:
+        # La cuenta se borró (reaper, admin) con la sesión aún viva
+        db.session.rollback()
+        discard_pending_changes()
+        user_gone()
+        raise LookupError(f"No existe el usuario {user_id}")
+    write_pending_changes(user_id, version)
+    db.session.commit()
+    state_cache.invalidate(user_id)
+    if g.get("user") is not None and g.user.id == user_id:
+        g.user.data_version = version
 
-    # ------------------ ESTADO DEL DÍA ------------------
-    if todays_income == 0:
-        day_status = "sin_registro"
-        day_message = (
-            "Hoy aún no has registrado ingresos. "
-            "La claridad diaria es clave para crecer."
-        )
-    elif ratio_today < 0.7:
-        falta = daily_target - todays_income
-        day_status = "debajo"
-        day_message = (
-            f"Hoy ganaste $ {todays_income:,.0f} y tu meta diaria es "
-            f"$ {daily_target:,.0f}. Te faltaron aprox. "
-            f"$ {falta:,.0f} para cumplir el objetivo de hoy."
-        )
-    elif ratio_today <= 1.1:
-        day_status = "cumplido"
-        day_message = (
-            f"Buen trabajo. Hoy ganaste $ {todays_income:,.0f}, "
-            f"muy cerca o por encima de tu meta diaria de "
-            f"$ {daily_target:,.0f}."
-        )
-    else:
-        extra = todays_income - daily_target
-        day_status = "superado"
-        day_message = (
-            f"¡Excelente! Superaste tu meta diaria por aprox. "
-            f"$ {extra:,.0f}. Considera dirigir una parte de ese extra "
-            "directamente a tu ahorro."
-        )
 
-    # ------------------ ESTADO DE CATEGORÍAS ------------------
-    def category_state(cat: Category) -> dict:
-        meta_cat = float(cat.monthly_target or 0)
+def user_gone() -> None:
+    """
+    En una petición: olvida la sesión de un usuario que ya no existe y
+    corta con 401 (la cola sin conexión lo trata como sesión caducada).
+    """
+    if not has_request_context():
+        return
+    db.session.expunge_all()
+    session.clear()
+    abort(make_response(
+        jsonify({"ok": False, "error": "No autenticado"}), 401
+    ))
 
-        # Estimamos cuánto debería ir a esta categoría según el peso
-        if month_target > 0:
-            real_cat = month_income_real * (meta_cat / month_target)
-        else:
-            real_cat = 0.0
 
-        if working_days > 0:
-            ideal_cat_until_today = meta_cat * (
-                effective_days_for_target / working_days
+def mutation_response(inputs: dict | None, parts: tuple, goal_id=None,
+                      **payload):
+    """
+    Respuesta de una escritura. Con ?return_state=1 incluye solo las
+    partes del estado que esa escritura cambia (y el ETag nuevo):
+      - con las entradas ya parchadas de la instantánea, el kernel las
+        evalúa sin ninguna consulta;
+      - si no había instantánea al día, se cae al estado completo.
+    Con goal_id, en vez de la lista de metas va solo esa meta.
+    "base_version" es la versión sobre la que se aplicó la escritura:
+    si no es la que tiene el cliente, alguien más escribió en medio y
+    las partes no alcanzan (el cliente sincroniza con /api/changes).
+    """
+    body = {"ok": True, **payload}
+    if request.args.get("return_state") != "1":
+        return jsonify(body)
+
+    today = date.today()
+    if inputs is not None:
+        if goal_id is not None:
+            inputs = dict(
+                inputs,
+                categories=[],
+                goals=[x for x in inputs["goals"] if x[0] == goal_id],
             )
-            daily_suggested = meta_cat / working_days
-        else:
-            ideal_cat_until_today = meta_cat
-            daily_suggested = 0.0
-
-        ratio_cat = (
-            real_cat / ideal_cat_until_today
-            if ideal_cat_until_today > 0
-            else 0
-        )
-
-        if ratio_cat < 0.4:
-            estado = "Muy por debajo"
-        elif ratio_cat < 0.8:
-            estado = "Por debajo"
-        elif ratio_cat <= 1.1:
-            estado = "En línea"
-        else:
-            estado = "Por encima"
-
-        pct = (real_cat / meta_cat * 100) if meta_cat > 0 else 0
-
-        return {
-            "id": cat.id,
-            "name": cat.name,
-            "meta_mes": meta_cat,
-            "real_mes_estimado": real_cat,
-            "porcentaje": pct,
-            "estado": estado,
-            "diario_sugerido": daily_suggested,
-        }
-
-    categories_state = [category_state(c) for c in categories]
-
-    # ------------------ AHORRO ------------------
-    goals = SavingGoal.query.filter_by(user_id=user.id).all()
-    saving_state: list[dict] = []
-
-    for goal in goals:
-        deposits = SavingDeposit.query.filter_by(goal_id=goal.id).all()
-        acumulado = float(sum(float(d.amount or 0) for d in deposits))
-        meta = float(goal.target_amount or 0)
-        porcentaje = (acumulado / meta * 100) if meta > 0 else 0
-
-        if goal.deadline and isinstance(goal.deadline, date):
-            dias_restantes = (goal.deadline - today).days
-        else:
-            dias_restantes = None
-
-        if dias_restantes is not None and dias_restantes > 0:
-            diario_ahorro = max(0, (meta - acumulado) / dias_restantes)
-        else:
-            diario_ahorro = 0.0
+        state = state_from_inputs(today, inputs, g.user.id)
+    else:
+        state = get_financial_state(g.user, today)
 
-        if porcentaje >= 100:
-            msg_meta = (
-                "Meta cumplida. Puedes definir un nuevo objetivo de ahorro."
-            )
-        elif porcentaje >= 70:
-            msg_meta = (
-                "Vas muy cerca de tu meta de ahorro. Mantén el ritmo."
-            )
-        elif porcentaje >= 40:
-            msg_meta = (
-                "Vas a mitad de camino. Refuerza un poco tus aportes."
-            )
-        else:
-            msg_meta = (
-                "Estás muy lejos de tu meta. Considera aportes más grandes "
-                "o ampliar el plazo."
+    if goal_id is not None:
+        body["state"] = {
+            "saving_goal": next(
+                (x for x in state["saving"] if x["id"] == goal_id), None
             )
+        }
+    else:
+        body["state"] = {part: state[part] for part in parts}
+    body["etag"] = state_etag(g.user, today)
+    body["version"] = g.user.data_version or 0
+    # commit_user_change sube la versión en exactamente uno
+    body["base_version"] = body["version"] - 1
+    return jsonify(body)
 
-        saving_state.append(
-            {
-                "id": goal.id,
-                "name": goal.name,
-                "meta": meta,
-                "acumulado": acumulado,
-                "porcentaje": porcentaje,
-                "dias_restantes": dias_restantes,
-                "diario_sugerido": diario_ahorro,
-                "mensaje": msg_meta,
-            }
-        )
 
-    verse = get_random_verse()
-
-    return {
-        "summary": {
-            "year": year,
-            "month": month,
-            "month_target": month_target,
-            "working_days": working_days,
-            "daily_target": daily_target,
-            "month_income_real": month_income_real,
-            "todays_income": todays_income,
-            "avg_daily_real": avg_daily_real,
-            "projected_month_income": projected_month_income,
-            "projected_year_income": projected_year_income,
-            "ratio_month": ratio_month,
-            "ratio_until_today": ratio_until_today,
-            "month_status": month_status,
-            "month_message": month_message,
-            "day_status": day_status,
-            "day_message": day_message,
-        },
-        "categories": categories_state,
-        "saving": saving_state,
-        "verse": verse,
-    }
+# Partes del estado que cambia cada tipo de escritura
+INCOME_PARTS = ("summary", "categories")
+CATEGORY_PARTS = ("summary", "categories")
+GOAL_PARTS = ("saving",)
 
 
 # ----------------------------------------------------------------------
@@ -328,15 +223,32 @@ def require_login():
     if request.endpoint and request.endpoint.startswith("finance."):
         if not getattr(g, "user", None):
             return redirect(url_for("auth.login"))
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            # g.user viene de la instantánea de la cookie: antes de
+            # escribir se confirma que la cuenta sigue existiendo. FOR KEY
+            # SHARE hace esperar a un borrado concurrente hasta el commit
+            # sin bloquear otras escrituras del mismo usuario.
+            exists = db.session.execute(
+                select(User.id)
+                .where(User.id == g.user.id)
+                .with_for_update(read=True, key_share=True)
+            ).scalar_one_or_none()
+            if exists is None:
+                user_gone()
 
 
 @finance_bp.route("/dashboard")
 def dashboard():
-    state = compute_financial_state(g.user)
+    # El estado va incrustado en la página: el cliente no repite el
+    # cálculo con /api/state al cargar, solo después de cada cambio.
+    today = date.today()
+    state = get_financial_state(g.user, today)
     return render_template(
         "dashboard.html",
         user=g.user,
         state=state,
+        etag=state_etag(g.user, today),
+        version=g.user.data_version or 0,
     )
 
 
@@ -346,177 +258,331 @@ def api_state():
     if not g.user:
         return jsonify({"ok": False, "error": "No autenticado"}), 401
 
-    state = compute_financial_state(g.user)
-    return jsonify({"ok": True, **state})
+    # El ETag sale de la versión de datos: si el cliente ya lo tiene,
+    # respondemos 304 sin calcular nada.
+    today = date.today()
+    etag = state_etag(g.user, today)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        state = get_financial_state(g.user, today)
+        response = jsonify({
+            "ok": True, **state, "version": g.user.data_version or 0,
+        })
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# ------------------ API: CAMBIOS DESDE UNA VERSIÓN ------------------
+@finance_bp.route("/api/changes", methods=["GET"])
+def api_changes():
+    """
+    Lo que cambió desde la versión que el cliente tiene guardada:
+      ?since=N  ?limit=M  ?day=AAAA-MM-DD (día de su copia)
+    Si no hay cambios y es el mismo día la respuesta son unos bytes. Al
+    terminar de paginar ("more": false) y si algo cambió, va también el
+    estado nuevo: el kernel lo saca de la instantánea sin recalcular.
+    "reset": true = la versión ya no está en el registro.
+    """
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"ok": False, "error": "Versión inválida"}), 400
+    limit = request.args.get("limit", CHANGES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CHANGES_PAGE_SIZE))
+
+    today = date.today()
+    feed = changes_since(
+        g.user.id, since, g.user.data_version or 0, limit=limit
+    )
+    body = {"ok": True, **feed}
+    stale = (
+        feed["changes"]
+        or feed["reset"]
+        or request.args.get("day") != today.isoformat()
+    )
+    if stale and not feed["more"]:
+        body["state"] = get_financial_state(g.user, today)
+        body["etag"] = state_etag(g.user, today)
+    response = jsonify(body)
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
 
 
-# ------------------ API: CATEGORÍAS ------------------
-@finance_bp.route("/api/category", methods=["POST"])
-def api_create_category():
-    data = request.get_json() or {}
-    name = (data.get("name") or "").strip()
-    target = float(data.get("monthly_target") or 0)
+# ------------------ API: HISTORIAL MULTI-MES ------------------
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
 
-    if not name or target <= 0:
-        return jsonify({"ok": False, "error": "Datos inválidos"}), 400
 
-    cat = Category(user_id=g.user.id, name=name, monthly_target=target)
-    db.session.add(cat)
-    db.session.commit()
-    return jsonify({"ok": True, "id": cat.id})
+@finance_bp.route("/api/history", methods=["GET"])
+def api_history():
+    """
+    Totales mes a mes, medias móviles, crecimiento, mejor/peor día y
+    proyección a 12 meses.  ?from=AAAA-MM&to=AAAA-MM (por defecto, los
+    últimos 12 meses).
+    """
+    today = date.today()
+    try:
+        last_month = _parse_month(request.args["to"]) if request.args.get(
+            "to"
+        ) else date(today.year, today.month, 1)
+        if request.args.get("from"):
+            first_day = _parse_month(request.args["from"])
+        else:
+            offset = last_month.year * 12 + last_month.month - 12
+            first_day = date(offset // 12, offset % 12 + 1, 1)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Mes inválido (AAAA-MM)"}), 400
 
+    last_day = date(
+        last_month.year,
+        last_month.month,
+        calendar.monthrange(last_month.year, last_month.month)[1],
+    )
+    n_months = (
+        (last_month.year - first_day.year) * 12
+        + last_month.month - first_day.month + 1
+    )
+    if n_months < 1 or n_months > MAX_HISTORY_MONTHS:
+        return jsonify({"ok": False, "error": "Rango inválido"}), 400
 
-@finance_bp.route("/api/category/<int:cat_id>", methods=["PUT"])
-def api_update_category(cat_id: int):
-    cat = Category.query.filter_by(id=cat_id, user_id=g.user.id).first()
-    if not cat:
-        return jsonify({"ok": False, "error": "No encontrado"}), 404
+    return jsonify({"ok": True, **user_history(g.user.id, first_day, last_day)})
 
-    data = request.get_json() or {}
-    name = (data.get("name") or "").strip()
-    target = data.get("monthly_target")
 
-    if name:
-        cat.name = name
-    if target is not None:
+# ------------------ API: EXPORTACIÓN ------------------
+@finance_bp.route("/api/export", methods=["GET"])
+def api_export():
+    """
+    Descarga en streaming de todo el historial del usuario.
+      ?format=csv|jsonl|columnar  ?from=AAAA-MM-DD  ?to=AAAA-MM-DD  ?gzip=1
+    """
+    fmt = request.args.get("format", "jsonl")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"ok": False, "error": "Formato no soportado"}), 400
+
+    bounds = {}
+    for key in ("from", "to"):
+        value = request.args.get(key) or ""
         try:
-            cat.monthly_target = float(target)
+            bounds[key] = (
+                datetime.strptime(value, "%Y-%m-%d").date() if value else None
+            )
         except ValueError:
-            pass
+            return jsonify({"ok": False, "error": "Fecha inválida"}), 400
+
+    chunks = export_user_data(g.user.id, fmt, bounds["from"], bounds["to"])
+    filename = f"finanzas-{g.user.id}.{'csv' if fmt == 'csv' else 'jsonl'}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if request.args.get("gzip") == "1":
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{filename}"'
+    )
+    return response
 
-    db.session.commit()
-    return jsonify({"ok": True})
+
+def operation_error(exc: OperationError):
+    db.session.rollback()
+    discard_pending_changes()
+    return jsonify({"ok": False, "error": exc.message}), exc.status
+
+
+# ------------------ API: CATEGORÍAS ------------------
+@finance_bp.route("/api/category", methods=["POST"])
+def api_create_category():
+    try:
+        cat = create_category(g.user.id, request.get_json() or {})
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_category(g.user.id, cat)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, CATEGORY_PARTS, id=cat.id)
+
+
+@finance_bp.route("/api/category/<int:cat_id>", methods=["PUT"])
+def api_update_category(cat_id: int):
+    try:
+        cat = update_category(g.user.id, cat_id, request.get_json() or {})
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_category(g.user.id, cat)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, CATEGORY_PARTS)
 
 
 @finance_bp.route("/api/category/<int:cat_id>", methods=["DELETE"])
 def api_delete_category(cat_id: int):
-    cat = Category.query.filter_by(id=cat_id, user_id=g.user.id).first()
-    if not cat:
-        return jsonify({"ok": False, "error": "No encontrado"}), 404
-
-    db.session.delete(cat)
-    db.session.commit()
-    return jsonify({"ok": True})
+    try:
+        cat = delete_category(g.user.id, cat_id)
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_category(g.user.id, cat, deleted=True)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, CATEGORY_PARTS)
 
 
 # ------------------ API: INGRESOS ------------------
 @finance_bp.route("/api/income", methods=["POST"])
 def api_add_income():
-    data = request.get_json() or {}
-    amount = float(data.get("amount") or 0)
-    date_str = data.get("date") or ""
     try:
-        income_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    except ValueError:
-        income_date = date.today()
+        amount, income_date = validate_income(request.get_json() or {})
+    except OperationError as exc:
+        return operation_error(exc)
+    (income_id,) = add_incomes(g.user.id, [(amount, income_date)])
+    inputs = patch_income(g.user.id, income_date, amount)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, INCOME_PARTS, id=income_id)
 
-    if amount <= 0:
-        return jsonify({"ok": False, "error": "Monto inválido"}), 400
 
-    income = Income(user_id=g.user.id, amount=amount, date=income_date)
-    db.session.add(income)
-    db.session.commit()
-    return jsonify({"ok": True})
+@finance_bp.route("/api/income/import", methods=["POST"])
+def api_import_incomes():
+    """
+    Importación masiva en streaming. El cuerpo puede ser el archivo
+    crudo o un multipart con el campo "file".
+      ?format=csv|jsonl  (por defecto según Content-Type)
+      ?strict=1          (todo o nada)
+    """
+    fmt = request.args.get("format")
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is None:
+            return jsonify({"ok": False, "error": "Falta el archivo"}), 400
+        stream = upload.stream
+        if fmt is None and (upload.filename or "").lower().endswith(".csv"):
+            fmt = "csv"
+    else:
+        stream = request.stream
+        if fmt is None and request.mimetype == "text/csv":
+            fmt = "csv"
+    fmt = fmt or "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"ok": False, "error": "Formato no soportado"}), 400
+
+    strict = request.args.get("strict") == "1"
+    report = import_incomes(
+        g.user.id, iter_income_rows(stream, fmt), strict=strict
+    )
+    if report.get("aborted"):
+        db.session.rollback()
+        discard_pending_changes()
+        return jsonify({"ok": False, **report}), 400
+
+    # Sin detalle por fila: el registro lleva una marca "reset" y los
+    # clientes piden el estado completo una vez.
+    commit_user_change(g.user.id)
+    return jsonify({"ok": True, **report})
 
 
 # ------------------ API: METAS DE AHORRO ------------------
 @finance_bp.route("/api/saving_goal", methods=["POST"])
 def api_create_saving_goal():
-    data = request.get_json() or {}
-    name = (data.get("name") or "").strip()
-    target_amount = float(data.get("target_amount") or 0)
-    deadline_str = data.get("deadline") or ""
-
-    if not name or target_amount <= 0:
-        return jsonify({"ok": False, "error": "Datos inválidos"}), 400
-
-    if deadline_str:
-        try:
-            deadline = datetime.strptime(deadline_str, "%Y-%m-%d").date()
-        except ValueError:
-            deadline = None
-    else:
-        deadline = None
-
-    goal = SavingGoal(
-        user_id=g.user.id,
-        name=name,
-        target_amount=target_amount,
-        deadline=deadline,
-    )
-    db.session.add(goal)
-    db.session.commit()
-    return jsonify({"ok": True, "id": goal.id})
+    try:
+        goal = create_goal(g.user.id, request.get_json() or {})
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_goal(g.user.id, goal)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, GOAL_PARTS, id=goal.id)
 
 
 @finance_bp.route("/api/saving_goal/<int:goal_id>", methods=["PUT"])
 def api_update_saving_goal(goal_id: int):
-    goal = SavingGoal.query.filter_by(id=goal_id, user_id=g.user.id).first()
-    if not goal:
-        return jsonify({"ok": False, "error": "No encontrado"}), 404
-
-    data = request.get_json() or {}
-    name = (data.get("name") or "").strip()
-    target_amount = data.get("target_amount")
-    deadline_str = data.get("deadline") or ""
-
-    if name:
-        goal.name = name
-    if target_amount is not None:
-        try:
-            goal.target_amount = float(target_amount)
-        except ValueError:
-            pass
-    if deadline_str:
-        try:
-            goal.deadline = datetime.strptime(
-                deadline_str, "%Y-%m-%d"
-            ).date()
-        except ValueError:
-            pass
-
-    db.session.commit()
-    return jsonify({"ok": True})
+    try:
+        goal = update_goal(g.user.id, goal_id, request.get_json() or {})
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_goal(g.user.id, goal)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, GOAL_PARTS)
 
 
 @finance_bp.route("/api/saving_goal/<int:goal_id>", methods=["DELETE"])
 def api_delete_saving_goal(goal_id: int):
-    goal = SavingGoal.query.filter_by(id=goal_id, user_id=g.user.id).first()
-    if not goal:
-        return jsonify({"ok": False, "error": "No encontrado"}), 404
-
-    # Borramos también sus depósitos
-    SavingDeposit.query.filter_by(goal_id=goal.id).delete()
-    db.session.delete(goal)
-    db.session.commit()
-    return jsonify({"ok": True})
+    try:
+        goal = delete_goal(g.user.id, goal_id)
+    except OperationError as exc:
+        return operation_error(exc)
+    inputs = patch_goal(g.user.id, goal, deleted=True)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, GOAL_PARTS)
 
 
 # ------------------ API: APORTES A METAS DE AHORRO ------------------
 @finance_bp.route("/api/saving_deposit", methods=["POST"])
 def api_create_saving_deposit():
-    data = request.get_json() or {}
-    goal_id = int(data.get("goal_id") or 0)
-    amount = float(data.get("amount") or 0)
-    date_str = data.get("date") or ""
-
-    if amount <= 0 or not goal_id:
-        return jsonify({"ok": False, "error": "Datos inválidos"}), 400
-
-    goal = SavingGoal.query.filter_by(id=goal_id, user_id=g.user.id).first()
-    if not goal:
-        return jsonify({"ok": False, "error": "Meta no encontrada"}), 404
-
     try:
-        deposit_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    except ValueError:
-        deposit_date = date.today()
+        goal_id, amount, deposit_date = validate_deposit(
+            request.get_json() or {}
+        )
+        if not owned_goal_ids(g.user.id, [goal_id]):
+            raise OperationError("Meta no encontrada", 404)
+    except OperationError as exc:
+        return operation_error(exc)
+    (deposit_id,) = add_deposits([(goal_id, amount, deposit_date)])
+    inputs = patch_deposit(g.user.id, goal_id, amount)
+    commit_user_change(g.user.id)
+    return mutation_response(inputs, GOAL_PARTS, goal_id=goal_id,
+                             id=deposit_id)
+
+
+# ------------------ API: LOTE DE OPERACIONES ------------------
+@finance_bp.route("/api/batch", methods=["POST"])
+def api_batch():
+    """
+    Varias escrituras en orden y en una sola transacción:
+      {"mode": "atomic" | "best_effort",
+       "operations": [{"op": "income.create", "data": {...}},
+                      {"op": "saving_goal.create", "ref": "g",
+                       "data": {...}},
+                      {"op": "saving_deposit.create",
+                       "data": {"goal_id": {"ref": "g"}, ...}}, ...]}
+    Operaciones: category.create|update|delete, income.create,
+    saving_goal.create|update|delete, saving_deposit.create (update y
+    delete llevan "id"). Mismas reglas que las rutas individuales.
+    Cada operación puede llevar "key" (idempotencia, ver run_batch): la
+    cola sin conexión la usa para que un reenvío no duplique filas.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get("operations")
+    mode = data.get("mode") or "atomic"
+    if not isinstance(operations, list) or mode not in BATCH_MODES:
+        return jsonify({"ok": False, "error": "Lote inválido"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({
+            "ok": False,
+            "error": f"Máximo {MAX_BATCH_OPERATIONS} operaciones por lote",
+        }), 413
 
-    deposit = SavingDeposit(
-        goal_id=goal.id,
-        amount=amount,
-        date=deposit_date,
-    )
-    db.session.add(deposit)
-    db.session.commit()
-    return jsonify({"ok": True})
+    try:
+        report = run_batch(g.user.id, operations, atomic=mode == "atomic")
+        if report["applied"]:
+            # La instantánea del día queda vieja por data_version y se
+            # recalcula en la próxima lectura (un lote cambia de todo).
+            commit_user_change(g.user.id)
+    except BatchAborted as exc:
+        db.session.rollback()
+        discard_pending_changes()
+        return jsonify({
+            "ok": False,
+            "error": exc.error.message,
+            "index": exc.index,
+        }), exc.error.status
+    except IntegrityError:
+        # Otro envío con las mismas claves se aplicó a la vez: nada de
+        # este lote queda guardado y el reintento las verá como repetidas
+        db.session.rollback()
+        discard_pending_changes()
+        return jsonify({
+            "ok": False, "error": "Lote ya aplicado en otra petición",
+        }), 409
+
+    if not report["applied"]:
+        db.session.rollback()
+        discard_pending_changes()
+    return jsonify({
+        "ok": True, **report, "version": g.user.data_version or 0,
+    })
@@ -0,0 +1,73 @@
+# gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Todo se ajusta por entorno. Conexiones a la BD por instancia, como
+# máximo: WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# ===========================
+# WORKERS
+# ===========================
+workers = int(os.getenv(
+    "WEB_CONCURRENCY", str(min(multiprocessing.cpu_count() * 2 + 1, 4))
+))
+# Con más de un hilo gunicorn usa el worker gthread; cada hilo puede
+# tener una conexión, así que DB_POOL_SIZE debería ser >= GUNICORN_THREADS.
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Reciclar workers de vez en cuando acota fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# La app (y sus migraciones) se carga una vez en el master
+preload_app = True
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+# ===========================
+# HOOKS
+# ===========================
+def when_ready(server):
+    """El master no atiende peticiones: cierra lo que abrió al arrancar."""
+    from app import app
+    from db import dispose_engines
+
+    dispose_engines(app, close=True)
+
+
+def post_fork(server, worker):
+    """
+    El master abrió conexiones al arrancar (create_all, migraciones):
+    cada worker empieza con un pool vacío y lanza sus tareas de fondo.
+    """
+    from app import app
+    from db import dispose_engines
+    from scheduler import start_periodic_tasks
+
+    dispose_engines(app)
+    started = start_periodic_tasks(app)
+    server.log.info("Worker %s: pool nuevo, tareas %s", worker.pid, started)
+
+
+def worker_exit(server, worker):
+    """
+    Vuelca la actividad pendiente antes de que el worker termine y cierra
+    su pool de hashes de contraseña.
+    """
+    from app import app
+    from activity import flush_activity
+    from credentials import password_hasher
+
+    flushed = flush_activity(app)
+    if flushed:
+        server.log.info("Worker %s: %s actividades volcadas",
+                        worker.pid, flushed)
+    password_hasher.shutdown()
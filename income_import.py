@@ -0,0 +1,193 @@
+# income_import.py
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+import click
+from sqlalchemy import insert
+
+from db import db
+from models import Income, User
+from rollups import apply_income_deltas
+from money import ZERO, to_money
+
+MAX_REPORTED_ERRORS = 100
+
+
+# ----------------------------------------------------------------------
+#  LECTURA EN STREAMING
+# ----------------------------------------------------------------------
+def iter_income_rows(stream, fmt: str):
+    """
+    Lee un CSV (columnas amount,date) o JSON-lines ({"amount", "date"})
+    línea a línea desde un stream binario, sin cargarlo entero.
+    Produce (número de línea, monto crudo, fecha cruda, error de lectura).
+    """
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row.get("amount"), row.get("date"), None
+        return
+
+    for line_no, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield line_no, None, None, "JSON inválido"
+            continue
+        if not isinstance(obj, dict):
+            yield line_no, None, None, "Se esperaba un objeto JSON"
+            continue
+        yield line_no, obj.get("amount"), obj.get("date"), None
+
+
+def parse_income_row(amount_raw, date_raw) -> tuple[Decimal, date]:
+    """
+    Mismas reglas que api_add_income: monto positivo y fecha %Y-%m-%d
+    (vacía = hoy). Aquí una fecha mal escrita es un error, no "hoy".
+    """
+    try:
+        amount = to_money(amount_raw)
+    except ValueError:
+        raise ValueError("Monto inválido")
+    if amount <= 0:
+        raise ValueError("Monto inválido")
+
+    if not date_raw:
+        return amount, date.today()
+    # Equivale a strptime("%Y-%m-%d") pero ~10x más rápido por fila
+    date_str = str(date_raw)
+    try:
+        if len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-":
+            raise ValueError
+        return amount, date.fromisoformat(date_str)
+    except ValueError:
+        raise ValueError("Fecha inválida (usa AAAA-MM-DD)")
+
+
+# ----------------------------------------------------------------------
+#  INSERCIÓN POR LOTES
+# ----------------------------------------------------------------------
+def insert_income_rows(rows: list[dict]) -> None:
+    conn = db.session.connection()
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg":
+        # COPY sobre la misma conexión (y la misma transacción)
+        raw = conn.connection.driver_connection
+        with raw.cursor() as cur:
+            with cur.copy(
+                "COPY incomes (user_id, amount, date) FROM STDIN"
+            ) as copy:
+                for r in rows:
+                    copy.write_row((r["user_id"], r["amount"], r["date"]))
+        return
+    # executemany de Core (sin la contabilidad del ORM)
+    db.session.execute(insert(Income.__table__), rows)
+
+
+def import_incomes(
+    user_id: int,
+    rows,
+    chunk_size: int = 5000,
+    strict: bool = False,
+) -> dict:
+    """
+    Valida e inserta los ingresos de `rows` en lotes de `chunk_size`.
+    No hace commit: todo queda en la transacción del llamador.
+    La memoria no crece con el archivo: solo el lote actual, un total
+    por día (para los acumulados) y los primeros errores.
+    Con `strict`, cualquier fila inválida cancela la inserción
+    (report["aborted"]) y el llamador debe hacer rollback.
+    """
+    chunk: list[dict] = []
+    deltas: dict[date, list] = {}
+    errors: list[dict] = []
+    report = {"inserted": 0, "error_count": 0, "errors": errors}
+
+    for line_no, amount_raw, date_raw, read_error in rows:
+        try:
+            if read_error:
+                raise ValueError(read_error)
+            amount, income_date = parse_income_row(amount_raw, date_raw)
+        except ValueError as exc:
+            report["error_count"] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "error": str(exc)})
+            continue
+
+        if strict and report["error_count"]:
+            # Ya no se insertará nada; solo seguimos contando errores
+            continue
+
+        chunk.append({"user_id": user_id, "amount": amount, "date": income_date})
+        acc = deltas.setdefault(income_date, [ZERO, 0])
+        acc[0] += amount
+        acc[1] += 1
+
+        if len(chunk) >= chunk_size:
+            insert_income_rows(chunk)
+            report["inserted"] += len(chunk)
+            chunk = []
+
+    if strict and report["error_count"]:
+        report["inserted"] = 0
+        report["aborted"] = True
+        return report
+
+    if chunk:
+        insert_income_rows(chunk)
+        report["inserted"] += len(chunk)
+
+    if deltas:
+        apply_income_deltas(
+            user_id, {day: tuple(v) for day, v in deltas.items()}
+        )
+    return report
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_income_import(app):
+    @app.cli.command("import-incomes")
+    @click.argument("user_id", type=int)
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]),
+                  default=None, help="Por defecto, según la extensión.")
+    @click.option("--strict", is_flag=True,
+                  help="No importar nada si alguna fila es inválida.")
+    def import_incomes_command(user_id, path, fmt, strict):
+        """Importa ingresos desde un CSV o JSON-lines."""
+        if db.session.get(User, user_id) is None:
+            raise click.ClickException(f"No existe el usuario {user_id}")
+        if fmt is None:
+            fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+        with open(path, "rb") as fh:
+            report = import_incomes(
+                user_id, iter_income_rows(fh, fmt), strict=strict
+            )
+
+        if report.get("aborted"):
+            db.session.rollback()
+        else:
+            from finance import commit_user_change
+
+            commit_user_change(user_id)
+
+        click.echo(
+            f"Importados: {report['inserted']}  "
+            f"Errores: {report['error_count']}"
+        )
+        for err in report["errors"]:
+            click.echo(f"  línea {err['line']}: {err['error']}")
+
+    return app
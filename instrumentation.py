@@ -0,0 +1,336 @@
+# instrumentation.py
+from __future__ import annotations
+
+import hmac
+import ipaddress
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, request
+from sqlalchemy import event
+
+from db import db
+from activity import activity_tracker
+from credentials import password_hasher
+from state_cache import state_cache
+
+# Segundos; los mismos cortes sirven para la petición y para la BD
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+# ----------------------------------------------------------------------
+#  MÉTRICAS (FORMATO DE TEXTO DE PROMETHEUS)
+# ----------------------------------------------------------------------
+# Son por proceso: con varios workers cada uno expone las suyas con la
+# etiqueta worker=<pid> y Prometheus las suma.
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, worker: str) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}"
+                    f"{_labels(self.label_names, labels, worker)} {value:g}"
+                )
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self.buckets = buckets
+        # labels → [conteos por cubeta..., suma, total]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self, worker: str) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, row in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, row):
+                    lines.append(
+                        f"{self.name}_bucket"
+                        f"{_labels(names, labels + (f'{bound:g}',), worker)}"
+                        f" {count}"
+                    )
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_labels(names, labels + ('+Inf',), worker)} {row[-1]}"
+                )
+                plain = _labels(self.label_names, labels, worker)
+                lines.append(f"{self.name}_sum{plain} {row[-2]:g}")
+                lines.append(f"{self.name}_count{plain} {row[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Duración de la petición por endpoint.",
+    ("endpoint", "method"),
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Peticiones atendidas por endpoint y código.",
+    ("endpoint", "method", "status"),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Tiempo en la BD por petición.",
+    ("endpoint",),
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "Sentencias SQL por petición.",
+    ("endpoint",),
+    buckets=STATEMENT_BUCKETS,
+)
+REPEATED_STATEMENTS = Counter(
+    "http_request_repeated_statements_total",
+    "Peticiones con la misma sentencia repetida (posible N+1).",
+    ("endpoint",),
+)
+
+METRICS = (
+    REQUEST_LATENCY,
+    REQUESTS,
+    REQUEST_DB_TIME,
+    REQUEST_STATEMENTS,
+    REPEATED_STATEMENTS,
+)
+
+
+def _gauges(worker: str) -> list[str]:
+    """Valores leídos en el momento: caché, actividad, hashes y pool."""
+    cache = state_cache.stats()
+    values = [
+        ("state_cache_hits_total", "counter",
+         "Aciertos de la caché de estado.", cache["hits"]),
+        ("state_cache_misses_total", "counter",
+         "Fallos de la caché de estado.", cache["misses"]),
+        ("activity_pending_touches", "gauge",
+         "Actividad pendiente de volcar.", activity_tracker.pending_count()),
+        ("password_hash_in_flight", "gauge",
+         "Hashes de contraseña en curso o en cola.",
+         password_hasher.in_flight()),
+    ]
+    pool = db.engine.pool
+    if hasattr(pool, "checkedout"):
+        values.append(("db_pool_checked_out", "gauge",
+                       "Conexiones del pool en uso.", pool.checkedout()))
+    lines = []
+    for name, kind, help_text, value in values:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}",
+                  f"{name}{{{worker}}} {value}"]
+    return lines
+
+
+def render_metrics() -> str:
+    worker = f'worker="{os.getpid()}"'
+    lines = []
+    for metric in METRICS:
+        lines += metric.render(worker)
+    lines += _gauges(worker)
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+#  CONTADORES POR PETICIÓN (EVENTOS DEL ENGINE)
+# ----------------------------------------------------------------------
+class RequestStats:
+    __slots__ = ("started", "statements", "db_seconds", "templates",
+                 "status", "recorded")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        # Texto SQL → repeticiones: los parámetros van aparte, así que
+        # el mismo texto N veces es la misma consulta en un bucle.
+        self.templates: dict[str, int] = {}
+        self.status = 500
+        self.recorded = False
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return sorted(
+            ((sql, n) for sql, n in self.templates.items() if n >= threshold),
+            key=lambda item: -item[1],
+        )
+
+
+# Una por hilo/petición; los hilos de fondo no tienen y no se miden
+_current: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def _listen(engine) -> None:
+    # El inicio va en el contexto de ejecución, que muere con la
+    # sentencia: si falla no queda nada colgando de la conexión
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None and context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        started = getattr(context, "_query_started", None)
+        if stats is None or started is None:
+            return
+        stats.db_seconds += time.perf_counter() - started
+        stats.statements += 1
+        stats.templates[statement] = stats.templates.get(statement, 0) + 1
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def _internal_request() -> bool:
+    """
+    La petición viene de loopback o de una red privada. Detrás de un
+    proxy sin PROXY_HOPS la IP es la del proxy y no dice nada del
+    cliente: si trae X-Forwarded-For sin que ProxyFix lo haya aplicado,
+    no se considera interna.
+    """
+    if ("X-Forwarded-For" in request.headers
+            and "werkzeug.proxy_fix.orig" not in request.environ):
+        return False
+    try:
+        addr = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        return False
+    return addr.is_loopback or addr.is_private
+
+
+def init_instrumentation(app):
+    """
+    Mide cada petición (latencia, sentencias SQL y tiempo en la BD),
+    añade Server-Timing y expone /metrics. Se registra antes que el
+    resto de hooks para contar también lo que hacen ellos.
+      - METRICS_TOKEN: si está, /metrics exige "Authorization: Bearer";
+        si no, solo responde a loopback y redes privadas (403 al resto).
+      - REPEATED_QUERY_THRESHOLD: misma sentencia N veces = aviso N+1.
+    """
+    if not app.config["METRICS_ENABLED"]:
+        return app
+    token = app.config["METRICS_TOKEN"]
+    threshold = app.config["REPEATED_QUERY_THRESHOLD"]
+    server_timing = app.config["SERVER_TIMING"]
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _listen(engine)
+
+    @app.before_request
+    def _start_request_stats():
+        _current.set(RequestStats())
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        stats.status = response.status_code
+        if server_timing:
+            total = (time.perf_counter() - stats.started) * 1000
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.db_seconds * 1000:.1f};'
+                f'desc="{stats.statements} sentencias", '
+                f"app;dur={total:.1f}"
+            )
+        return response
+
+    @app.teardown_request
+    def _record_request_stats(exc):
+        # En teardown (y no en after_request) para incluir errores y
+        # las consultas de las respuestas en streaming.
+        stats = _current.get()
+        if stats is None or stats.recorded:
+            return
+        stats.recorded = True
+        _current.set(None)
+
+        endpoint = request.endpoint or "<sin ruta>"
+        method = request.method
+        if exc is not None:
+            stats.status = 500
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - stats.started, endpoint, method
+        )
+        REQUESTS.inc(endpoint, method, str(stats.status))
+        REQUEST_DB_TIME.observe(stats.db_seconds, endpoint)
+        REQUEST_STATEMENTS.observe(stats.statements, endpoint)
+
+        repeated = stats.repeated(threshold)
+        if repeated:
+            REPEATED_STATEMENTS.inc(endpoint)
+            sql, n = repeated[0]
+            app.logger.warning(
+                "Posible N+1 en %s %s: %s veces «%s»",
+                method, endpoint, n, " ".join(sql.split())[:160],
+            )
+
+    @app.route("/metrics")
+    def metrics():
+        if token and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return Response("No autorizado\n", status=401,
+                            mimetype="text/plain")
+        if not token and not _internal_request():
+            return Response("Prohibido\n", status=403,
+                            mimetype="text/plain")
+        return Response(render_metrics(),
+                        mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,283 @@
+# migrations.py
+from __future__ import annotations
+
+from datetime import datetime
+
+import click
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    select,
+    text,
+)
+
+from db import db
+from models import (
+    User,
+    Category,
+    Income,
+    SavingGoal,
+    SavingDeposit,
+    IncomeDailyRollup,
+    IncomeMonthlyRollup,
+    StateSnapshot,
+    ChangeLog,
+    AppliedOperation,
+)
+from rollups import rebuild_rollups
+
+# Tabla de control propia (fuera de db.metadata para que create_all
+# no la confunda con un modelo de la app).
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ----------------------------------------------------------------------
+#  HELPERS
+# ----------------------------------------------------------------------
+def _add_column_if_missing(conn, model, column_name: str) -> None:
+    """ALTER TABLE ... ADD COLUMN usando la definición del modelo."""
+    table = model.__table__
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    if column_name in existing:
+        return
+    column = table.c[column_name]
+    ddl_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column_name} {ddl_type}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if not isinstance(default, str):
+            default = default.compile(dialect=conn.dialect)
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def _create_index(conn, name: str, table: str, *columns: str) -> None:
+    """
+    CREATE INDEX con nombre y columnas escritos en la migración (no
+    leídos del modelo), para que una migración publicada haga siempre
+    lo mismo. `columns` admite operador: "email text_pattern_ops".
+    """
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+        f"({', '.join(columns)})"
+    ))
+
+
+# ----------------------------------------------------------------------
+#  MIGRACIONES (EN ORDEN, NUNCA REESCRIBIR UNA YA PUBLICADA)
+# ----------------------------------------------------------------------
+# Los índices de una migración se escriben aquí con nombre y columnas:
+# cambiar __table_args__ de un modelo no debe cambiar lo que hace una
+# migración vieja. Un índice nuevo va en una migración nueva.
+def _m001_hot_filter_indexes(conn) -> None:
+    # De users solo last_active_at: el resto de sus índices usa columnas
+    # que agrega la 004
+    _create_index(conn, "ix_users_last_active_at", "users", "last_active_at")
+    _create_index(conn, "ix_categories_user_id", "categories", "user_id")
+    _create_index(conn, "ix_incomes_user_id_date", "incomes",
+                  "user_id", "date")
+    _create_index(conn, "ix_saving_goals_user_id", "saving_goals", "user_id")
+    _create_index(conn, "ix_saving_deposits_goal_id_date", "saving_deposits",
+                  "goal_id", "date")
+
+
+def _m002_income_rollups(conn) -> None:
+    IncomeDailyRollup.__table__.create(conn, checkfirst=True)
+    IncomeMonthlyRollup.__table__.create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+
+def _m003_user_data_version(conn) -> None:
+    _add_column_if_missing(conn, User, "data_version")
+
+
+def _m004_user_profile_columns(conn) -> None:
+    for column_name in ("name", "is_admin", "created_at", "last_login_at"):
+        _add_column_if_missing(conn, User, column_name)
+    # Las cuentas previas no tenían fecha de creación: usamos la última
+    # actividad como aproximación para poder paginar por (created_at, id).
+    users = User.__table__
+    conn.execute(
+        users.update()
+        .where(users.c.created_at.is_(None))
+        .values(created_at=func.coalesce(
+            users.c.last_active_at, func.current_timestamp()
+        ))
+    )
+    # Paginación del panel admin y búsqueda por prefijo del correo
+    _create_index(conn, "ix_users_created_at_id", "users", "created_at", "id")
+    if conn.dialect.name == "postgresql":
+        _create_index(conn, "ix_users_email_pattern", "users",
+                      "email text_pattern_ops")
+
+
+def _m005_on_delete_cascade(conn) -> None:
+    """
+    Recrea las FKs con ON DELETE CASCADE (solo Postgres: SQLite no
+    permite alterar constraints y create_all ya las crea así).
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    models = (
+        Category, Income, SavingGoal, SavingDeposit,
+        IncomeDailyRollup, IncomeMonthlyRollup,
+    )
+    for model in models:
+        table = model.__table__
+        for fk in table.foreign_key_constraints:
+            cols = [c.name for c in fk.columns]
+            for existing in inspector.get_foreign_keys(table.name):
+                if existing["constrained_columns"] != cols:
+                    continue
+                if (existing.get("options") or {}).get("ondelete") == "CASCADE":
+                    continue
+                conn.execute(text(
+                    f'ALTER TABLE {table.name} '
+                    f'DROP CONSTRAINT "{existing["name"]}"'
+                ))
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD CONSTRAINT {fk.name} "
+                    f"FOREIGN KEY ({', '.join(cols)}) "
+                    f"REFERENCES {fk.referred_table.name} (id) "
+                    f"ON DELETE CASCADE"
+                ))
+
+
+def _m006_exact_money(conn) -> None:
+    """
+    Float → NUMERIC(14, 2) redondeando a centavos, y reconstrucción de
+    los acumulados con sumas exactas. En SQLite no hay que cambiar nada
+    (NUMERIC es solo afinidad y los montos siguen siendo REAL); solo se
+    reconstruyen los acumulados.
+    """
+    if conn.dialect.name == "postgresql":
+        columns = [
+            (Category, "monthly_target"),
+            (Income, "amount"),
+            (SavingGoal, "target_amount"),
+            (SavingDeposit, "amount"),
+            (IncomeDailyRollup, "total"),
+            (IncomeMonthlyRollup, "total"),
+        ]
+        for model, column_name in columns:
+            table = model.__table__.name
+            ddl_type = model.__table__.c[column_name].type.compile(
+                dialect=conn.dialect
+            )
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column_name} "
+                f"TYPE {ddl_type} USING round({column_name}::numeric, 2)"
+            ))
+    rebuild_rollups(conn)
+
+
+def _m007_state_snapshots(conn) -> None:
+    StateSnapshot.__table__.create(conn, checkfirst=True)
+
+
+def _m008_change_log(conn) -> None:
+    ChangeLog.__table__.create(conn, checkfirst=True)
+
+
+def _m009_applied_operations(conn) -> None:
+    AppliedOperation.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "Índices de filtros frecuentes", _m001_hot_filter_indexes),
+    (2, "Acumulados diarios/mensuales de ingresos", _m002_income_rollups),
+    (3, "Versión de datos por usuario", _m003_user_data_version),
+    (4, "Columnas de perfil e índices del panel admin",
+     _m004_user_profile_columns),
+    (5, "ON DELETE CASCADE en las FKs", _m005_on_delete_cascade),
+    (6, "Montos exactos NUMERIC(14, 2)", _m006_exact_money),
+    (7, "Instantáneas diarias del dashboard", _m007_state_snapshots),
+    (8, "Registro de cambios por usuario", _m008_change_log),
+    (9, "Claves de idempotencia de /api/batch", _m009_applied_operations),
+]
+
+
+# ----------------------------------------------------------------------
+#  EJECUCIÓN
+# ----------------------------------------------------------------------
+def applied_versions(conn) -> set[int]:
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine=None) -> list[int]:
+    """
+    Aplica, cada una en su propia transacción, las migraciones
+    pendientes. Devuelve las versiones aplicadas.
+    """
+    engine = engine or db.engine
+    applied: list[int] = []
+
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # Serializa arranques simultáneos de varios procesos
+                conn.execute(text("SELECT pg_advisory_xact_lock(180180)"))
+                if version in applied_versions(conn):
+                    continue
+            migrate(conn)
+            conn.execute(
+                schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow(),
+                )
+            )
+        applied.append(version)
+    return applied
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_migrations(app):
+    """Registra los comandos CLI y aplica lo pendiente si AUTO_MIGRATE."""
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command():
+        """Aplica las migraciones pendientes."""
+        applied = run_migrations()
+        if applied:
+            click.echo(f"Migraciones aplicadas: {applied}")
+        else:
+            click.echo("La base de datos ya está al día.")
+
+    @app.cli.command("db-status")
+    def db_status_command():
+        """Muestra qué migraciones están aplicadas."""
+        with db.engine.begin() as conn:
+            done = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            mark = "x" if version in done else " "
+            click.echo(f"[{mark}] {version:03d} {description}")
+
+    if app.config["AUTO_MIGRATE"]:
+        with app.app_context():
+            run_migrations()
+    return app
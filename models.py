@@ -1,6 +1,10 @@
 # models.py
 from datetime import datetime, date
 from db import db
+from money import MONEY_PRECISION, MONEY_SCALE
+
+# Montos exactos (ver money.py)
+Money = db.Numeric(MONEY_PRECISION, MONEY_SCALE)
 
 
 # -----------------------------------------------------------
@@ -8,17 +12,39 @@ from db import db
 # -----------------------------------------------------------
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        # Paginación por clave del panel admin: ORDER BY created_at, id
+        db.Index(None, "created_at", "id"),
+        # Búsqueda por prefijo (LIKE 'abc%') con cualquier collation
+        db.Index(
+            "ix_users_email_pattern",
+            "email",
+            postgresql_ops={"email": "text_pattern_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    is_admin = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=db.false()
+    )
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login_at = db.Column(db.DateTime, nullable=True)
 
     # Para borrar usuarios inactivos
-    last_active_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_active_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     # Días laborales del mes
     working_days = db.Column(db.Integer, default=26)
 
+    # Sube con cada escritura de sus datos (ETag / caché)
+    data_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+
     # Relaciones
     categories = db.relationship("Category", backref="user", cascade="all, delete-orphan")
     incomes = db.relationship("Income", backref="user", cascade="all, delete-orphan")
@@ -36,9 +62,11 @@ class Category(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
-    monthly_target = db.Column(db.Float, nullable=False)
+    monthly_target = db.Column(Money, nullable=False)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
 
     def __repr__(self):
         return f"<Category {self.name}>"
@@ -49,12 +77,18 @@ class Category(db.Model):
 # -----------------------------------------------------------
 class Income(db.Model):
     __tablename__ = "incomes"
+    __table_args__ = (
+        # Filtro del dashboard: user_id = ? AND date BETWEEN ? AND ?
+        db.Index(None, "user_id", "date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     date = db.Column(db.Date, nullable=False, default=date.today)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE")
+    )
 
     def __repr__(self):
         return f"<Income {self.amount} on {self.date}>"
@@ -68,10 +102,12 @@ class SavingGoal(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
-    target_amount = db.Column(db.Float, nullable=False)
+    target_amount = db.Column(Money, nullable=False)
     deadline = db.Column(db.Date, nullable=True)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
 
     deposits = db.relationship("SavingDeposit", backref="goal", cascade="all, delete-orphan")
 
@@ -84,12 +120,114 @@ class SavingGoal(db.Model):
 # -----------------------------------------------------------
 class SavingDeposit(db.Model):
     __tablename__ = "saving_deposits"
+    __table_args__ = (
+        db.Index(None, "goal_id", "date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     date = db.Column(db.Date, nullable=False, default=date.today)
 
-    goal_id = db.Column(db.Integer, db.ForeignKey("saving_goals.id"))
+    goal_id = db.Column(
+        db.Integer, db.ForeignKey("saving_goals.id", ondelete="CASCADE")
+    )
 
     def __repr__(self):
         return f"<SavingDeposit {self.amount}>"
+
+
+# -----------------------------------------------------------
+#  ACUMULADOS DE INGRESOS (SE MANTIENEN EN CADA ESCRITURA)
+# -----------------------------------------------------------
+class IncomeDailyRollup(db.Model):
+    __tablename__ = "income_daily_rollup"
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(Money, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<IncomeDailyRollup {self.user_id} {self.day} {self.total}>"
+
+
+class IncomeMonthlyRollup(db.Model):
+    __tablename__ = "income_monthly_rollup"
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    total = db.Column(Money, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<IncomeMonthlyRollup {self.user_id} "
+            f"{self.year}-{self.month:02d} {self.total}>"
+        )
+
+
+# -----------------------------------------------------------
+#  INSTANTÁNEAS DEL DASHBOARD (ENTRADAS DEL KERNEL POR DÍA)
+# -----------------------------------------------------------
+class StateSnapshot(db.Model):
+    __tablename__ = "state_snapshots"
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = db.Column(db.Date, nullable=False)
+    # Válida solo mientras coincida con users.data_version
+    data_version = db.Column(db.Integer, nullable=False, default=0)
+    inputs = db.Column(db.JSON, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StateSnapshot {self.user_id} {self.day} v{self.data_version}>"
+
+
+# -----------------------------------------------------------
+#  REGISTRO DE CAMBIOS (SINCRONIZACIÓN INCREMENTAL)
+# -----------------------------------------------------------
+class ChangeLog(db.Model):
+    __tablename__ = "change_log"
+    __table_args__ = (db.Index(None, "user_id", "seq"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    # Igual a users.data_version tras el commit que lo generó
+    seq = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(20), nullable=False)
+    action = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=True)
+    data = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ChangeLog {self.user_id}#{self.seq} {self.entity} {self.action}>"
+
+
+class AppliedOperation(db.Model):
+    """
+    Clave de idempotencia de una operación de /api/batch ya aplicada: si
+    la cola sin conexión reenvía un lote cuya respuesta se perdió, esas
+    operaciones se saltan en vez de duplicar filas.
+    """
+    __tablename__ = "applied_operations"
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    key = db.Column(db.String(64), primary_key=True)
+    # id de lo creado (para resolver "ref" al repetir la operación)
+    result_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<AppliedOperation {self.user_id} {self.key}>"
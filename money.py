@@ -0,0 +1,47 @@
+# money.py
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Los montos se guardan como NUMERIC(14, 2): exactos en Postgres y en
+# Python. En SQLite NUMERIC es solo afinidad (se guardan como REAL) y lo
+# que sale de la BD se redondea a centavos al leerlo.
+MONEY_PRECISION = 14
+MONEY_SCALE = 2
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+_LIMIT = Decimal(10) ** (MONEY_PRECISION - MONEY_SCALE)
+
+
+def to_money(value) -> Decimal:
+    """
+    Convierte a Decimal con 2 decimales (redondeo comercial).
+    Vacío/None = 0. Lanza ValueError si no es un monto representable.
+    """
+    if value is None or value == "":
+        return ZERO
+    if isinstance(value, Decimal):
+        amount = value
+    else:
+        # str() evita arrastrar la expansión binaria de un float
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"Monto inválido: {value!r}")
+    if not amount.is_finite() or abs(amount) >= _LIMIT:
+        raise ValueError(f"Monto inválido: {value!r}")
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def parse_money(value) -> Decimal | None:
+    """Como to_money, pero devuelve None en vez de lanzar excepción."""
+    try:
+        return to_money(value)
+    except ValueError:
+        return None
+
+
+def as_float(value) -> float:
+    """Para JSON y para los cocientes del coach (no para acumular)."""
+    return float(value or 0)
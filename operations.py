@@ -0,0 +1,496 @@
+# operations.py
+from __future__ import annotations
+
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from changes import discard_pending_changes, pending_changes, record_change
+from db import db
+from models import (
+    AppliedOperation,
+    Category,
+    Income,
+    SavingGoal,
+    SavingDeposit,
+)
+from money import as_float, parse_money
+from rollups import apply_income_deltas
+
+MAX_BATCH_OPERATIONS = 500
+BATCH_MODES = ("atomic", "best_effort")
+MAX_OPERATION_KEY = 64
+
+
+class OperationError(Exception):
+    """Error de validación de una operación, con su código HTTP."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# ----------------------------------------------------------------------
+#  OPERACIONES (SIN COMMIT: LAS CONFIRMA LA RUTA O EL LOTE)
+# ----------------------------------------------------------------------
+# Mismas reglas y mensajes que tenían las rutas de finance.py; las rutas
+# individuales y /api/batch comparten este código. Cada operación anota
+# su cambio para /api/changes (lo escribe commit_user_change).
+def _parse_date(value, default: date | None) -> date | None:
+    try:
+        return datetime.strptime(value or "", "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_id(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _owned(model, obj_id: int, user_id: int):
+    obj = model.query.filter_by(id=obj_id, user_id=user_id).first()
+    if not obj:
+        raise OperationError("No encontrado", 404)
+    return obj
+
+
+def _category_data(cat: Category) -> dict:
+    return {"name": cat.name, "monthly_target": as_float(cat.monthly_target)}
+
+
+def _goal_data(goal: SavingGoal) -> dict:
+    return {
+        "name": goal.name,
+        "target_amount": as_float(goal.target_amount),
+        "deadline": goal.deadline.isoformat() if goal.deadline else None,
+    }
+
+
+def create_category(user_id: int, data: dict) -> Category:
+    name = (data.get("name") or "").strip()
+    target = parse_money(data.get("monthly_target"))
+    if not name or target is None or target <= 0:
+        raise OperationError("Datos inválidos")
+
+    cat = Category(user_id=user_id, name=name, monthly_target=target)
+    db.session.add(cat)
+    db.session.flush()
+    record_change("category", "upsert", cat.id, _category_data(cat))
+    return cat
+
+
+def update_category(user_id: int, cat_id: int, data: dict) -> Category:
+    cat = _owned(Category, cat_id, user_id)
+    name = (data.get("name") or "").strip()
+    target = data.get("monthly_target")
+
+    if name:
+        cat.name = name
+    if target not in (None, ""):
+        target = parse_money(target)
+        if target is not None:
+            cat.monthly_target = target
+    db.session.flush()
+    record_change("category", "upsert", cat.id, _category_data(cat))
+    return cat
+
+
+def delete_category(user_id: int, cat_id: int) -> Category:
+    cat = _owned(Category, cat_id, user_id)
+    db.session.delete(cat)
+    db.session.flush()
+    record_change("category", "delete", cat.id)
+    return cat
+
+
+def validate_income(data: dict) -> tuple:
+    """(monto, fecha) de un ingreso; fecha vacía o inválida = hoy."""
+    amount = parse_money(data.get("amount"))
+    if amount is None or amount <= 0:
+        raise OperationError("Monto inválido")
+    return amount, _parse_date(data.get("date"), date.today())
+
+
+def _insert_returning_ids(model, rows: list[dict]) -> list[int]:
+    """INSERT en bloque que devuelve los ids en el orden de `rows`."""
+    table = model.__table__
+    return list(db.session.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        rows,
+    ).scalars())
+
+
+def add_incomes(user_id: int, items: list[tuple]) -> list[int]:
+    """
+    Inserta ingresos (monto, fecha) en bloque y sus acumulados. Devuelve
+    los ids, que también van al registro de cambios.
+    """
+    if not items:
+        return []
+    ids = _insert_returning_ids(Income, [
+        {"user_id": user_id, "amount": amount, "date": day}
+        for amount, day in items
+    ])
+    deltas: dict = {}
+    for income_id, (amount, day) in zip(ids, items):
+        total, count = deltas.get(day, (0, 0))
+        deltas[day] = (total + amount, count + 1)
+        record_change("income", "insert", income_id,
+                      {"amount": as_float(amount), "date": day.isoformat()})
+    apply_income_deltas(user_id, deltas)
+    return ids
+
+
+def create_goal(user_id: int, data: dict) -> SavingGoal:
+    name = (data.get("name") or "").strip()
+    target_amount = parse_money(data.get("target_amount"))
+    if not name or target_amount is None or target_amount <= 0:
+        raise OperationError("Datos inválidos")
+
+    goal = SavingGoal(
+        user_id=user_id,
+        name=name,
+        target_amount=target_amount,
+        deadline=_parse_date(data.get("deadline"), None),
+    )
+    db.session.add(goal)
+    db.session.flush()
+    record_change("saving_goal", "upsert", goal.id, _goal_data(goal))
+    return goal
+
+
+def update_goal(user_id: int, goal_id: int, data: dict) -> SavingGoal:
+    goal = _owned(SavingGoal, goal_id, user_id)
+    name = (data.get("name") or "").strip()
+    target_amount = data.get("target_amount")
+
+    if name:
+        goal.name = name
+    if target_amount not in (None, ""):
+        target_amount = parse_money(target_amount)
+        if target_amount is not None:
+            goal.target_amount = target_amount
+    deadline = _parse_date(data.get("deadline"), None)
+    if deadline is not None:
+        goal.deadline = deadline
+    db.session.flush()
+    record_change("saving_goal", "upsert", goal.id, _goal_data(goal))
+    return goal
+
+
+def delete_goal(user_id: int, goal_id: int) -> SavingGoal:
+    goal = _owned(SavingGoal, goal_id, user_id)
+    # Borramos también sus depósitos
+    SavingDeposit.query.filter_by(goal_id=goal.id).delete()
+    db.session.delete(goal)
+    db.session.flush()
+    # Sin entradas por aporte: quien borre la meta descarta sus aportes
+    record_change("saving_goal", "delete", goal.id)
+    return goal
+
+
+def validate_deposit(data: dict) -> tuple:
+    """(meta, monto, fecha) de un aporte, sin mirar aún la meta."""
+    goal_id = _parse_id(data.get("goal_id"))
+    amount = parse_money(data.get("amount"))
+    if amount is None or amount <= 0 or not goal_id:
+        raise OperationError("Datos inválidos")
+    return goal_id, amount, _parse_date(data.get("date"), date.today())
+
+
+def owned_goal_ids(user_id: int, goal_ids) -> set[int]:
+    """Cuáles de esas metas son del usuario (una sola consulta)."""
+    goal_ids = set(goal_ids)
+    if not goal_ids:
+        return set()
+    return set(db.session.execute(
+        select(SavingGoal.id).where(
+            SavingGoal.id.in_(goal_ids), SavingGoal.user_id == user_id
+        )
+    ).scalars())
+
+
+def add_deposits(items: list[tuple]) -> list[int]:
+    """
+    Inserta aportes (meta, monto, fecha) en bloque; metas ya validadas.
+    Devuelve los ids.
+    """
+    if not items:
+        return []
+    ids = _insert_returning_ids(SavingDeposit, [
+        {"goal_id": goal_id, "amount": amount, "date": day}
+        for goal_id, amount, day in items
+    ])
+    for deposit_id, (goal_id, amount, day) in zip(ids, items):
+        record_change("saving_deposit", "insert", deposit_id, {
+            "goal_id": goal_id,
+            "amount": as_float(amount),
+            "date": day.isoformat(),
+        })
+    return ids
+
+
+# ----------------------------------------------------------------------
+#  LOTES (/api/batch)
+# ----------------------------------------------------------------------
+class BatchAborted(Exception):
+    """Modo atómico: una operación falló y hay que deshacer todo."""
+
+    def __init__(self, index: int, error: OperationError):
+        super().__init__(error.message)
+        self.index = index
+        self.error = error
+
+
+def _resolve(value, refs: dict) -> int:
+    """Un id puede ser {"ref": "x"}: el id creado antes en el mismo lote."""
+    if isinstance(value, dict):
+        ref = value.get("ref")
+        if ref not in refs:
+            raise OperationError(f"Referencia desconocida: {ref}")
+        return refs[ref]
+    return _parse_id(value)
+
+
+def _single(user_id: int, op: dict, refs: dict) -> dict:
+    kind = op.get("op")
+    data = op.get("data") or {}
+    if not isinstance(data, dict):
+        raise OperationError("Datos inválidos")
+    if kind == "category.create":
+        return {"id": create_category(user_id, data).id}
+    if kind == "category.update":
+        update_category(user_id, _resolve(op.get("id"), refs), data)
+        return {}
+    if kind == "category.delete":
+        delete_category(user_id, _resolve(op.get("id"), refs))
+        return {}
+    if kind == "saving_goal.create":
+        return {"id": create_goal(user_id, data).id}
+    if kind == "saving_goal.update":
+        update_goal(user_id, _resolve(op.get("id"), refs), data)
+        return {}
+    if kind == "saving_goal.delete":
+        delete_goal(user_id, _resolve(op.get("id"), refs))
+        return {}
+    raise OperationError(f"Operación desconocida: {kind}")
+
+
+def _op_key(op: dict) -> str | None:
+    """Clave de idempotencia de la operación ("key"), si trae una válida."""
+    key = op.get("key")
+    if isinstance(key, str) and 0 < len(key) <= MAX_OPERATION_KEY:
+        return key
+    return None
+
+
+def _applied_keys(user_id: int, operations: list) -> dict:
+    """Claves del lote que ya se aplicaron antes → id creado (o None)."""
+    keys = {
+        key for key in (
+            _op_key(op) for op in operations if isinstance(op, dict)
+        ) if key
+    }
+    if not keys:
+        return {}
+    return dict(db.session.execute(
+        select(AppliedOperation.key, AppliedOperation.result_id).where(
+            AppliedOperation.user_id == user_id,
+            AppliedOperation.key.in_(keys),
+        )
+    ).all())
+
+
+# Operaciones que se agrupan (si van seguidas) en un solo INSERT
+_BULK_KINDS = ("income.create", "saving_deposit.create")
+
+
+def _validate_bulk(user_id: int, kind: str, ops: list[dict], refs: dict):
+    """Lista de (item válido | OperationError), en el orden de `ops`."""
+    checked = []
+    for op in ops:
+        data = op.get("data") or {}
+        try:
+            if not isinstance(data, dict):
+                raise OperationError("Datos inválidos")
+            if kind == "income.create":
+                checked.append(validate_income(data))
+            else:
+                if isinstance(data.get("goal_id"), dict):
+                    data = {**data, "goal_id": _resolve(data["goal_id"], refs)}
+                checked.append(validate_deposit(data))
+        except OperationError as exc:
+            checked.append(exc)
+
+    if kind == "saving_deposit.create":
+        owned = owned_goal_ids(
+            user_id,
+            (c[0] for c in checked if not isinstance(c, OperationError)),
+        )
+        checked = [
+            c if isinstance(c, OperationError) or c[0] in owned
+            else OperationError("Meta no encontrada", 404)
+            for c in checked
+        ]
+    return checked
+
+
+def run_batch(user_id: int, operations: list, atomic: bool = True) -> dict:
+    """
+    Ejecuta las operaciones en orden dentro de la transacción actual.
+      - atomic: la primera que falle lanza BatchAborted (el llamador
+        hace rollback de todo);
+      - best_effort: cada operación (o grupo) va en un SAVEPOINT y las
+        que fallen se deshacen solas.
+    Los ingresos y aportes seguidos se insertan con un solo INSERT.
+
+    Una operación con "key" se aplica una sola vez: si esa clave ya se
+    aplicó (un reenvío de la cola sin conexión), se salta y su resultado
+    lleva "duplicate": true. Las claves nuevas se guardan en la misma
+    transacción; dos lotes simultáneos con la misma clave chocan en el
+    commit (IntegrityError) y el segundo se reintenta después.
+    Devuelve {"results": [...], "applied": n} (n sin contar repetidas).
+    """
+    results: list = [None] * len(operations)
+    refs: dict = {}
+    applied_keys = _applied_keys(user_id, operations)
+    receipts: list[dict] = []
+
+    def applied(index: int, result_id: int | None = None) -> None:
+        key = _op_key(operations[index])
+        if key is not None:
+            applied_keys[key] = result_id
+            receipts.append({"user_id": user_id, "key": key,
+                             "result_id": result_id,
+                             "created_at": datetime.utcnow()})
+
+    def pending_key(op) -> bool:
+        """Sin clave, o con una clave válida que aún no se aplicó."""
+        if "key" not in op:
+            return True
+        key = _op_key(op)
+        return key is not None and key not in applied_keys
+
+    def fail(index: int, exc: OperationError) -> None:
+        if atomic:
+            raise BatchAborted(index, exc)
+        results[index] = {"ok": False, "error": exc.message,
+                          "status": exc.status}
+
+    i = 0
+    while i < len(operations):
+        op = operations[i]
+        if not isinstance(op, dict):
+            fail(i, OperationError("Operación inválida"))
+            i += 1
+            continue
+
+        if "key" in op and _op_key(op) is None:
+            fail(i, OperationError("Clave de operación inválida"))
+            i += 1
+            continue
+        if not pending_key(op):
+            result_id = applied_keys[op["key"]]
+            if op.get("ref") and result_id is not None:
+                refs[op["ref"]] = result_id
+            results[i] = {"ok": True, "duplicate": True}
+            if result_id is not None:
+                results[i]["id"] = result_id
+            i += 1
+            continue
+
+        kind = op.get("op")
+        if kind in _BULK_KINDS:
+            # El grupo se corta en una clave repetida (o inválida): esa
+            # operación se trata sola en la siguiente vuelta.
+            j = i + 1
+            group_keys = {_op_key(op)}
+            while (
+                j < len(operations)
+                and isinstance(operations[j], dict)
+                and operations[j].get("op") == kind
+                and pending_key(operations[j])
+                and (
+                    _op_key(operations[j]) is None
+                    or _op_key(operations[j]) not in group_keys
+                )
+            ):
+                group_keys.add(_op_key(operations[j]))
+                j += 1
+            checked = _validate_bulk(user_id, kind, operations[i:j], refs)
+            valid = []
+            for offset, item in enumerate(checked):
+                if isinstance(item, OperationError):
+                    fail(i + offset, item)
+                else:
+                    valid.append((i + offset, item))
+            items = [item for _, item in valid]
+            mark = len(pending_changes())
+            savepoint = None
+            try:
+                if not atomic:
+                    savepoint = db.session.begin_nested()
+                if kind == "income.create":
+                    ids = add_incomes(user_id, items)
+                else:
+                    ids = add_deposits(items)
+                if savepoint is not None:
+                    savepoint.commit()
+            except SQLAlchemyError:
+                if atomic:
+                    raise BatchAborted(
+                        i, OperationError("Error al guardar", 500)
+                    )
+                # Sin savepoint si falló al abrirlo
+                if savepoint is not None:
+                    savepoint.rollback()
+                discard_pending_changes(mark)
+                for index, _ in valid:
+                    fail(index, OperationError("Error al guardar", 500))
+            else:
+                for (index, _), new_id in zip(valid, ids):
+                    results[index] = {"ok": True, "id": new_id}
+                    applied(index, new_id)
+            i = j
+            continue
+
+        mark = len(pending_changes())
+        savepoint = None
+        try:
+            if not atomic:
+                savepoint = db.session.begin_nested()
+            result = _single(user_id, op, refs)
+            if savepoint is not None:
+                savepoint.commit()
+        except OperationError as exc:
+            if savepoint is not None:
+                savepoint.rollback()
+                discard_pending_changes(mark)
+            fail(i, exc)
+        except SQLAlchemyError:
+            if atomic:
+                raise BatchAborted(i, OperationError("Error al guardar", 500))
+            if savepoint is not None:
+                savepoint.rollback()
+            discard_pending_changes(mark)
+            fail(i, OperationError("Error al guardar", 500))
+        else:
+            if op.get("ref") and "id" in result:
+                refs[op["ref"]] = result["id"]
+            results[i] = {"ok": True, **result}
+            applied(i, result.get("id"))
+        i += 1
+
+    if receipts:
+        db.session.execute(insert(AppliedOperation), receipts)
+    return {
+        "results": results,
+        "applied": sum(
+            1 for r in results if r and r["ok"] and not r.get("duplicate")
+        ),
+    }
@@ -0,0 +1,131 @@
+# reaper.py
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import select
+
+from db import db
+from models import User
+from activity import activity_tracker
+from changes import prune_change_log
+from deletion import delete_users
+from scheduler import PeriodicTask, is_leader
+
+REAPER_LOCK_NAME = "inactive-user-reaper"
+
+
+# ----------------------------------------------------------------------
+#  LIMPIEZA DE USUARIOS INACTIVOS
+# ----------------------------------------------------------------------
+def purge_inactive_users(
+    max_age_days: int = 30,
+    batch_size: int = 500,
+    now: datetime | None = None,
+) -> dict:
+    """
+    Elimina usuarios con más de `max_age_days` días sin actividad,
+    en lotes de `batch_size` usuarios (un commit por lote).
+    """
+    started = time.perf_counter()
+    if now is None:
+        now = datetime.utcnow()
+    limite = now - timedelta(days=max_age_days)
+
+    report = {"users": 0, "rows": {}, "batches": 0, "elapsed_ms": 0.0}
+    while True:
+        user_ids = db.session.execute(
+            select(User.id)
+            .where(User.last_active_at < limite)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not user_ids:
+            break
+
+        counts = delete_users(user_ids)["rows"]
+        db.session.commit()
+
+        report["batches"] += 1
+        report["users"] += counts.get("users", 0)
+        for table, n in counts.items():
+            report["rows"][table] = report["rows"].get(table, 0) + n
+
+        if len(user_ids) < batch_size:
+            break
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def run_reaper() -> dict | None:
+    """Ejecuta la limpieza solo en el proceso líder (uno por despliegue)."""
+    cfg = current_app.config
+    if not is_leader(REAPER_LOCK_NAME):
+        return None
+    # La actividad se escribe en diferido: volcamos lo pendiente de
+    # este worker. Lo de otros workers tiene como mucho
+    # ACTIVITY_GRANULARITY + ACTIVITY_FLUSH de retraso, despreciable
+    # frente a una ventana de días.
+    activity_tracker.flush()
+    report = purge_inactive_users(
+        max_age_days=cfg["INACTIVE_USER_DAYS"],
+        batch_size=cfg["REAPER_BATCH_SIZE"],
+    )
+    pruned = prune_change_log(cfg["CHANGE_LOG_DAYS"])
+    if pruned:
+        current_app.logger.info(
+            "Registro de cambios: %s entradas viejas borradas", pruned
+        )
+    if report["users"]:
+        current_app.logger.info(
+            "Reaper: %s usuarios eliminados (%s) en %s ms",
+            report["users"], report["rows"], report["elapsed_ms"],
+        )
+    return report
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_reaper(app):
+    """Registra el comando CLI y, si está activo, el programador interno."""
+
+    @app.cli.command("purge-inactive")
+    @click.option("--days", type=int, default=None,
+                  help="Días sin actividad (por defecto INACTIVE_USER_DAYS).")
+    @click.option("--batch-size", type=int, default=None,
+                  help="Usuarios por lote (por defecto REAPER_BATCH_SIZE).")
+    def purge_inactive_command(days, batch_size):
+        """Elimina usuarios inactivos y todos sus datos."""
+        if days is None:
+            days = app.config["INACTIVE_USER_DAYS"]
+        report = purge_inactive_users(
+            max_age_days=days,
+            batch_size=batch_size or app.config["REAPER_BATCH_SIZE"],
+        )
+        click.echo(
+            f"Usuarios eliminados: {report['users']} "
+            f"en {report['batches']} lote(s), {report['elapsed_ms']} ms"
+        )
+        for table, n in sorted(report["rows"].items()):
+            click.echo(f"  {table}: {n}")
+
+    if app.config["REAPER_ENABLED"]:
+        task = PeriodicTask(
+            "inactive-user-reaper",
+            app.config["REAPER_INTERVAL_SECONDS"],
+            run_reaper,
+        )
+
+        @app.before_request
+        def _start_reaper():
+            # Solo arranca el hilo la primera vez en cada worker
+            task.ensure_started(app)
+
+        app.extensions["reaper_task"] = task
+
+    return app
@@ -0,0 +1,189 @@
+# scheduler.py
+from __future__ import annotations
+
+import fcntl
+import os
+import tempfile
+import threading
+import zlib
+
+from sqlalchemy import text
+
+from db import db
+
+
+# ----------------------------------------------------------------------
+#  TAREAS PERIÓDICAS EN SEGUNDO PLANO
+# ----------------------------------------------------------------------
+class PeriodicTask:
+    """
+    Ejecuta `func` cada `interval` segundos en un hilo daemon,
+    dentro de un app_context propio (nunca dentro de una petición).
+
+    El hilo se arranca de forma perezosa y una sola vez por proceso:
+    con `gunicorn --preload` el master importa la app antes del fork,
+    así que cada worker debe lanzar su propio hilo.
+    """
+
+    def __init__(self, name: str, interval: float, func):
+        self.name = name
+        self.interval = max(1.0, float(interval))
+        self.func = func
+        self._app = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self, app) -> None:
+        # Comparación barata: solo la primera llamada del proceso hace algo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            self._stop = threading.Event()
+            thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            thread.start()
+            self._pid = os.getpid()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._app.app_context():
+                try:
+                    self.func()
+                except Exception:  # noqa: BLE001 - el hilo no debe morir
+                    self._app.logger.exception(
+                        "Fallo en la tarea periódica %s", self.name
+                    )
+                finally:
+                    db.session.remove()
+
+
+def start_periodic_tasks(app) -> list[str]:
+    """
+    Arranca ya (sin esperar la primera petición) las tareas registradas
+    en app.extensions; pensado para el hook post_fork de gunicorn.
+    """
+    started = []
+    for task in app.extensions.values():
+        if isinstance(task, PeriodicTask):
+            task.ensure_started(app)
+            started.append(task.name)
+    return started
+
+
+# ----------------------------------------------------------------------
+#  LOCK DE LÍDER (UN SOLO WORKER EJECUTA EL TRABAJO)
+# ----------------------------------------------------------------------
+class LeaderLock:
+    """
+    Liderazgo de `name` para toda la vida del proceso: el primero que
+    toma el lock exclusivo no lo suelta (deja abierta la conexión o el
+    archivo), así que en cada vuelta solo él ejecuta el trabajo. Si ese
+    proceso muere, el lock se libera y otro worker lo toma en su
+    siguiente intento.
+
+    En Postgres se usa un advisory lock de sesión (vale entre máquinas;
+    ocupa una conexión del pool del líder); en otros motores, un flock
+    sobre un archivo temporal local.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._handle = None
+        self._pid = None
+        self._inherited = []
+        self._lock = threading.Lock()
+
+    def held(self) -> bool:
+        """True si este proceso es (o acaba de pasar a ser) el líder."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Lo heredado de un fork es del padre: no se usa ni se
+                # cierra (cerrarlo cortaría su sesión).
+                if self._handle is not None:
+                    self._inherited.append(self._handle)
+                self._handle = None
+                self._pid = os.getpid()
+            if self._handle is not None and not self._alive():
+                self._close()
+            if self._handle is None:
+                self._handle = self._acquire()
+            return self._handle is not None
+
+    def release(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                self._close()
+
+    def _acquire(self):
+        engine = db.engine
+        if engine.dialect.name == "postgresql":
+            conn = engine.connect()
+            try:
+                acquired = conn.execute(
+                    text("SELECT pg_try_advisory_lock(:k)"),
+                    {"k": zlib.crc32(self.name.encode("utf-8"))},
+                ).scalar()
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+            if not acquired:
+                conn.close()
+                return None
+            return conn
+
+        path = os.path.join(
+            tempfile.gettempdir(), f"finanzas-{self.name}.lock"
+        )
+        fh = open(path, "w")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return None
+        return fh
+
+    def _alive(self) -> bool:
+        # Un archivo no se pierde; la conexión sí (reinicio del servidor)
+        # y con ella el advisory lock.
+        if not hasattr(self._handle, "execute"):
+            return True
+        try:
+            self._handle.execute(text("SELECT 1"))
+            self._handle.commit()
+            return True
+        except Exception:  # noqa: BLE001 - se reintenta con otra conexión
+            return False
+
+    def _close(self) -> None:
+        handle, self._handle = self._handle, None
+        if handle is None:
+            return
+        try:
+            if hasattr(handle, "execute"):
+                handle.invalidate()  # la sesión (y el lock) se cierran
+            else:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            handle.close()
+
+
+_leaders: dict[str, LeaderLock] = {}
+_leaders_lock = threading.Lock()
+
+
+def is_leader(name: str) -> bool:
+    """Si este proceso es el líder de `name` (lo sigue siendo al volver)."""
+    with _leaders_lock:
+        leader = _leaders.get(name)
+        if leader is None:
+            leader = _leaders[name] = LeaderLock(name)
+    return leader.held()
@@ -0,0 +1,376 @@
+# snapshots.py
+from __future__ import annotations
+
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import User, StateSnapshot
+from money import to_money
+from scheduler import PeriodicTask, is_leader
+from state_kernel import compute_state
+from state_report import load_state_inputs
+
+SNAPSHOT_LOCK_NAME = "state-snapshots"
+
+# Una instantánea guarda las ENTRADAS del kernel (no el estado ya
+# armado): leerla cuesta una consulta por PK y el kernel recalcula en
+# microsegundos. Los montos van como texto para seguir siendo exactos.
+#   {"working_days": 26, "month_income": "1200.00", "todays_income": "0",
+#    "categories": [[id, nombre, meta]],
+#    "goals": [[id, nombre, objetivo, "AAAA-MM-DD" | null, acumulado]]}
+
+
+def _money_text(value) -> str:
+    return str(to_money(value))
+
+
+def _inputs_by_user(users, today: date) -> list[dict]:
+    """Entradas de varios usuarios (consultas por conjuntos), una por usuario."""
+    working_days, month_income, todays_income, categories, goals = (
+        load_state_inputs(users, today)
+    )
+    inputs = [
+        {
+            "working_days": working_days[i],
+            "month_income": _money_text(month_income[i]),
+            "todays_income": _money_text(todays_income[i]),
+            "categories": [],
+            "goals": [],
+        }
+        for i in range(len(working_days))
+    ]
+    for pos, cat_id, name, target in categories:
+        inputs[pos]["categories"].append([cat_id, name, _money_text(target)])
+    for pos, goal_id, name, target, deadline, saved in goals:
+        inputs[pos]["goals"].append([
+            goal_id,
+            name,
+            _money_text(target),
+            deadline.isoformat() if deadline else None,
+            _money_text(saved),
+        ])
+    return inputs
+
+
+def state_from_inputs(today: date, inputs: dict, user_id: int) -> dict:
+    return compute_state(
+        today,
+        inputs["working_days"],
+        [(c[0], c[1], to_money(c[2])) for c in inputs["categories"]],
+        to_money(inputs["month_income"]),
+        to_money(inputs["todays_income"]),
+        [
+            (g[0], g[1], to_money(g[2]),
+             date.fromisoformat(g[3]) if g[3] else None, to_money(g[4]))
+            for g in inputs["goals"]
+        ],
+        user_id=user_id,
+    )
+
+
+def _store(rows: list[dict]) -> None:
+    """Reemplaza las instantáneas de esos usuarios (sin commit)."""
+    db.session.execute(
+        delete(StateSnapshot)
+        .where(StateSnapshot.user_id.in_([r["user_id"] for r in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(insert(StateSnapshot), rows)
+
+
+# ----------------------------------------------------------------------
+#  LECTURA (DASHBOARD / API)
+# ----------------------------------------------------------------------
+def snapshot_state(user, today: date) -> dict:
+    """
+    Estado desde la instantánea del día si sigue vigente (misma
+    data_version que el usuario); si no, se calcula y se guarda.
+    """
+    row = db.session.execute(
+        select(StateSnapshot.day, StateSnapshot.data_version,
+               StateSnapshot.inputs)
+        .where(StateSnapshot.user_id == user.id)
+    ).first()
+    version = user.data_version or 0
+    if row is not None and row.day == today and row.data_version == version:
+        return state_from_inputs(today, row.inputs, user.id)
+
+    inputs = _inputs_by_user([(user.id, user.working_days)], today)[0]
+    try:
+        _store([{
+            "user_id": user.id,
+            "day": today,
+            "data_version": version,
+            "inputs": inputs,
+            "computed_at": datetime.utcnow(),
+        }])
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición la guardó a la vez: la instantánea es solo caché
+        db.session.rollback()
+    return state_from_inputs(today, inputs, user.id)
+
+
+# ----------------------------------------------------------------------
+#  PARCHES INCREMENTALES (EN LA TRANSACCIÓN DE LA ESCRITURA)
+# ----------------------------------------------------------------------
+def _patch(user_id: int, today: date, change) -> dict | None:
+    """
+    Aplica `change(inputs)` a la instantánea de hoy y sube su versión en
+    uno, igual que commit_user_change sube la del usuario. Si otra
+    escritura la tocó entre la lectura y el UPDATE, se descarta: la
+    próxima lectura la recalcula.
+
+    Devuelve las entradas nuevas solo si la instantánea estaba al día
+    (misma versión que el usuario); si no, None.
+    """
+    row = db.session.execute(
+        select(
+            StateSnapshot.data_version,
+            StateSnapshot.inputs,
+            User.data_version.label("user_version"),
+        )
+        .join(User, User.id == StateSnapshot.user_id)
+        .where(StateSnapshot.user_id == user_id, StateSnapshot.day == today)
+    ).first()
+    if row is None:
+        return None
+    inputs = change(dict(row.inputs))
+    if inputs is not None:
+        result = db.session.execute(
+            update(StateSnapshot)
+            .where(
+                StateSnapshot.user_id == user_id,
+                StateSnapshot.data_version == row.data_version,
+            )
+            .values(inputs=inputs, data_version=row.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            in_sync = row.data_version == (row.user_version or 0)
+            return inputs if in_sync else None
+    db.session.execute(
+        delete(StateSnapshot)
+        .where(StateSnapshot.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    return None
+
+
+def patch_income(user_id: int, income_date: date, amount,
+                 today: date | None = None) -> dict | None:
+    """Suma un ingreso nuevo a la instantánea de hoy (si existe)."""
+    if today is None:
+        today = date.today()
+
+    def change(inputs: dict) -> dict:
+        if (income_date.year, income_date.month) == (today.year, today.month):
+            inputs["month_income"] = _money_text(
+                to_money(inputs["month_income"]) + amount
+            )
+        if income_date == today:
+            inputs["todays_income"] = _money_text(
+                to_money(inputs["todays_income"]) + amount
+            )
+        return inputs
+
+    return _patch(user_id, today, change)
+
+
+def patch_deposit(user_id: int, goal_id: int, amount,
+                  today: date | None = None) -> dict | None:
+    """Suma un aporte al acumulado de su meta en la instantánea de hoy."""
+    if today is None:
+        today = date.today()
+
+    def change(inputs: dict) -> dict | None:
+        for goal in inputs["goals"]:
+            if goal[0] == goal_id:
+                goal[4] = _money_text(to_money(goal[4]) + amount)
+                return inputs
+        return None  # meta desconocida: mejor recalcular
+
+    return _patch(user_id, today, change)
+
+
+def patch_category(user_id: int, category, deleted: bool = False,
+                   today: date | None = None) -> dict | None:
+    """Alta, edición o baja de una categoría en la instantánea de hoy."""
+    if today is None:
+        today = date.today()
+
+    def change(inputs: dict) -> dict:
+        categories = [c for c in inputs["categories"] if c[0] != category.id]
+        if not deleted:
+            categories.append([
+                category.id, category.name,
+                _money_text(category.monthly_target),
+            ])
+        # Mismo orden que la consulta original (por id)
+        inputs["categories"] = sorted(categories, key=lambda c: c[0])
+        return inputs
+
+    return _patch(user_id, today, change)
+
+
+def patch_goal(user_id: int, goal, deleted: bool = False,
+               today: date | None = None) -> dict | None:
+    """Alta, edición o baja de una meta (conserva su acumulado)."""
+    if today is None:
+        today = date.today()
+
+    def change(inputs: dict) -> dict:
+        saved = {g[0]: g[4] for g in inputs["goals"]}
+        goals = [g for g in inputs["goals"] if g[0] != goal.id]
+        if not deleted:
+            goals.append([
+                goal.id,
+                goal.name,
+                _money_text(goal.target_amount),
+                goal.deadline.isoformat() if goal.deadline else None,
+                saved.get(goal.id, _money_text(0)),
+            ])
+        inputs["goals"] = sorted(goals, key=lambda g: g[0])
+        return inputs
+
+    return _patch(user_id, today, change)
+
+
+# ----------------------------------------------------------------------
+#  PRECÁLCULO NOCTURNO (POR CONJUNTOS)
+# ----------------------------------------------------------------------
+def build_snapshots(
+    today: date | None = None,
+    active_days: int | None = 7,
+    batch_size: int = 2000,
+    only_missing: bool = True,
+) -> dict:
+    """
+    Calcula las instantáneas de `today` para los usuarios activos en los
+    últimos `active_days` días (None = todos), en lotes de `batch_size`
+    usuarios con 3 consultas por lote. `only_missing` salta a quienes ya
+    tienen la de hoy, así que repetirlo durante el día es barato.
+    """
+    started = time.perf_counter()
+    if today is None:
+        today = date.today()
+
+    report = {"users": 0, "batches": 0, "elapsed_ms": 0.0}
+    after = 0
+    while True:
+        stmt = (
+            select(User.id, User.working_days, User.data_version)
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(batch_size)
+        )
+        if active_days is not None:
+            since = datetime.utcnow() - timedelta(days=active_days)
+            stmt = stmt.where(User.last_active_at >= since)
+        if only_missing:
+            stmt = stmt.outerjoin(
+                StateSnapshot, StateSnapshot.user_id == User.id
+            ).where(
+                or_(StateSnapshot.day.is_(None), StateSnapshot.day != today)
+            )
+        users = db.session.execute(stmt).all()
+        if not users:
+            break
+
+        inputs = _inputs_by_user(
+            [(u.id, u.working_days) for u in users], today
+        )
+        now = datetime.utcnow()
+        _store([
+            {
+                "user_id": u.id,
+                "day": today,
+                "data_version": u.data_version or 0,
+                "inputs": inputs[i],
+                "computed_at": now,
+            }
+            for i, u in enumerate(users)
+        ])
+        db.session.commit()
+
+        report["batches"] += 1
+        report["users"] += len(users)
+        after = users[-1].id
+        if len(users) < batch_size:
+            break
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def run_snapshots() -> dict | None:
+    """Precalcula solo en el proceso líder (uno por despliegue)."""
+    cfg = current_app.config
+    if not is_leader(SNAPSHOT_LOCK_NAME):
+        return None
+    report = build_snapshots(
+        active_days=cfg["SNAPSHOT_ACTIVE_DAYS"],
+        batch_size=cfg["SNAPSHOT_BATCH_SIZE"],
+    )
+    if report["users"]:
+        current_app.logger.info(
+            "Instantáneas: %s usuarios en %s lote(s), %s ms",
+            report["users"], report["batches"], report["elapsed_ms"],
+        )
+    return report
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_snapshots(app):
+    """Registra el comando CLI y, si está activo, el programador interno."""
+
+    @app.cli.command("snapshots-build")
+    @click.option("--date", "day", default=None,
+                  help="Fecha AAAA-MM-DD (por defecto, hoy).")
+    @click.option("--active-days", type=int, default=None,
+                  help="Días de actividad (por defecto SNAPSHOT_ACTIVE_DAYS).")
+    @click.option("--all", "all_users", is_flag=True,
+                  help="Todos los usuarios, activos o no.")
+    @click.option("--force", is_flag=True,
+                  help="Recalcula también las que ya son de hoy.")
+    def snapshots_build_command(day, active_days, all_users, force):
+        """Precalcula las instantáneas del dashboard (trabajo nocturno)."""
+        today = (
+            datetime.strptime(day, "%Y-%m-%d").date() if day else date.today()
+        )
+        if active_days is None:
+            active_days = app.config["SNAPSHOT_ACTIVE_DAYS"]
+        report = build_snapshots(
+            today=today,
+            active_days=None if all_users else active_days,
+            batch_size=app.config["SNAPSHOT_BATCH_SIZE"],
+            only_missing=not force,
+        )
+        click.echo(
+            f"Instantáneas: {report['users']} usuarios en "
+            f"{report['batches']} lote(s), {report['elapsed_ms']} ms"
+        )
+
+    if app.config["SNAPSHOT_ENABLED"]:
+        task = PeriodicTask(
+            "state-snapshots",
+            app.config["SNAPSHOT_INTERVAL_SECONDS"],
+            run_snapshots,
+        )
+
+        @app.before_request
+        def _start_snapshots():
+            # Solo arranca el hilo la primera vez en cada worker
+            task.ensure_started(app)
+
+        app.extensions["snapshot_task"] = task
+
+    return app
@@ -0,0 +1,182 @@
+# state_cache.py
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+
+
+# ----------------------------------------------------------------------
+#  BACKENDS
+# ----------------------------------------------------------------------
+# Cada usuario tiene una "generación": invalidar = subir la generación.
+# Las entradas viejas quedan inalcanzables y las expulsa el LRU (local)
+# o el TTL (compartido), así que no hace falta recorrer claves.
+class LocalBackend:
+    """
+    LRU en memoria del proceso (cada worker de gunicorn tiene el suyo).
+    Las generaciones también tienen tope: olvidar la de un usuario es
+    seguro porque la clave lleva además su data_version (ver StateCache).
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, int(max_entries))
+        self._values: OrderedDict = OrderedDict()
+        self._generations: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def bump(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+
+class SharedBackend:
+    """
+    Backend compartido entre workers sobre un cliente tipo Redis
+    (get / set con ex / incr). La expulsión la hace el servidor
+    (TTL + política allkeys-lru).
+    """
+
+    def __init__(self, client, ttl_seconds: int = 86400, prefix: str = "fin"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def generation(self, user_id: int) -> int:
+        value = self.client.get(f"{self.prefix}:gen:{user_id}")
+        return int(value or 0)
+
+    def bump(self, user_id: int) -> None:
+        self.client.incr(f"{self.prefix}:gen:{user_id}")
+
+    def get(self, key: str):
+        raw = self.client.get(f"{self.prefix}:state:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value) -> None:
+        self.client.set(
+            f"{self.prefix}:state:{key}",
+            json.dumps(value),
+            ex=self.ttl_seconds,
+        )
+
+
+class MemoryClient:
+    """
+    Sustituto local de Redis (mismo proceso) para pruebas y desarrollo:
+    permite ejercitar SharedBackend sin un servidor.
+    """
+
+    def __init__(self):
+        self._data: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._data[key] = value
+
+    def incr(self, key):
+        with self._lock:
+            self._data[key] = str(int(self._data.get(key) or 0) + 1)
+            return int(self._data[key])
+
+
+# ----------------------------------------------------------------------
+#  CACHÉ DE ESTADO FINANCIERO
+# ----------------------------------------------------------------------
+class StateCache:
+    """
+    Estado por (usuario, versión de datos, día). La data_version sale de
+    la BD y la sube cada escritura: es lo que mantiene coherente la caché
+    entre workers, aunque el backend local de cada uno no vea las
+    invalidaciones de los otros. La generación solo adelanta el olvido en
+    el worker (o el backend compartido) que hizo la escritura.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get_or_compute(self, user_id: int, day: date, compute, version: int):
+        # La generación se lee ANTES de calcular: si una escritura la sube
+        # mientras tanto, el valor calculado queda bajo la clave vieja.
+        gen = self.backend.generation(user_id)
+        key = f"{user_id}:{version}:{gen}:{day.isoformat()}"
+
+        state = self.backend.get(key)
+        with self._stats_lock:
+            if state is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if state is not None:
+            return state
+
+        state = compute()
+        self.backend.set(key, state)
+        return state
+
+    def invalidate(self, user_id: int) -> None:
+        self.backend.bump(user_id)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": (hits / total) if total else 0.0,
+        }
+
+
+state_cache = StateCache()
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+def init_state_cache(app):
+    """
+    STATE_CACHE_BACKEND:
+      - "local"  → LRU por worker (por defecto)
+      - "redis"  → compartido; requiere el paquete `redis` y STATE_CACHE_URL
+      - "memory" → SharedBackend sobre MemoryClient (pruebas)
+    """
+    kind = app.config["STATE_CACHE_BACKEND"]
+    if kind == "redis":
+        import redis  # dependencia opcional
+
+        client = redis.Redis.from_url(app.config["STATE_CACHE_URL"])
+        state_cache.backend = SharedBackend(client)
+    elif kind == "memory":
+        state_cache.backend = SharedBackend(MemoryClient())
+    else:
+        state_cache.backend = LocalBackend(app.config["STATE_CACHE_SIZE"])
+    return app
@@ -0,0 +1,305 @@
+# state_kernel.py
+"""
+Núcleo puro del estado financiero: sin sesión, sin ORM, sin Flask.
+Recibe tuplas y números planos y devuelve el mismo dict que consume el
+dashboard. Las reglas del coach se evalúan con NumPy sobre arreglos, así
+que un usuario y diez mil usuarios pasan por el mismo código.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+
+from content import catalog
+
+DEFAULT_WORKING_DAYS = 26
+MIN_WORKING_DAYS = 22
+MAX_WORKING_DAYS = 30
+
+# ----------------------------------------------------------------------
+#  REGLAS DEL COACH
+# ----------------------------------------------------------------------
+# Cada estado es un código entero (índice en estas tuplas y en los
+# mensajes de content.py); los umbrales se evalúan en orden, como una
+# cadena de if/elif.
+MONTH_STATUSES = ("riesgo_alto", "riesgo_medio", "alineado", "excelente")
+DAY_STATUSES = ("sin_registro", "debajo", "cumplido", "superado")
+
+# El dashboard deriva la clase CSS de este texto: no va en locales/
+CATEGORY_STATUSES = ("Muy por debajo", "Por debajo", "En línea", "Por encima")
+
+
+def clamp_working_days(value) -> int:
+    """Días de trabajo válidos: 26 si no hay dato, forzado a 22–30."""
+    if not value:
+        return DEFAULT_WORKING_DAYS
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        days = DEFAULT_WORKING_DAYS
+    return max(MIN_WORKING_DAYS, min(MAX_WORKING_DAYS, days))
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """num / den donde den > 0; 0 en otro caso."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / den, 0.0)
+
+
+# ----------------------------------------------------------------------
+#  EVALUACIÓN POR LOTES
+# ----------------------------------------------------------------------
+class StateBatch:
+    """
+    Resultado de evaluate_batch: un arreglo por métrica (una posición por
+    usuario, categoría o meta). state(i) arma el dict del usuario i.
+    """
+
+    def __init__(self, today: date, **arrays):
+        self.today = today
+        self.__dict__.update(arrays)
+        self._cat_slices = self._slices(self.cat_owner)
+        self._goal_slices = self._slices(self.goal_owner)
+
+    def __len__(self) -> int:
+        return int(self.working_days.size)
+
+    def _slices(self, owner: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Orden estable por dueño: cada usuario conserva el orden de entrada
+        order = np.argsort(owner, kind="stable")
+        bounds = np.searchsorted(owner[order], np.arange(len(self) + 1))
+        return order, bounds
+
+    def _rows(self, slices, i: int) -> np.ndarray:
+        order, bounds = slices
+        return order[bounds[i]:bounds[i + 1]]
+
+    def state(self, i: int) -> dict:
+        """Estado completo del usuario en la posición i del lote."""
+        month_code = int(self.month_status[i])
+        day_code = int(self.day_status[i])
+        todays_income = float(self.todays_income[i])
+        daily_target = float(self.daily_target[i])
+
+        categories_state = [
+            {
+                "id": self.cat_ids[k],
+                "name": self.cat_names[k],
+                "meta_mes": float(self.cat_meta[k]),
+                "real_mes_estimado": float(self.cat_real[k]),
+                "porcentaje": float(self.cat_pct[k]),
+                "estado": CATEGORY_STATUSES[self.cat_status[k]],
+                "diario_sugerido": float(self.cat_daily[k]),
+            }
+            for k in self._rows(self._cat_slices, i)
+        ]
+        saving_state = [
+            {
+                "id": self.goal_ids[k],
+                "name": self.goal_names[k],
+                "meta": float(self.goal_meta[k]),
+                "acumulado": float(self.goal_saved[k]),
+                "porcentaje": float(self.goal_pct[k]),
+                "dias_restantes": (
+                    int(self.goal_days_left[k])
+                    if self.goal_has_deadline[k] else None
+                ),
+                "diario_sugerido": float(self.goal_daily[k]),
+                "mensaje": catalog.goal_message(self.goal_status[k]),
+            }
+            for k in self._rows(self._goal_slices, i)
+        ]
+
+        return {
+            "summary": {
+                "year": self.today.year,
+                "month": self.today.month,
+                "month_target": float(self.month_target[i]),
+                "working_days": int(self.working_days[i]),
+                "daily_target": daily_target,
+                "month_income_real": float(self.month_income[i]),
+                "todays_income": todays_income,
+                "avg_daily_real": float(self.avg_daily[i]),
+                "projected_month_income": float(self.projected_month[i]),
+                "projected_year_income": float(self.projected_year[i]),
+                "ratio_month": float(self.ratio_month[i]),
+                "ratio_until_today": float(self.ratio_until_today[i]),
+                "month_status": MONTH_STATUSES[month_code],
+                "month_message": catalog.month_message(month_code),
+                "day_status": DAY_STATUSES[day_code],
+                "day_message": catalog.day_message(
+                    day_code, todays_income, daily_target
+                ),
+            },
+            "categories": categories_state,
+            "saving": saving_state,
+            "verse": catalog.verse(int(self.user_keys[i]), self.today),
+        }
+
+
+def evaluate_batch(
+    today: date,
+    working_days,
+    month_income,
+    todays_income,
+    categories=(),
+    goals=(),
+    user_keys=None,
+) -> StateBatch:
+    """
+    Evalúa el estado del mes de n usuarios en una pasada.
+
+      working_days, month_income, todays_income: una posición por usuario
+      categories: tuplas (posición del usuario, id, nombre, meta mensual)
+      goals:      tuplas (posición del usuario, id, nombre, objetivo,
+                  fecha límite o None, acumulado)
+      user_keys:  id de cada usuario, para elegir su versículo del día
+                  (por defecto, la posición)
+
+    Los montos pueden llegar como float o Decimal. Las metas de categoría
+    se suman en centavos enteros, así que el total es exacto.
+    """
+    wd = np.clip(
+        np.asarray(working_days, dtype=np.int64),
+        MIN_WORKING_DAYS,
+        MAX_WORKING_DAYS,
+    )
+    n = wd.size
+    month_income = np.asarray(month_income, dtype=np.float64)
+    todays_income = np.asarray(todays_income, dtype=np.float64)
+
+    days_passed = max(1, today.day)
+    effective_days = np.minimum(days_passed, wd)
+
+    # ------------------ CATEGORÍAS ------------------
+    cat_owner, cat_ids, cat_names, cat_targets = (
+        list(col) for col in zip(*categories)
+    ) if categories else ([], [], [], [])
+    cat_owner = np.asarray(cat_owner, dtype=np.int64)
+    cat_cents = np.rint(
+        np.asarray(cat_targets, dtype=np.float64) * 100
+    ).astype(np.int64)
+    target_cents = np.zeros(n, dtype=np.int64)
+    np.add.at(target_cents, cat_owner, cat_cents)
+
+    month_target = target_cents / 100
+    month_target[month_target <= 0] = 1.0  # evitamos división por cero
+    daily_target = month_target / wd
+
+    # ------------------ RESUMEN DEL MES ------------------
+    ideal_until_today = daily_target * effective_days
+    avg_daily = month_income / days_passed
+    projected_month = avg_daily * wd
+    ratio_until_today = _ratio(month_income, ideal_until_today)
+    ratio_today = _ratio(todays_income, daily_target)
+
+    month_status = np.select(
+        [ratio_until_today < 0.5, ratio_until_today < 0.8,
+         ratio_until_today <= 1.1],
+        [0, 1, 2],
+        3,
+    )
+    day_status = np.select(
+        [todays_income == 0, ratio_today < 0.7, ratio_today <= 1.1],
+        [0, 1, 2],
+        3,
+    )
+
+    # ------------------ ESTADO DE CATEGORÍAS ------------------
+    # Se estima cuánto del ingreso real le toca a cada categoría según
+    # su peso en la meta mensual.
+    cat_meta = cat_cents / 100
+    cat_real = month_income[cat_owner] * (cat_meta / month_target[cat_owner])
+    cat_wd = wd[cat_owner]
+    cat_ideal = cat_meta * (effective_days[cat_owner] / cat_wd)
+    cat_ratio = _ratio(cat_real, cat_ideal)
+    cat_status = np.select(
+        [cat_ratio < 0.4, cat_ratio < 0.8, cat_ratio <= 1.1], [0, 1, 2], 3
+    )
+
+    # ------------------ AHORRO ------------------
+    goal_owner, goal_ids, goal_names, goal_targets, deadlines, saved = (
+        list(col) for col in zip(*goals)
+    ) if goals else ([], [], [], [], [], [])
+    goal_meta = np.asarray(goal_targets, dtype=np.float64)
+    goal_saved = np.asarray(saved, dtype=np.float64)
+    goal_has_deadline = np.array(
+        [isinstance(d, date) for d in deadlines], dtype=bool
+    )
+    goal_days_left = np.array(
+        [(d - today).days if isinstance(d, date) else 0 for d in deadlines],
+        dtype=np.int64,
+    )
+    goal_pct = _ratio(goal_saved, goal_meta) * 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        goal_daily = np.where(
+            goal_has_deadline & (goal_days_left > 0),
+            np.maximum(0.0, (goal_meta - goal_saved) / goal_days_left),
+            0.0,
+        )
+    goal_status = np.select(
+        [goal_pct >= 100, goal_pct >= 70, goal_pct >= 40], [0, 1, 2], 3
+    )
+
+    return StateBatch(
+        today,
+        user_keys=(
+            np.arange(n) if user_keys is None
+            else np.asarray(user_keys, dtype=np.int64)
+        ),
+        working_days=wd,
+        month_target=month_target,
+        daily_target=daily_target,
+        month_income=month_income,
+        todays_income=todays_income,
+        avg_daily=avg_daily,
+        projected_month=projected_month,
+        projected_year=projected_month * 12,
+        ratio_month=month_income / month_target,
+        ratio_until_today=ratio_until_today,
+        month_status=month_status,
+        day_status=day_status,
+        cat_owner=cat_owner,
+        cat_ids=cat_ids,
+        cat_names=cat_names,
+        cat_meta=cat_meta,
+        cat_real=cat_real,
+        cat_pct=_ratio(cat_real, cat_meta) * 100,
+        cat_status=cat_status,
+        cat_daily=cat_meta / cat_wd,
+        goal_owner=np.asarray(goal_owner, dtype=np.int64),
+        goal_ids=goal_ids,
+        goal_names=goal_names,
+        goal_meta=goal_meta,
+        goal_saved=goal_saved,
+        goal_pct=goal_pct,
+        goal_has_deadline=goal_has_deadline,
+        goal_days_left=goal_days_left,
+        goal_daily=goal_daily,
+        goal_status=goal_status,
+    )
+
+
+def compute_state(
+    today: date,
+    working_days: int,
+    categories,
+    month_income,
+    todays_income,
+    goals=(),
+    user_id: int = 0,
+) -> dict:
+    """
+    Estado de un solo usuario. categories: (id, nombre, meta mensual);
+    goals: (id, nombre, objetivo, fecha límite o None, acumulado).
+    """
+    return evaluate_batch(
+        today,
+        [working_days],
+        [month_income],
+        [todays_income],
+        [(0, *c) for c in categories],
+        [(0, *g) for g in goals],
+        user_keys=[user_id],
+    ).state(0)
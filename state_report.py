@@ -0,0 +1,191 @@
+# state_report.py
+from __future__ import annotations
+
+import calendar
+import csv
+import sys
+from datetime import date, datetime
+
+import click
+from sqlalchemy import case, func, select
+
+from db import db
+from models import User, Category, IncomeDailyRollup, SavingGoal, SavingDeposit
+from state_kernel import (
+    MONTH_STATUSES,
+    DAY_STATUSES,
+    StateBatch,
+    clamp_working_days,
+    evaluate_batch,
+)
+
+# Usuarios por lote: acota la memoria y los parámetros del IN (...)
+REPORT_CHUNK_USERS = 5000
+
+
+# ----------------------------------------------------------------------
+#  CARGA POR CONJUNTOS (3 CONSULTAS POR LOTE)
+# ----------------------------------------------------------------------
+def load_state_inputs(users, today: date) -> tuple:
+    """
+    Entradas del kernel para una lista de (user_id, working_days) con las
+    mismas 3 consultas del cálculo individual, agrupadas por usuario.
+    Devuelve los argumentos de evaluate_batch después de `today`.
+    """
+    users = list(users)
+    user_ids = [user_id for user_id, _ in users]
+    position = {user_id: i for i, user_id in enumerate(user_ids)}
+    first_day = today.replace(day=1)
+    last_day = today.replace(
+        day=calendar.monthrange(today.year, today.month)[1]
+    )
+
+    categories = [
+        (position[r.user_id], r.id, r.name, r.monthly_target)
+        for r in db.session.execute(
+            select(
+                Category.user_id,
+                Category.id,
+                Category.name,
+                Category.monthly_target,
+            )
+            .where(Category.user_id.in_(user_ids))
+            .order_by(Category.user_id, Category.id)
+        )
+    ]
+
+    month_income = [0.0] * len(users)
+    todays_income = [0.0] * len(users)
+    rollup = IncomeDailyRollup
+    for user_id, month_sum, today_sum in db.session.execute(
+        select(
+            rollup.user_id,
+            func.sum(rollup.total),
+            func.sum(case((rollup.day == today, rollup.total), else_=0)),
+        )
+        .where(
+            rollup.user_id.in_(user_ids),
+            rollup.day >= first_day,
+            rollup.day <= last_day,
+        )
+        .group_by(rollup.user_id)
+    ):
+        month_income[position[user_id]] = month_sum or 0
+        todays_income[position[user_id]] = today_sum or 0
+
+    goals = [
+        (position[r.user_id], r.id, r.name, r.target_amount, r.deadline,
+         r.acumulado)
+        for r in db.session.execute(
+            select(
+                SavingGoal.user_id,
+                SavingGoal.id,
+                SavingGoal.name,
+                SavingGoal.target_amount,
+                SavingGoal.deadline,
+                func.coalesce(func.sum(SavingDeposit.amount), 0).label(
+                    "acumulado"
+                ),
+            )
+            .outerjoin(SavingDeposit, SavingDeposit.goal_id == SavingGoal.id)
+            .where(SavingGoal.user_id.in_(user_ids))
+            .group_by(
+                SavingGoal.user_id,
+                SavingGoal.id,
+                SavingGoal.name,
+                SavingGoal.target_amount,
+                SavingGoal.deadline,
+            )
+            .order_by(SavingGoal.user_id, SavingGoal.id)
+        )
+    ]
+
+    return (
+        [clamp_working_days(wd) for _, wd in users],
+        month_income,
+        todays_income,
+        categories,
+        goals,
+    )
+
+
+def load_state_batch(users, today: date) -> StateBatch:
+    users = list(users)
+    return evaluate_batch(
+        today,
+        *load_state_inputs(users, today),
+        user_keys=[user_id for user_id, _ in users],
+    )
+
+
+def iter_state_batches(today: date, chunk_size: int = REPORT_CHUNK_USERS):
+    """Recorre todos los usuarios por id en lotes: (user_ids, StateBatch)."""
+    after = 0
+    while True:
+        users = db.session.execute(
+            select(User.id, User.working_days)
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).all()
+        if not users:
+            return
+        yield [u.id for u in users], load_state_batch(users, today)
+        after = users[-1].id
+        db.session.expunge_all()
+
+
+# ----------------------------------------------------------------------
+#  INTEGRACIÓN CON LA APP
+# ----------------------------------------------------------------------
+REPORT_COLUMNS = [
+    "user_id",
+    "month_status",
+    "day_status",
+    "ratio_until_today",
+    "month_income_real",
+    "month_target",
+    "projected_month_income",
+]
+
+
+def init_state_report(app):
+    @app.cli.command("state-report")
+    @click.option("--date", "day", default=None,
+                  help="Fecha AAAA-MM-DD (por defecto, hoy).")
+    @click.option("--status", "statuses", multiple=True,
+                  type=click.Choice(MONTH_STATUSES),
+                  help="Solo usuarios con este estado del mes (repetible).")
+    @click.option("--chunk-size", type=int, default=REPORT_CHUNK_USERS)
+    def state_report_command(day, statuses, chunk_size):
+        """CSV con el estado del mes de todos los usuarios (reporte nocturno)."""
+        today = (
+            datetime.strptime(day, "%Y-%m-%d").date() if day else date.today()
+        )
+        wanted = {MONTH_STATUSES.index(s) for s in statuses}
+        counts = [0] * len(MONTH_STATUSES)
+
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(REPORT_COLUMNS)
+        for user_ids, batch in iter_state_batches(today, chunk_size):
+            for i, user_id in enumerate(user_ids):
+                code = int(batch.month_status[i])
+                counts[code] += 1
+                if wanted and code not in wanted:
+                    continue
+                writer.writerow([
+                    user_id,
+                    MONTH_STATUSES[code],
+                    DAY_STATUSES[batch.day_status[i]],
+                    f"{batch.ratio_until_today[i]:.4f}",
+                    f"{batch.month_income[i]:.2f}",
+                    f"{batch.month_target[i]:.2f}",
+                    f"{batch.projected_month[i]:.2f}",
+                ])
+
+        summary = ", ".join(
+            f"{name}={n}" for name, n in zip(MONTH_STATUSES, counts)
+        )
+        click.echo(f"Usuarios: {sum(counts)} ({summary})", err=True)
+
+    return app
@@ -17,6 +17,16 @@ function todayISO() {
 let incomeChart = null;
 let savingChart = null;
 
+// Validador del último /api/state recibido (ETag)
+let stateEtag = null;
+
+// Último estado pintado (las escrituras devuelven solo lo que cambia)
+let currentState = null;
+
+// Versión de datos de ese estado (para /api/changes) y dueño de la copia
+let stateVersion = null;
+let stateUser = null;
+
 // ---------------------------------------------------------------------
 //  INICIALIZACIÓN
 // ---------------------------------------------------------------------
@@ -26,7 +36,25 @@ document.addEventListener("DOMContentLoaded", () => {
   if ($("saving-deposit-date")) $("saving-deposit-date").value = todayISO();
 
   setupHandlers();
-  refreshState();
+
+  // El dashboard trae el estado incrustado: no hace falta pedirlo otra vez
+  const initial = $("initial-state");
+  if (initial) {
+    stateEtag = initial.dataset.etag || null;
+    stateVersion = parseInt(initial.dataset.version || "0", 10);
+    stateUser = initial.dataset.user || null;
+    applyState(JSON.parse(initial.textContent));
+    syncChanges();
+  } else if ($("summary-month-target")) {
+    refreshState();
+  }
+
+  // Al volver la conexión o la pestaña: enviar la cola y pedir solo
+  // lo que cambió desde nuestra versión.
+  window.addEventListener("online", syncChanges);
+  document.addEventListener("visibilitychange", () => {
+    if (document.visibilityState === "visible") syncChanges();
+  });
 });
 
 // ---------------------------------------------------------------------
@@ -44,17 +72,17 @@ function setupHandlers() {
         return;
       }
 
-      const res = await fetch("/api/category", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ name, monthly_target: target }),
+      const data = await sendMutation("POST", "/api/category", {
+        op: "category.create",
+        data: { name, monthly_target: target },
       });
-      const data = await res.json();
       if (data.ok) {
-        $("category-status").textContent = "Categoría guardada.";
+        $("category-status").textContent = data.queued
+          ? OFFLINE_MESSAGE
+          : "Categoría guardada.";
         $("category-name").value = "";
         $("category-target").value = "";
-        refreshState();
+        applyMutation(data);
       } else {
         $("category-status").textContent =
           data.error || "Error al guardar categoría.";
@@ -73,18 +101,18 @@ function setupHandlers() {
         return;
       }
 
-      const res = await fetch("/api/income", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ amount, date }),
+      const data = await sendMutation("POST", "/api/income", {
+        op: "income.create",
+        data: { amount, date },
       });
-      const data = await res.json();
       if (data.ok) {
-        $("income-status").textContent = "Ingreso registrado.";
+        $("income-status").textContent = data.queued
+          ? OFFLINE_MESSAGE
+          : "Ingreso registrado.";
         $("income-amount").value = "";
-        refreshState();
+        applyMutation(data);
       } else {
-        $("income-status")..textContent =
+        $("income-status").textContent =
           data.error || "Error al registrar ingreso.";
       }
     });
@@ -103,18 +131,18 @@ function setupHandlers() {
         return;
       }
 
-      const res = await fetch("/api/saving_goal", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ name, target_amount: target, deadline }),
+      const data = await sendMutation("POST", "/api/saving_goal", {
+        op: "saving_goal.create",
+        data: { name, target_amount: target, deadline },
       });
-      const data = await res.json();
       if (data.ok) {
-        $("saving-goal-status").textContent = "Meta de ahorro creada.";
+        $("saving-goal-status").textContent = data.queued
+          ? OFFLINE_MESSAGE
+          : "Meta de ahorro creada.";
         $("saving-name").value = "";
         $("saving-target").value = "";
         $("saving-deadline").value = "";
-        refreshState();
+        applyMutation(data);
       } else {
         $("saving-goal-status").textContent =
           data.error || "Error al crear meta de ahorro.";
@@ -135,16 +163,16 @@ function setupHandlers() {
         return;
       }
 
-      const res = await fetch("/api/saving_deposit", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ goal_id: goalId, amount, date }),
+      const data = await sendMutation("POST", "/api/saving_deposit", {
+        op: "saving_deposit.create",
+        data: { goal_id: goalId, amount, date },
       });
-      const data = await res.json();
       if (data.ok) {
-        $("saving-deposit-status").textContent = "Aporte registrado.";
+        $("saving-deposit-status").textContent = data.queued
+          ? OFFLINE_MESSAGE
+          : "Aporte registrado.";
         $("saving-deposit-amount").value = "";
-        refreshState();
+        applyMutation(data);
       } else {
         $("saving-deposit-status").textContent =
           data.error || "Error al registrar aporte.";
@@ -153,15 +181,311 @@ function setupHandlers() {
   }
 }
 
+// ---------------------------------------------------------------------
+//  ESCRITURAS (CON COLA SIN CONEXIÓN)
+// ---------------------------------------------------------------------
+const OFFLINE_MESSAGE = "Sin conexión: se guardará al reconectar.";
+const SESSION_MESSAGE =
+  "Tu sesión expiró. Vuelve a iniciar sesión para guardar los cambios.";
+
+// `operation` es la misma escritura en formato de /api/batch: si la red
+// falla queda en la cola y se envía en un lote al reconectar.
+async function sendMutation(method, url, operation) {
+  let res;
+  try {
+    res = await fetch(`${url}?return_state=1`, {
+      method,
+      headers: { "Content-Type": "application/json" },
+      body: operation.data ? JSON.stringify(operation.data) : undefined,
+    });
+  } catch (err) {
+    // Solo un fallo de red (fetch lanza TypeError) va a la cola: si el
+    // servidor respondió, la respuesta manda.
+    if (!(err instanceof TypeError) || !(await outboxAdd(operation))) {
+      throw err;
+    }
+    return { ok: true, queued: true };
+  }
+  return readResponse(res);
+}
+
+// JSON de la API o, si no lo es (la sesión venció y /login respondió
+// con HTML, o un error del servidor), un {ok: false} con el motivo.
+async function readResponse(res) {
+  const type = res.headers.get("Content-Type") || "";
+  if (res.status === 401 || res.redirected) {
+    return { ok: false, status: 401, error: SESSION_MESSAGE };
+  }
+  if (!type.includes("application/json")) {
+    return { ok: false, status: res.status, error: `Error ${res.status}.` };
+  }
+  const data = await res.json();
+  return { ...data, ok: res.ok && data.ok === true, status: res.status };
+}
+
 // ---------------------------------------------------------------------
 //  REFRESCAR ESTADO COMPLETO
 // ---------------------------------------------------------------------
 async function refreshState() {
   try {
-    const res = await fetch("/api/state");
+    const headers = {};
+    if (stateEtag) headers["If-None-Match"] = stateEtag;
+
+    // "no-store": el 304 nos llega a nosotros y no lo resuelve el navegador
+    const res = await fetch("/api/state", { headers, cache: "no-store" });
+    if (res.status === 304) return;
+
     const data = await res.json();
     if (!data.ok) return;
 
+    stateEtag = res.headers.get("ETag");
+    stateVersion = data.version;
+    applyState(data);
+  } catch (err) {
+    // Sin red: al menos la última copia guardada
+    if (!currentState) {
+      const cached = await cacheGet();
+      if (cached) {
+        stateEtag = cached.etag;
+        stateVersion = cached.version;
+        applyState(cached.state);
+      }
+    }
+    console.error("Error al refrescar estado:", err);
+  }
+}
+
+// ---------------------------------------------------------------------
+//  SINCRONIZAR (COLA + /api/changes)
+// ---------------------------------------------------------------------
+let syncing = null;
+
+function syncChanges() {
+  // Un solo ciclo a la vez ("online" y "visibilitychange" llegan juntos)
+  if (!syncing) {
+    syncing = runSync().finally(() => {
+      syncing = null;
+    });
+  }
+  return syncing;
+}
+
+async function runSync() {
+  if (!navigator.onLine) return;
+  try {
+    await flushOutbox();
+    if (stateVersion === null) {
+      await refreshState();
+      return;
+    }
+
+    // Sin cambios y mismo día, la respuesta son unos bytes; si algo
+    // cambió, la última página trae el estado nuevo.
+    let since = stateVersion;
+    let data;
+    do {
+      const res = await fetch(
+        `/api/changes?since=${since}&day=${todayISO()}`,
+        { cache: "no-store" }
+      );
+      data = await res.json();
+      if (!data.ok) return;
+      since = data.version;
+    } while (data.more);
+
+    if (data.state) {
+      stateEtag = data.etag || null;
+      stateVersion = data.version;
+      applyState(data.state);
+    }
+  } catch (err) {
+    console.warn("Sincronización pendiente:", err);
+  }
+}
+
+// Máximo de operaciones por lote (MAX_BATCH_OPERATIONS del servidor)
+const OUTBOX_BATCH = 500;
+
+// Cada operación viaja con su clave de idempotencia: si la respuesta de
+// un lote se pierde y se reenvía, el servidor salta lo ya aplicado.
+// Solo se borra de la cola lo que el servidor confirmó; lo rechazado
+// (sesión vencida, datos inválidos) se conserva y se avisa.
+async function flushOutbox() {
+  const pending = await outboxRead();
+  const failed = [];
+  for (let i = 0; i < pending.length; i += OUTBOX_BATCH) {
+    const chunk = pending.slice(i, i + OUTBOX_BATCH);
+    const res = await fetch("/api/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        mode: "best_effort",
+        operations: chunk.map((item) => item.operation),
+      }),
+    });
+    const data = await readResponse(res);
+    if (!data.ok) {
+      showSyncError(data.error || "No se pudieron guardar los cambios.");
+      return;
+    }
+    const done = chunk.filter((item, k) => data.results[k].ok);
+    chunk.forEach((item, k) => {
+      if (!data.results[k].ok) failed.push(data.results[k].error);
+    });
+    await outboxDelete(done.map((item) => item.key));
+  }
+  showSyncError(
+    failed.length
+      ? `${failed.length} cambio(s) sin guardar: ${failed[0]}`
+      : ""
+  );
+}
+
+function showSyncError(message) {
+  const el = $("sync-status");
+  if (el) el.textContent = message;
+}
+
+function newOperationKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// ---------------------------------------------------------------------
+//  COPIA LOCAL (IndexedDB)
+// ---------------------------------------------------------------------
+// "kv": último estado por usuario {state, etag, version, day}
+// "outbox": escrituras hechas sin conexión, en orden
+let idbPromise = null;
+
+function openIdb() {
+  if (!idbPromise) {
+    idbPromise = new Promise((resolve) => {
+      if (!window.indexedDB || !stateUser) {
+        resolve(null);
+        return;
+      }
+      const req = indexedDB.open("finanzas", 1);
+      req.onupgradeneeded = () => {
+        req.result.createObjectStore("kv");
+        req.result.createObjectStore("outbox", { autoIncrement: true });
+      };
+      req.onsuccess = () => resolve(req.result);
+      // Navegación privada o sin permisos: todo sigue por la red
+      req.onerror = () => resolve(null);
+    });
+  }
+  return idbPromise;
+}
+
+async function idbRun(storeName, mode, work) {
+  const idb = await openIdb();
+  if (!idb) return undefined;
+  return new Promise((resolve, reject) => {
+    const tx = idb.transaction(storeName, mode);
+    const result = work(tx.objectStore(storeName));
+    tx.oncomplete = () => resolve(result ? result() : true);
+    tx.onerror = () => reject(tx.error);
+  });
+}
+
+function cacheKey() {
+  return `state:${stateUser}`;
+}
+
+function cacheState() {
+  const entry = {
+    state: currentState,
+    etag: stateEtag,
+    version: stateVersion,
+    day: todayISO(),
+  };
+  idbRun("kv", "readwrite", (store) => {
+    store.put(entry, cacheKey());
+  }).catch((err) => console.warn("No se pudo guardar la copia:", err));
+}
+
+async function cacheGet() {
+  try {
+    const entry = await idbRun("kv", "readonly", (store) => {
+      const req = store.get(cacheKey());
+      return () => req.result;
+    });
+    return entry || null;
+  } catch (err) {
+    return null;
+  }
+}
+
+async function outboxAdd(operation) {
+  try {
+    return await idbRun("outbox", "readwrite", (store) => {
+      store.add({
+        user: stateUser,
+        operation: { ...operation, key: newOperationKey() },
+      });
+    });
+  } catch (err) {
+    return false;
+  }
+}
+
+async function outboxRead() {
+  const items = await idbRun("outbox", "readonly", (store) => {
+    const keys = store.getAllKeys();
+    const values = store.getAll();
+    return () =>
+      values.result.map((value, i) => ({ key: keys.result[i], ...value }));
+  });
+  // Solo lo de este usuario (el navegador puede ser compartido)
+  return (items || []).filter((item) => item.user === stateUser);
+}
+
+function outboxDelete(keys) {
+  if (!keys.length) return Promise.resolve(true);
+  return idbRun("outbox", "readwrite", (store) => {
+    keys.forEach((key) => store.delete(key));
+  });
+}
+
+// ---------------------------------------------------------------------
+//  APLICAR LA RESPUESTA DE UNA ESCRITURA
+// ---------------------------------------------------------------------
+// Con ?return_state=1 el servidor devuelve solo las partes afectadas
+// (summary, categories, saving o una sola meta en saving_goal).
+function applyMutation(data) {
+  // En cola sin conexión: se verá al sincronizar
+  if (data.queued) return;
+  if (!data.state || !currentState) {
+    refreshState();
+    return;
+  }
+  // Las partes que llegan solo alcanzan si la escritura se aplicó sobre
+  // nuestra versión. Si otra pestaña o dispositivo escribió en medio,
+  // adoptar data.version saltaría esos cambios: se piden al feed.
+  if (stateVersion === null || data.base_version !== stateVersion) {
+    syncChanges();
+    return;
+  }
+  const next = { ...currentState, ...data.state };
+  if (data.state.saving_goal) {
+    next.saving = currentState.saving.map((goal) =>
+      goal.id === data.state.saving_goal.id ? data.state.saving_goal : goal
+    );
+  }
+  delete next.saving_goal;
+  stateEtag = data.etag || null;
+  stateVersion = data.version;
+  applyState(next);
+}
+
+// ---------------------------------------------------------------------
+//  PINTAR ESTADO (INCRUSTADO O DE /api/state)
+// ---------------------------------------------------------------------
+function applyState(data) {
+  currentState = data;
+  cacheState();
+  try {
     // --- Verso ---
     if (data.verse) {
       $("bible-verse-text").textContent = `"${data.verse.text}"`;
@@ -196,7 +520,7 @@ async function refreshState() {
     renderIncomeChart(s);
     renderSavingChart(data.saving);
   } catch (err) {
-    console.error("Error al refrescar estado:", err);
+    console.error("Error al pintar el estado:", err);
   }
 }
 
@@ -287,17 +611,13 @@ async function editCategory(c) {
   const nuevaMeta = parseFloat(nuevaMetaStr || "0");
   if (!nuevoNombre.trim() || nuevaMeta <= 0) return;
 
-  const res = await fetch(`/api/category/${c.id}`, {
-    method: "PUT",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      name: nuevoNombre.trim(),
-      monthly_target: nuevaMeta,
-    }),
+  const data = await sendMutation("PUT", `/api/category/${c.id}`, {
+    op: "category.update",
+    id: c.id,
+    data: { name: nuevoNombre.trim(), monthly_target: nuevaMeta },
   });
-  const data = await res.json();
   if (data.ok) {
-    refreshState();
+    applyMutation(data);
   }
 }
 
@@ -307,10 +627,12 @@ async function deleteCategory(id) {
   );
   if (!ok) return;
 
-  const res = await fetch(`/api/category/${id}`, { method: "DELETE" });
-  const data = await res.json();
+  const data = await sendMutation("DELETE", `/api/category/${id}`, {
+    op: "category.delete",
+    id,
+  });
   if (data.ok) {
-    refreshState();
+    applyMutation(data);
   }
 }
 
@@ -0,0 +1,99 @@
+# tests/conftest.py
+"""
+La app se crea una vez (app.py la instancia al importarse) sobre un
+SQLite temporal, sin hilos de fondo ni pool de hashes. Cada test empieza
+con las tablas vacías y las cachés en blanco.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+    tempfile.mkdtemp(), "tests.db"
+)
+os.environ.update(
+    SNAPSHOT_ENABLED="0",
+    REAPER_ENABLED="0",
+    PASSWORD_HASH_WORKERS="0",
+    LOGIN_MAX_FAILURES_PER_IP="0",
+    LOGIN_MAX_FAILURES_PER_EMAIL="0",
+)
+
+from sqlalchemy import delete, event  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from db import db  # noqa: E402
+from models import User  # noqa: E402
+from state_cache import LocalBackend, state_cache  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(delete(table))
+        db.session.commit()
+    state_cache.backend = LocalBackend()
+    state_cache.hits = state_cache.misses = 0
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(email: str = "ana@example.com", **fields) -> int:
+        with app.app_context():
+            user = User(
+                name=fields.pop("name", "Ana"),
+                email=email,
+                password_hash=fields.pop("password_hash", "x"),
+                working_days=fields.pop("working_days", 26),
+                last_active_at=fields.pop("last_active_at", datetime.utcnow()),
+                **fields,
+            )
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """Test client con la sesión de ese usuario (como tras /login)."""
+
+    def client_for(user_id: int):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+        return client
+
+    return client_for
+
+
+@contextmanager
+def count_statements(app):
+    """Sentencias SQL ejecutadas dentro del bloque (lista de textos)."""
+    statements: list[str] = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
@@ -0,0 +1,43 @@
+-- Esquema de la app antes de cualquier migración (commit base, SQLite)
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	email VARCHAR(120) NOT NULL, 
+	password_hash VARCHAR(255) NOT NULL, 
+	last_active_at DATETIME, 
+	working_days INTEGER, 
+	CONSTRAINT pk_users PRIMARY KEY (id), 
+	CONSTRAINT uq_users_email UNIQUE (email)
+);
+CREATE TABLE categories (
+	id INTEGER NOT NULL, 
+	name VARCHAR(80) NOT NULL, 
+	monthly_target FLOAT NOT NULL, 
+	user_id INTEGER, 
+	CONSTRAINT pk_categories PRIMARY KEY (id), 
+	CONSTRAINT fk_categories_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE incomes (
+	id INTEGER NOT NULL, 
+	amount FLOAT NOT NULL, 
+	date DATE NOT NULL, 
+	user_id INTEGER, 
+	CONSTRAINT pk_incomes PRIMARY KEY (id), 
+	CONSTRAINT fk_incomes_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE saving_goals (
+	id INTEGER NOT NULL, 
+	name VARCHAR(80) NOT NULL, 
+	target_amount FLOAT NOT NULL, 
+	deadline DATE, 
+	user_id INTEGER, 
+	CONSTRAINT pk_saving_goals PRIMARY KEY (id), 
+	CONSTRAINT fk_saving_goals_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE saving_deposits (
+	id INTEGER NOT NULL, 
+	amount FLOAT NOT NULL, 
+	date DATE NOT NULL, 
+	goal_id INTEGER, 
+	CONSTRAINT pk_saving_deposits PRIMARY KEY (id), 
+	CONSTRAINT fk_saving_deposits_goal_id_saving_goals FOREIGN KEY(goal_id) REFERENCES saving_goals (id)
+);
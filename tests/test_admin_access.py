@@ -0,0 +1,39 @@
+# tests/test_admin_access.py
+"""Las rutas de administración no se fían de la instantánea de la cookie."""
+from sqlalchemy import update
+
+from db import db
+from models import User
+from user_session import SNAPSHOT_KEY
+
+
+def _set_admin(app, user_id, value):
+    with app.app_context():
+        db.session.execute(
+            update(User).where(User.id == user_id).values(is_admin=value)
+        )
+        db.session.commit()
+
+
+def test_revoked_admin_is_refused_at_once(app, make_user, login):
+    user_id = make_user(is_admin=True)
+    client = login(user_id)
+    assert client.get("/admin/users.json").status_code == 200
+
+    _set_admin(app, user_id, False)
+    # La instantánea sigue vigente y aún dice que es administrador
+    with client.session_transaction() as session:
+        assert session[SNAPSHOT_KEY]["adm"] is True
+    res = client.get("/admin/users.json")
+    assert res.status_code == 302
+    with client.session_transaction() as session:
+        assert session[SNAPSHOT_KEY]["adm"] is False
+
+
+def test_granted_admin_gets_in_at_once(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    assert client.get("/admin/users.json").status_code == 302
+
+    _set_admin(app, user_id, True)
+    assert client.get("/admin/users.json").status_code == 200
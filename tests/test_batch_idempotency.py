@@ -0,0 +1,88 @@
+# tests/test_batch_idempotency.py
+"""Reenvíos de la cola sin conexión: cada clave se aplica una sola vez."""
+from sqlalchemy import func, select
+
+from db import db
+from models import AppliedOperation, Category, Income
+
+
+def _count(app, model, user_id):
+    with app.app_context():
+        return db.session.execute(
+            select(func.count()).select_from(model)
+            .where(model.user_id == user_id)
+        ).scalar_one()
+
+
+def _batch(client, operations):
+    return client.post("/api/batch", json={
+        "mode": "best_effort", "operations": operations,
+    })
+
+
+def test_replayed_batch_does_not_duplicate_rows(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    operations = [
+        {"op": "income.create", "key": "k-income-1",
+         "data": {"amount": "10.00", "date": "2026-01-05"}},
+        {"op": "income.create", "key": "k-income-2",
+         "data": {"amount": "20.00", "date": "2026-01-05"}},
+        {"op": "category.create", "key": "k-cat",
+         "data": {"name": "Casa", "monthly_target": "100"}},
+    ]
+
+    first = _batch(client, operations).get_json()
+    assert first["ok"] and first["applied"] == 3
+    version = first["version"]
+
+    # La respuesta se "perdió": el cliente reenvía el mismo lote
+    second = _batch(client, operations).get_json()
+    assert second["ok"] and second["applied"] == 0
+    assert all(r["ok"] and r["duplicate"] for r in second["results"])
+    assert second["results"][2]["id"] == first["results"][2]["id"]
+    # Sin escrituras nuevas no se sube la versión
+    assert second["version"] == version
+
+    assert _count(app, Income, user_id) == 2
+    assert _count(app, Category, user_id) == 1
+    assert _count(app, AppliedOperation, user_id) == 3
+
+
+def test_partial_replay_applies_only_new_keys(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    old = {"op": "income.create", "key": "a",
+           "data": {"amount": "5.00", "date": "2026-01-05"}}
+    new = {"op": "income.create", "key": "b",
+           "data": {"amount": "7.00", "date": "2026-01-05"}}
+
+    _batch(client, [old])
+    report = _batch(client, [old, new]).get_json()
+
+    assert [r.get("duplicate", False) for r in report["results"]] == [
+        True, False,
+    ]
+    assert report["applied"] == 1
+    assert _count(app, Income, user_id) == 2
+
+
+def test_failed_operation_keeps_its_key_free(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    bad = {"op": "saving_deposit.create", "key": "dep",
+           "data": {"goal_id": 999, "amount": "5.00"}}
+
+    report = _batch(client, [bad]).get_json()
+    assert report["results"][0]["ok"] is False
+    assert _count(app, AppliedOperation, user_id) == 0
+
+
+def test_invalid_key_is_rejected(app, make_user, login):
+    client = login(make_user())
+    report = _batch(client, [
+        {"op": "income.create", "key": "x" * 65, "data": {"amount": "1"}},
+    ]).get_json()
+    assert report["results"][0] == {
+        "ok": False, "error": "Clave de operación inválida", "status": 400,
+    }
@@ -0,0 +1,52 @@
+# tests/test_batch_savepoints.py
+"""best_effort: un SAVEPOINT que no se puede abrir falla solo esa operación."""
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from db import db
+
+
+@pytest.fixture
+def failing_savepoint(monkeypatch):
+    """El SAVEPOINT número `n` (desde 1) falla al abrirse."""
+
+    def install(n):
+        calls = [0]
+
+        def begin_nested():
+            calls[0] += 1
+            if calls[0] == n:
+                raise OperationalError("SAVEPOINT", {}, Exception("caída"))
+            return db.session.registry().begin_nested()
+
+        monkeypatch.setattr(db.session, "begin_nested", begin_nested)
+
+    return install
+
+
+@pytest.mark.parametrize("operations", [
+    # Operaciones sueltas (una por SAVEPOINT)
+    [{"op": "category.create",
+      "data": {"name": "Casa", "monthly_target": "100"}},
+     {"op": "category.create",
+      "data": {"name": "Comida", "monthly_target": "50"}}],
+    # Grupos en bloque cortados por otra operación
+    [{"op": "income.create", "data": {"amount": "1.00"}},
+     {"op": "category.create",
+      "data": {"name": "Casa", "monthly_target": "100"}},
+     {"op": "income.create", "data": {"amount": "2.00"}}],
+], ids=["sueltas", "en-bloque"])
+def test_savepoint_failure_fails_only_that_operation(
+        app, make_user, login, failing_savepoint, operations):
+    client = login(make_user())
+    failing_savepoint(len(operations))
+
+    res = client.post("/api/batch", json={
+        "mode": "best_effort", "operations": operations,
+    })
+    assert res.status_code == 200
+    results = res.get_json()["results"]
+    assert all(r["ok"] for r in results[:-1])
+    assert results[-1] == {
+        "ok": False, "error": "Error al guardar", "status": 500,
+    }
@@ -0,0 +1,100 @@
+# tests/test_changes.py
+"""Páginas de /api/changes: una versión nunca se reparte entre dos."""
+from changes import changes_since
+
+
+def _batch(client, count, day="2026-01-05"):
+    """Un lote = una versión con `count` entradas en el registro."""
+    return client.post("/api/batch", json={
+        "mode": "atomic",
+        "operations": [
+            {"op": "income.create", "key": f"{day}-{count}-{i}",
+             "data": {"amount": f"{i + 1}.00", "date": day}}
+            for i in range(count)
+        ],
+    }).get_json()
+
+
+def _pages(client, since, limit):
+    pages = []
+    while True:
+        page = client.get(
+            f"/api/changes?since={since}&limit={limit}"
+        ).get_json()
+        assert page["ok"] and not page["reset"]
+        pages.append(page)
+        since = page["version"]
+        if not page["more"]:
+            return pages
+
+
+def test_version_larger_than_limit_is_sent_whole(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    big = _batch(client, 5)["version"]
+    small = _batch(client, 1, day="2026-01-06")["version"]
+
+    with app.app_context():
+        first = changes_since(user_id, 0, small, limit=2)
+    assert first["version"] == big
+    assert first["more"] is True
+    assert len(first["changes"]) == 5
+    assert {c["seq"] for c in first["changes"]} == {big}
+
+    with app.app_context():
+        second = changes_since(user_id, big, small, limit=2)
+    assert second["version"] == small
+    assert second["more"] is False
+    assert [c["seq"] for c in second["changes"]] == [small]
+
+
+def test_pages_end_on_whole_versions(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    sizes = [2, 3, 1, 4]
+    versions = [
+        _batch(client, n, day=f"2026-01-0{i + 1}")["version"]
+        for i, n in enumerate(sizes)
+    ]
+
+    pages = _pages(client, 0, limit=3)
+    seen = [c["seq"] for page in pages for c in page["changes"]]
+    # Todas las entradas, en orden y una sola vez
+    assert sorted(seen) == seen
+    assert len(seen) == sum(sizes)
+    expected = dict(zip(versions, sizes))
+    for page in pages:
+        # Cada página trae completas las versiones que toca
+        in_page = [c["seq"] for c in page["changes"]]
+        for seq in set(in_page):
+            assert in_page.count(seq) == expected[seq]
+        assert max(in_page) == page["version"]
+    assert pages[-1]["version"] == versions[-1]
+    # El estado solo viaja con la última página
+    assert all("state" not in page for page in pages[:-1])
+    assert "state" in pages[-1]
+
+
+def test_income_and_deposit_changes_carry_row_ids(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    report = client.post("/api/batch", json={"mode": "atomic", "operations": [
+        {"op": "saving_goal.create", "ref": "g",
+         "data": {"name": "Meta", "target_amount": "100"}},
+        {"op": "income.create", "data": {"amount": "1.00"}},
+        {"op": "income.create", "data": {"amount": "2.00"}},
+        {"op": "saving_deposit.create",
+         "data": {"goal_id": {"ref": "g"}, "amount": "3.00"}},
+    ]}).get_json()
+    ids = [r["id"] for r in report["results"]]
+    single = client.post("/api/income", json={"amount": "4.00"}).get_json()
+
+    with app.app_context():
+        feed = changes_since(user_id, 0, report["version"] + 1)
+    inserted = [(c["entity"], c["id"]) for c in feed["changes"]
+                if c["action"] == "insert"]
+    assert inserted == [
+        ("income", ids[1]), ("income", ids[2]),
+        ("saving_deposit", ids[3]), ("income", single["id"]),
+    ]
+    assert None not in ids
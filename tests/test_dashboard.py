@@ -0,0 +1,90 @@
+# tests/test_dashboard.py
+"""GET /dashboard calcula el estado una vez y lo incrusta en la página."""
+import json
+import re
+
+import pytest
+from sqlalchemy import delete
+
+import snapshots
+from db import db
+from models import StateSnapshot
+from state_cache import LocalBackend, state_cache
+
+INITIAL_STATE = re.compile(
+    r'<script type="application/json" id="initial-state"[^>]*>(.*?)</script>',
+    re.S,
+)
+
+
+@pytest.fixture
+def compute_calls(monkeypatch):
+    calls = []
+    original = snapshots.compute_state
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(snapshots, "compute_state", counting)
+    return calls
+
+
+def _dashboard(client):
+    res = client.get("/dashboard")
+    assert res.status_code == 200
+    match = INITIAL_STATE.search(res.get_data(as_text=True))
+    assert match, "falta el estado incrustado"
+    return json.loads(match.group(1))
+
+
+def _forget(app, snapshot=True):
+    state_cache.backend = LocalBackend()
+    if snapshot:
+        with app.app_context():
+            db.session.execute(delete(StateSnapshot))
+            db.session.commit()
+
+
+def _user_with_data(make_user, login):
+    client = login(make_user())
+    client.post("/api/batch", json={"mode": "atomic", "operations": [
+        {"op": "category.create",
+         "data": {"name": "Casa", "monthly_target": "1000"}},
+        {"op": "income.create", "data": {"amount": "25.00"}},
+    ]})
+    return client
+
+
+def test_cold_dashboard_computes_once(app, make_user, login,
+                                      compute_calls):
+    client = _user_with_data(make_user, login)
+    _forget(app)
+    compute_calls.clear()
+
+    state = _dashboard(client)
+    # El mismo cálculo sirve para la página y para el estado incrustado
+    assert len(compute_calls) == 1
+    assert state["summary"]["month_income_real"] == 25.0
+    assert state["categories"][0]["name"] == "Casa"
+
+
+def test_dashboard_from_snapshot_computes_once(app, make_user, login,
+                                               compute_calls):
+    client = _user_with_data(make_user, login)
+    _dashboard(client)
+    _forget(app, snapshot=False)
+    compute_calls.clear()
+
+    _dashboard(client)
+    assert len(compute_calls) == 1
+
+
+def test_cached_dashboard_does_not_recompute(app, make_user, login,
+                                             compute_calls):
+    client = _user_with_data(make_user, login)
+    first = _dashboard(client)
+    compute_calls.clear()
+
+    assert _dashboard(client) == first
+    assert compute_calls == []
@@ -0,0 +1,50 @@
+# tests/test_deleted_user.py
+"""Escrituras con la sesión de una cuenta que ya se borró."""
+import pytest
+from sqlalchemy import func, select
+from werkzeug.exceptions import HTTPException
+
+from db import db
+from deletion import delete_users
+from finance import commit_user_change
+from models import Income
+
+
+def _delete(app, user_id):
+    with app.app_context():
+        delete_users([user_id])
+        db.session.commit()
+
+
+def test_write_after_deletion_is_401(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    # La instantánea de la cookie sigue diciendo que hay usuario
+    assert client.get("/api/state").status_code == 200
+    _delete(app, user_id)
+
+    res = client.post("/api/income",
+                      json={"amount": "10.00", "date": "2026-01-05"})
+    assert res.status_code == 401
+    assert res.get_json() == {"ok": False, "error": "No autenticado"}
+    with app.app_context():
+        assert db.session.execute(
+            select(func.count()).select_from(Income)
+        ).scalar_one() == 0
+    # La sesión quedó limpia
+    with client.session_transaction() as session:
+        assert "user_id" not in session
+
+
+def test_commit_user_change_without_user_rolls_back(app, make_user):
+    user_id = make_user()
+    _delete(app, user_id)
+    with app.test_request_context("/api/income", method="POST"):
+        db.session.add(Income(user_id=user_id, amount=5))
+        with pytest.raises(HTTPException) as info:
+            commit_user_change(user_id)
+        assert info.value.response.status_code == 401
+        assert not db.session.new
+        assert db.session.execute(
+            select(func.count()).select_from(Income)
+        ).scalar_one() == 0
@@ -0,0 +1,88 @@
+# tests/test_deletion.py
+"""delete_users: sin filas huérfanas y con sentencias fijas."""
+import pytest
+from sqlalchemy import func, select
+
+from conftest import count_statements
+from db import db
+from deletion import delete_users
+from models import SavingDeposit, SavingGoal
+
+
+def _fill(client, n):
+    """n categorías, ingresos, metas y aportes (más cambios y claves)."""
+    operations = []
+    for i in range(n):
+        operations += [
+            {"op": "category.create", "key": f"c{i}",
+             "data": {"name": f"Cat {i}", "monthly_target": "100"}},
+            {"op": "income.create", "key": f"i{i}",
+             "data": {"amount": f"{i + 1}.00",
+                      "date": f"2026-01-{i % 28 + 1:02d}"}},
+            {"op": "saving_goal.create", "key": f"g{i}", "ref": f"g{i}",
+             "data": {"name": f"Meta {i}", "target_amount": "1000"}},
+            {"op": "saving_deposit.create", "key": f"d{i}",
+             "data": {"goal_id": {"ref": f"g{i}"}, "amount": "5.00"}},
+        ]
+    report = client.post("/api/batch", json={
+        "mode": "atomic", "operations": operations,
+    }).get_json()
+    assert report["ok"] and report["applied"] == len(operations)
+    # Instantánea del estado
+    assert client.get("/api/state").status_code == 200
+
+
+def _rows_of(user_id):
+    """Filas por tabla que pertenecen a `user_id` (0 si no hay)."""
+    counts = {}
+    for table in db.metadata.sorted_tables:
+        column = table.c.get("user_id")
+        if column is None and table.name == "users":
+            column = table.c.id
+        if column is not None:
+            counts[table.name] = db.session.execute(
+                select(func.count()).select_from(table)
+                .where(column == user_id)
+            ).scalar_one()
+    counts["saving_deposits"] = db.session.execute(
+        select(func.count()).select_from(SavingDeposit)
+        .join(SavingGoal, SavingGoal.id == SavingDeposit.goal_id)
+        .where(SavingGoal.user_id == user_id)
+    ).scalar_one()
+    return counts
+
+
+def test_deletes_every_child_row(app, make_user, login):
+    gone = make_user("ana@example.com")
+    kept = make_user("beto@example.com")
+    _fill(login(gone), 3)
+    _fill(login(kept), 2)
+
+    with app.app_context():
+        before = _rows_of(gone)
+        report = delete_users([gone])
+        db.session.commit()
+        after_gone, after_kept = _rows_of(gone), _rows_of(kept)
+
+    # Había datos en cada tabla hija y ya no queda ninguno
+    assert all(before.values()), before
+    assert not any(after_gone.values()), after_gone
+    assert report["rows"]["users"] == 1
+    assert report["rows"]["saving_deposits"] == 3
+    # Lo del otro usuario sigue ahí
+    assert all(after_kept.values()), after_kept
+
+
+@pytest.mark.parametrize("rows", [1, 25])
+def test_statement_count_does_not_grow_with_rows(app, make_user, login,
+                                                 rows):
+    user_id = make_user()
+    _fill(login(user_id), rows)
+
+    with count_statements(app) as statements:
+        with app.app_context():
+            report = delete_users([user_id])
+            db.session.commit()
+    # Una sentencia por tabla, haya 1 o 25 filas en cada una
+    assert report["statements"] == 10
+    assert len(statements) == report["statements"]
@@ -0,0 +1,61 @@
+# tests/test_fork_pool.py
+"""
+Un proceso hijo nunca usa una conexión que el padre dejó en el pool: la
+guardia de db._guard_fork la descarta al sacarla y abre otra (con o sin
+dispose_engines tras el fork).
+"""
+import os
+
+import pytest
+from sqlalchemy import text
+
+from db import db, dispose_engines
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="sin os.fork")
+
+
+def _fill_parent_pool(app) -> None:
+    """Deja conexiones abiertas en el pool, como el master antes del fork."""
+    with app.app_context():
+        conns = [db.engine.connect() for _ in range(3)]
+        for conn in conns:
+            conn.execute(text("SELECT 1"))
+        for conn in conns:
+            conn.close()
+
+
+def _run_in_child(check) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = check()
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+
+
+@pytest.mark.parametrize("dispose", [False, True],
+                         ids=["guardia", "dispose_engines"])
+def test_child_never_uses_parent_connections(app, dispose):
+    _fill_parent_pool(app)
+
+    def check() -> int:
+        if dispose:
+            dispose_engines(app)
+        with app.app_context():
+            for _ in range(5):
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    # La guardia anota en qué proceso se abrió cada una
+                    record = conn.connection._connection_record
+                    if record.info.get("pid") != os.getpid():
+                        return 2
+        return 0
+
+    assert _run_in_child(check) == 0
+    # El padre sigue usando su pool sin problemas
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.execute(text("SELECT 1")).scalar() == 1
@@ -0,0 +1,52 @@
+# tests/test_metrics.py
+"""/metrics sin METRICS_TOKEN y la medición de sentencias SQL."""
+import pytest
+
+
+def _metrics(app, remote_addr, headers=None):
+    client = app.test_client()
+    return client.get("/metrics", headers=headers or {},
+                      environ_base={"REMOTE_ADDR": remote_addr})
+
+
+@pytest.mark.parametrize("addr", ["127.0.0.1", "::1", "10.0.0.5",
+                                  "192.168.1.20"])
+def test_internal_addresses_can_scrape(app, addr):
+    res = _metrics(app, addr)
+    assert res.status_code == 200
+    assert "# TYPE" in res.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("addr", ["1.1.1.1", "8.8.8.8", "2001:4860::1"])
+def test_public_addresses_are_refused(app, addr):
+    assert _metrics(app, addr).status_code == 403
+
+
+def test_forwarded_request_without_proxy_fix_is_refused(app):
+    # Sin PROXY_HOPS la IP es la del proxy local, no la del cliente
+    res = _metrics(app, "127.0.0.1",
+                   headers={"X-Forwarded-For": "8.8.8.8"})
+    assert res.status_code == 403
+
+
+def test_failed_statement_leaves_nothing_on_the_connection(app):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from db import db
+    from instrumentation import RequestStats, _current
+
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with app.app_context(), db.engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 1"))
+            assert not conn.info.get("query_started")
+    finally:
+        _current.reset(token)
+    # Solo cuenta la sentencia que terminó
+    assert stats.statements == 1
+    assert stats.templates == {"SELECT 1": 1}
@@ -0,0 +1,87 @@
+# tests/test_migrations.py
+"""
+Una base creada con el esquema original (antes de la primera migración)
+se pone al día con run_migrations, en el mismo orden que al arrancar:
+create_all primero (solo crea tablas nuevas) y luego las migraciones.
+"""
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from db import db
+from migrations import MIGRATIONS, run_migrations
+from models import IncomeDailyRollup, IncomeMonthlyRollup
+
+BASELINE = os.path.join(os.path.dirname(__file__), "data",
+                        "baseline_schema.sql")
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    path = tmp_path / "baseline.db"
+    with open(BASELINE, encoding="utf-8") as fh, \
+            sqlite3.connect(path) as conn:
+        conn.executescript(fh.read())
+        conn.execute("INSERT INTO users (id, email, password_hash, "
+                     "last_active_at, working_days) VALUES "
+                     "(1, 'ana@example.com', 'x', '2026-01-10 08:00:00', 26)")
+        conn.executemany(
+            "INSERT INTO incomes (amount, date, user_id) VALUES (?, ?, 1)",
+            [(10.5, "2026-01-05"), (4.25, "2026-01-05"), (3.0, "2026-02-01")],
+        )
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def test_baseline_database_upgrades(baseline_engine):
+    db.metadata.create_all(baseline_engine)
+    applied = run_migrations(baseline_engine)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    # Volver a correr no hace nada
+    assert run_migrations(baseline_engine) == []
+
+    inspector = inspect(baseline_engine)
+    columns = {c["name"] for c in inspector.get_columns("users")}
+    assert {"name", "is_admin", "created_at", "last_login_at",
+            "data_version"} <= columns
+    indexes = {
+        table: {i["name"] for i in inspector.get_indexes(table)}
+        for table in ("users", "incomes", "saving_deposits")
+    }
+    assert "ix_users_created_at_id" in indexes["users"]
+    assert "ix_users_last_active_at" in indexes["users"]
+    assert "ix_incomes_user_id_date" in indexes["incomes"]
+    assert "ix_saving_deposits_goal_id_date" in indexes["saving_deposits"]
+
+    with baseline_engine.connect() as conn:
+        # created_at de las cuentas previas sale de la última actividad
+        assert conn.execute(
+            text("SELECT created_at FROM users WHERE id = 1")
+        ).scalar().startswith("2026-01-10")
+        daily = conn.execute(
+            select(IncomeDailyRollup.day, IncomeDailyRollup.count)
+            .order_by(IncomeDailyRollup.day)
+        ).all()
+        monthly = conn.execute(
+            select(IncomeMonthlyRollup.month, IncomeMonthlyRollup.count)
+            .order_by(IncomeMonthlyRollup.month)
+        ).all()
+    assert daily == [(date(2026, 1, 5), 2), (date(2026, 2, 1), 1)]
+    assert monthly == [(1, 2), (2, 1)]
+
+
+def test_migrated_indexes_match_a_fresh_database(app, baseline_engine):
+    db.metadata.create_all(baseline_engine)
+    run_migrations(baseline_engine)
+    with app.app_context():
+        fresh = inspect(db.engine)
+        migrated = inspect(baseline_engine)
+        for table in db.metadata.sorted_tables:
+            names = {i["name"] for i in fresh.get_indexes(table.name)}
+            assert names == {
+                i["name"] for i in migrated.get_indexes(table.name)
+            }, table.name
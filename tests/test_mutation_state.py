@@ -0,0 +1,25 @@
+# tests/test_mutation_state.py
+"""?return_state=1: la respuesta dice sobre qué versión se aplicó."""
+
+
+def _income(client, amount):
+    return client.post("/api/income?return_state=1",
+                       json={"amount": amount}).get_json()
+
+
+def test_base_version_is_the_version_written_on(app, make_user, login):
+    user_id = make_user()
+    tab, other = login(user_id), login(user_id)
+    known = tab.get("/api/state").get_json()["version"]
+
+    first = _income(tab, "1.00")
+    assert first["base_version"] == known
+    assert first["version"] == known + 1
+    assert set(first["state"]) == {"summary", "categories"}
+
+    # Otro dispositivo escribe: la siguiente respuesta de esta pestaña
+    # ya no parte de la versión que tenía
+    _income(other, "2.00")
+    second = _income(tab, "3.00")
+    assert second["base_version"] == first["version"] + 1
+    assert second["version"] == first["version"] + 2
@@ -0,0 +1,118 @@
+# tests/test_query_plans.py
+"""
+Las consultas calientes usan sus índices: las del estado del dashboard
+(capturadas al correr load_state_inputs: acumulados del mes por su PK
+(user_id, day) y aportes de cada meta por (goal_id, date)) y la de
+ingresos por (user_id, date) de la exportación con rango de fechas.
+EXPLAIN corre en SQLite siempre y en Postgres si TEST_POSTGRES_URL
+apunta a una base desechable (se le crean las tablas).
+"""
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from db import db
+from exports import _export_queries
+from state_report import load_state_inputs
+
+TODAY = date(2026, 3, 18)
+
+
+def _hot_queries(app, user_id) -> dict:
+    """Sentencias que ejecuta la app, por tabla del FROM principal."""
+    captured = []
+
+    def capture(orm_state):
+        if orm_state.is_select:
+            captured.append(orm_state.statement)
+
+    with app.app_context():
+        event.listen(db.session, "do_orm_execute", capture)
+        try:
+            load_state_inputs([(user_id, 26)], TODAY)
+        finally:
+            event.remove(db.session, "do_orm_execute", capture)
+    exports = dict(_export_queries(user_id, date(2026, 1, 1), TODAY))
+    return {
+        "income_daily_rollup": _only(captured, "income_daily_rollup"),
+        "saving_goals": _only(captured, "saving_goals"),
+        "incomes": exports["incomes"],
+    }
+
+
+def _only(statements, table):
+    # Tabla de la primera columna seleccionada
+    found = [s for s in statements
+             if s.columns_clause_froms[0].name == table]
+    assert len(found) == 1, f"Se esperaba una consulta sobre {table}"
+    return found[0]
+
+
+def _sql(statement, engine) -> str:
+    return str(statement.compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    ))
+
+
+def test_sqlite_plans_use_indexes(app, make_user):
+    queries = _hot_queries(app, make_user())
+    with app.app_context():
+        engine = db.engine
+
+        def plan(table):
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + _sql(queries[table], engine)
+                )
+                return [row[-1] for row in rows]
+
+        month = plan("income_daily_rollup")
+        assert any(
+            step.startswith("SEARCH income_daily_rollup USING INDEX "
+                            "sqlite_autoindex_income_daily_rollup_1 "
+                            "(user_id=? AND day>? AND day<?)")
+            for step in month
+        ), month
+
+        goals = plan("saving_goals")
+        assert any("USING INDEX ix_saving_goals_user_id (user_id=?)" in step
+                   for step in goals), goals
+        assert any(
+            step.startswith("SEARCH saving_deposits USING")
+            and "ix_saving_deposits_goal_id_date (goal_id=?)" in step
+            for step in goals
+        ), goals
+
+        incomes = plan("incomes")
+        assert any("USING INDEX ix_incomes_user_id_date (user_id=? AND "
+                   "date>? AND date<?)" in step for step in incomes), incomes
+
+        assert not any(step.startswith("SCAN")
+                       for step in month + goals + incomes)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"),
+                    reason="sin TEST_POSTGRES_URL")
+def test_postgres_plans_use_indexes(app, make_user):
+    queries = _hot_queries(app, make_user())
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    db.metadata.create_all(engine)
+    try:
+        with engine.connect() as conn:
+            # Con tablas vacías el planner prefiere Seq Scan; así solo
+            # se comprueba que el índice sirve para el filtro.
+            conn.execute(text("SET enable_seqscan = off"))
+
+            def plan(table):
+                sql = _sql(queries[table], engine)
+                return "\n".join(conn.execute(text("EXPLAIN " + sql))
+                                 .scalars())
+
+            assert "pk_income_daily_rollup" in plan("income_daily_rollup")
+            assert "ix_saving_deposits_goal_id_date" in plan("saving_goals")
+            assert "ix_incomes_user_id_date" in plan("incomes")
+            conn.rollback()
+    finally:
+        engine.dispose()
@@ -0,0 +1,79 @@
+# tests/test_rollups.py
+"""Verificación y reparación de los acumulados diarios y mensuales."""
+from sqlalchemy import update
+
+from db import db
+from models import IncomeDailyRollup, IncomeMonthlyRollup
+from rollups import verify_rollups
+
+
+def _incomes(client):
+    res = client.post("/api/batch", json={"mode": "atomic", "operations": [
+        {"op": "income.create",
+         "data": {"amount": amount, "date": day}}
+        for amount, day in (("10.00", "2026-01-05"), ("2.50", "2026-01-05"),
+                            ("7.25", "2026-02-11"))
+    ]})
+    assert res.get_json()["ok"]
+
+
+def _verify(app, user_id=None):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            return verify_rollups(conn, user_id)
+
+
+def _corrupt(app, model, **where):
+    with app.app_context():
+        db.session.execute(
+            update(model)
+            .where(*(getattr(model, k) == v for k, v in where.items()))
+            .values(total=model.total + 1, count=model.count + 1)
+        )
+        db.session.commit()
+
+
+def test_consistent_rollups_have_no_drift(app, make_user, login):
+    user_id = make_user()
+    _incomes(login(user_id))
+    assert _verify(app) == []
+    assert _verify(app, user_id) == []
+
+
+def test_monthly_drift_is_reported_and_repaired(app, make_user, login):
+    user_id = make_user()
+    _incomes(login(user_id))
+    _corrupt(app, IncomeMonthlyRollup, user_id=user_id, year=2026, month=1)
+
+    drift = _verify(app)
+    assert drift == [{
+        "table": "income_monthly_rollup",
+        "user_id": user_id,
+        "period": "2026-01",
+        "expected_total": "12.50",
+        "stored_total": "13.50",
+        "expected_count": 2,
+        "stored_count": 3,
+    }]
+
+    result = app.test_cli_runner().invoke(args=["rollup-rebuild"])
+    assert result.exit_code == 0, result.output
+    assert "Filas con deriva en income_monthly_rollup: 1" in result.output
+    assert _verify(app) == []
+
+
+def test_repair_covers_both_tables(app, make_user, login):
+    user_id = make_user()
+    _incomes(login(user_id))
+    _corrupt(app, IncomeMonthlyRollup, user_id=user_id, year=2026, month=2)
+    _corrupt(app, IncomeDailyRollup, user_id=user_id)
+    tables = {d["table"] for d in _verify(app)}
+    assert tables == {"income_daily_rollup", "income_monthly_rollup"}
+
+    # --verify solo reporta
+    runner = app.test_cli_runner()
+    runner.invoke(args=["rollup-rebuild", "--verify"])
+    assert len(_verify(app)) == 3
+
+    runner.invoke(args=["rollup-rebuild", "--user-id", str(user_id)])
+    assert _verify(app) == []
@@ -0,0 +1,52 @@
+# tests/test_scheduler.py
+"""El líder de una tarea lo es mientras viva su proceso."""
+import os
+
+import pytest
+
+from scheduler import LeaderLock
+
+
+@pytest.fixture
+def leaders(app):
+    created = []
+
+    def make(name="test-leader"):
+        created.append(LeaderLock(name))
+        return created[-1]
+
+    with app.app_context():
+        yield make
+    for leader in created:
+        leader.release()
+
+
+def test_leader_keeps_the_lock_between_runs(leaders):
+    first, second = leaders(), leaders()
+    assert first.held()
+    # Antes se soltaba al acabar cada vuelta y el otro worker repetía el
+    # trabajo en la suya
+    for _ in range(3):
+        assert not second.held()
+        assert first.held()
+
+
+def test_another_process_takes_over_when_the_leader_leaves(leaders):
+    first, second = leaders(), leaders()
+    assert first.held()
+    first.release()
+    assert second.held()
+    assert not first.held()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="sin os.fork")
+def test_forked_child_is_not_the_leader(leaders):
+    leader = leaders()
+    assert leader.held()
+    pid = os.fork()
+    if pid == 0:
+        # El hijo hereda el objeto pero no el liderazgo
+        os._exit(0 if not leader.held() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert leader.held()
@@ -0,0 +1,60 @@
+# tests/test_state_cache.py
+"""Caché del estado: coherente entre workers, acotada y con contadores."""
+import threading
+from datetime import date
+
+from state_cache import LocalBackend, StateCache
+
+DAY = date(2026, 3, 18)
+
+
+def test_version_change_misses_in_another_worker():
+    # Dos workers: cada uno con su LRU; la escritura ocurre en el otro,
+    # así que este nunca ve el bump, solo la data_version nueva.
+    cache = StateCache(LocalBackend())
+    assert cache.get_or_compute(1, DAY, lambda: {"v": 1}, version=1) == {
+        "v": 1}
+    assert cache.get_or_compute(1, DAY, lambda: {"v": 9}, version=1) == {
+        "v": 1}
+    assert cache.get_or_compute(1, DAY, lambda: {"v": 2}, version=2) == {
+        "v": 2}
+
+
+def test_generations_are_bounded():
+    backend = LocalBackend(max_entries=3)
+    for user_id in range(10):
+        backend.bump(user_id)
+    assert len(backend._generations) == 3
+    # Los más recientes siguen ahí
+    assert backend.generation(9) == 1
+    assert backend.generation(0) == 0
+
+
+def test_forgotten_generation_does_not_serve_stale_state():
+    cache = StateCache(LocalBackend(max_entries=2))
+    cache.get_or_compute(1, DAY, lambda: {"v": 1}, version=1)
+    cache.invalidate(1)
+    for user_id in (2, 3, 4):
+        cache.invalidate(user_id)
+    # La generación del usuario 1 se olvidó (vuelve a 0), pero su
+    # escritura también subió la versión
+    assert cache.backend.generation(1) == 0
+    assert cache.get_or_compute(1, DAY, lambda: {"v": 2}, version=2) == {
+        "v": 2}
+
+
+def test_counters_are_exact_under_threads():
+    cache = StateCache(LocalBackend())
+    threads, calls = 8, 500
+
+    def worker(n):
+        for i in range(calls):
+            cache.get_or_compute(i % 5, DAY, lambda: {"n": n}, version=0)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == threads * calls
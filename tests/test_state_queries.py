@@ -0,0 +1,121 @@
+# tests/test_state_queries.py
+"""
+El estado sale de agregados SQL: un número fijo de consultas por
+/api/state, sin importar cuántos ingresos, metas o aportes haya, y el
+mismo JSON que daba el cálculo anterior fila por fila.
+"""
+import json
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete
+
+from conftest import count_statements
+from db import db
+from finance import compute_financial_state
+from models import (
+    Category,
+    Income,
+    SavingDeposit,
+    SavingGoal,
+    StateSnapshot,
+    User,
+)
+from rollups import rebuild_rollups
+from state_cache import LocalBackend, state_cache
+
+# Salida del cálculo anterior (ORM, un query por meta) para este mismo
+# juego de datos; el versículo era aleatorio y no se compara.
+GOLDEN = os.path.join(os.path.dirname(__file__), "data",
+                      "state_pre_aggregates.json")
+GOLDEN_DAY = date(2026, 3, 18)
+
+
+def _populate(app, user_id, today, goals=4, incomes_per_day=3):
+    with app.app_context():
+        for name, target in (("Casa", "1200000"), ("Comida", "450000.50"),
+                             ("Ahorro", "300000")):
+            db.session.add(Category(user_id=user_id, name=name,
+                                    monthly_target=Decimal(target)))
+        for d in range(1, today.day + 1):
+            for k in range(incomes_per_day):
+                amount = (d * 7919 + k * 104729) % 90000 + 1000
+                db.session.add(Income(
+                    user_id=user_id,
+                    amount=Decimal(f"{amount}.{(d + k) % 100:02d}"),
+                    date=today.replace(day=d),
+                ))
+        # El mes anterior no cuenta
+        previous = today.replace(day=1) - timedelta(days=1)
+        for d in (3, 17, 28):
+            db.session.add(Income(user_id=user_id, amount=Decimal("50000"),
+                                  date=previous.replace(day=d)))
+        for k in range(goals):
+            goal = SavingGoal(
+                user_id=user_id,
+                name=f"Meta {k}",
+                target_amount=Decimal(100000 * (k + 1)),
+                deadline=today + timedelta(days=40 * k) if k else None,
+            )
+            db.session.add(goal)
+            db.session.flush()
+            for j in range(k * 3):
+                db.session.add(SavingDeposit(
+                    goal_id=goal.id,
+                    amount=Decimal(f"{1500 * (j + 1)}.25"),
+                    date=today - timedelta(days=j),
+                ))
+        db.session.commit()
+        # Los inserts directos no pasan por los acumulados
+        with db.engine.begin() as conn:
+            rebuild_rollups(conn)
+
+
+def test_state_matches_row_by_row_result(app, make_user):
+    user_id = make_user(working_days=24)
+    _populate(app, user_id, GOLDEN_DAY)
+    with app.app_context():
+        state = compute_financial_state(db.session.get(User, user_id),
+                                        GOLDEN_DAY)
+    state.pop("verse")
+    with open(GOLDEN, encoding="utf-8") as fh:
+        expected = json.load(fh)
+    assert json.loads(json.dumps(state)) == expected
+
+
+def _cold_state_statements(app, client):
+    with app.app_context():
+        db.session.execute(delete(StateSnapshot))
+        db.session.commit()
+    state_cache.backend = LocalBackend()
+    with count_statements(app) as statements:
+        res = client.get("/api/state")
+    assert res.status_code == 200
+    return statements
+
+
+@pytest.mark.parametrize("goals,incomes_per_day", [(1, 1), (12, 8)])
+def test_state_statement_count_is_fixed(app, make_user, login, goals,
+                                        incomes_per_day):
+    user_id = make_user()
+    _populate(app, user_id, date.today(), goals, incomes_per_day)
+    client = login(user_id)
+
+    statements = _cold_state_statements(app, client)
+    data_reads = [
+        s for s in statements
+        if s.lstrip().upper().startswith("SELECT")
+        and any(t in s for t in ("categories", "income", "saving_goals"))
+    ]
+    # Categorías, suma del mes/día y metas con sus aportes agregados
+    assert len(data_reads) == 3
+    # data_version, instantánea, los tres agregados y guardar la
+    # instantánea nueva (borrar + insertar)
+    assert len(statements) == 7
+
+    # Con la caché caliente solo se lee data_version
+    with count_statements(app) as statements:
+        assert client.get("/api/state").status_code == 200
+    assert len(statements) == 1
@@ -0,0 +1,138 @@
+# user_session.py
+from __future__ import annotations
+
+import time
+from datetime import datetime
+
+from flask import session
+from sqlalchemy import select
+
+from db import db
+from models import User
+
+# Clave en la cookie firmada y formato de la instantánea; si cambian los
+# campos se sube SNAPSHOT_FORMAT y las cookies viejas se recargan solas.
+SNAPSHOT_KEY = "u"
+SNAPSHOT_FORMAT = 1
+
+
+# ----------------------------------------------------------------------
+#  USUARIO DE LA PETICIÓN (SIN CARGAR LA FILA)
+# ----------------------------------------------------------------------
+class SessionUser:
+    """
+    Lo que las peticiones usan del usuario (id, nombre, admin, días de
+    trabajo, última actividad). data_version no viaja en la cookie: se
+    lee la primera vez que hace falta (ETag, caché) con una consulta
+    escalar por PK, y commit_user_change la pone al día tras escribir.
+    """
+
+    __slots__ = ("id", "name", "is_admin", "working_days",
+                 "last_active_at", "_data_version")
+
+    def __init__(self, id, name, is_admin, working_days, last_active_at,
+                 data_version=None):
+        self.id = id
+        self.name = name
+        self.is_admin = bool(is_admin)
+        self.working_days = working_days
+        self.last_active_at = last_active_at
+        self._data_version = data_version
+
+    @property
+    def data_version(self) -> int:
+        if self._data_version is None:
+            self._data_version = db.session.execute(
+                select(User.data_version).where(User.id == self.id)
+            ).scalar() or 0
+        return self._data_version
+
+    @data_version.setter
+    def data_version(self, value: int) -> None:
+        self._data_version = value
+
+    @classmethod
+    def from_row(cls, row) -> "SessionUser":
+        return cls(row.id, row.name, row.is_admin, row.working_days,
+                   row.last_active_at, row.data_version)
+
+    @classmethod
+    def from_snapshot(cls, snap: dict) -> "SessionUser":
+        active = snap.get("act")
+        return cls(snap["id"], snap.get("name"), snap.get("adm"),
+                   snap.get("wd"),
+                   datetime.fromisoformat(active) if active else None)
+
+    def snapshot(self, checked_at: float) -> dict:
+        return {
+            "f": SNAPSHOT_FORMAT,
+            "id": self.id,
+            "name": self.name,
+            "adm": self.is_admin,
+            "wd": self.working_days,
+            "act": (self.last_active_at.isoformat()
+                    if self.last_active_at else None),
+            "at": int(checked_at),
+        }
+
+
+def remember_user(user, now: float | None = None) -> SessionUser:
+    """Guarda (o renueva) la instantánea en la sesión."""
+    if not isinstance(user, SessionUser):
+        user = SessionUser.from_row(user)
+    session[SNAPSHOT_KEY] = user.snapshot(time.time() if now is None else now)
+    return user
+
+
+def load_session_user(ttl_seconds: int) -> SessionUser | None:
+    """
+    Usuario de la sesión actual. Con una instantánea de menos de
+    `ttl_seconds` no toca la BD; si es más vieja (o de otro formato) se
+    revalida con una consulta de las columnas necesarias. Si la cuenta
+    ya no existe, se limpia la sesión.
+    """
+    user_id = session.get("user_id")
+    if user_id is None:
+        return None
+
+    now = time.time()
+    snap = session.get(SNAPSHOT_KEY)
+    if (
+        isinstance(snap, dict)
+        and snap.get("f") == SNAPSHOT_FORMAT
+        and snap.get("id") == user_id
+        and now - snap.get("at", 0) < ttl_seconds
+    ):
+        return SessionUser.from_snapshot(snap)
+    return reload_session_user(user_id, now)
+
+
+def reload_session_user(user_id: int,
+                        now: float | None = None) -> SessionUser | None:
+    """
+    Relee el usuario de la BD sin mirar la instantánea y la renueva. Lo
+    usan también las rutas de administración: un is_admin revocado no
+    puede esperar a que caduque la instantánea.
+    """
+    row = db.session.execute(
+        select(
+            User.id,
+            User.name,
+            User.is_admin,
+            User.working_days,
+            User.last_active_at,
+            User.data_version,
+        ).where(User.id == user_id)
+    ).first()
+    if row is None:
+        session.clear()
+        return None
+    return remember_user(SessionUser.from_row(row), now)
+
+
+def note_activity(user: SessionUser, at: datetime) -> None:
+    """La actividad anotada también va a la instantánea (sin consultar)."""
+    user.last_active_at = at
+    snap = session.get(SNAPSHOT_KEY)
+    if isinstance(snap, dict):
+        session[SNAPSHOT_KEY] = {**snap, "act": at.isoformat()}